@@ -0,0 +1,75 @@
+# alembic/env.py
+from logging.config import fileConfig
+
+from alembic import context
+
+from app.config import settings
+from app.database import Base, build_engine
+import app.models  # noqa: F401 (enregistre les tables dans Base.metadata)
+
+config = context.config
+
+# Appelé depuis app.initial_data, le journal est déjà configuré par l'application
+if config.config_file_name is not None and config.attributes.get("configure_logger", True):
+    fileConfig(config.config_file_name)
+
+target_metadata = Base.metadata
+
+
+def include_name(name, type_, parent_names) -> bool:
+    # Index plein texte (table FTS5 et ses tables internes) : hors des modèles, voir 0004
+    return not (type_ == "table" and name.startswith("variables_fts"))
+
+
+def database_url() -> str:
+    return config.get_main_option("sqlalchemy.url") or settings.DATABASE_URL
+
+
+def run_migrations_offline() -> None:
+    """
+    Génère le SQL sans connexion (alembic upgrade head --sql).
+    """
+    url = database_url()
+    context.configure(
+        url=url,
+        target_metadata=target_metadata,
+        include_name=include_name,
+        literal_binds=True,
+        dialect_opts={"paramstyle": "named"},
+        render_as_batch=url.startswith("sqlite"),
+    )
+    with context.begin_transaction():
+        context.run_migrations()
+
+
+def run_migrations_online() -> None:
+    # Une connexion fournie par l'appelant (init_db) est réutilisée telle quelle
+    connection = config.attributes.get("connection")
+    if connection is not None:
+        _run(connection)
+        return
+
+    engine = build_engine(database_url())
+    try:
+        with engine.connect() as connection:
+            _run(connection)
+    finally:
+        engine.dispose()
+
+
+def _run(connection) -> None:
+    # SQLite ne sait pas modifier une table en place : migrations en mode « batch »
+    context.configure(
+        connection=connection,
+        target_metadata=target_metadata,
+        include_name=include_name,
+        render_as_batch=connection.dialect.name == "sqlite",
+    )
+    with context.begin_transaction():
+        context.run_migrations()
+
+
+if context.is_offline_mode():
+    run_migrations_offline()
+else:
+    run_migrations_online()
@@ -0,0 +1,68 @@
+"""initial schema
+
+Schéma d'origine (tel que créé par Base.metadata.create_all avant les migrations).
+
+Revision ID: 0001
+Revises:
+Create Date: 2024-05-20 10:00:00
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = "0001"
+down_revision = None
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    op.create_table(
+        "users",
+        sa.Column("id", sa.Integer(), nullable=False),
+        sa.Column("username", sa.String(), nullable=True),
+        sa.Column("hashed_password", sa.String(), nullable=True),
+        sa.Column("is_admin", sa.Boolean(), nullable=True),
+        sa.PrimaryKeyConstraint("id"),
+    )
+    op.create_index("ix_users_id", "users", ["id"])
+    op.create_index("ix_users_username", "users", ["username"], unique=True)
+
+    op.create_table(
+        "categories",
+        sa.Column("id", sa.Integer(), nullable=False),
+        sa.Column("name", sa.String(), nullable=True),
+        sa.Column("owner_id", sa.Integer(), nullable=True),
+        sa.ForeignKeyConstraint(["owner_id"], ["users.id"]),
+        sa.PrimaryKeyConstraint("id"),
+    )
+    op.create_index("ix_categories_id", "categories", ["id"])
+    op.create_index("ix_categories_name", "categories", ["name"], unique=True)
+
+    op.create_table(
+        "variables",
+        sa.Column("id", sa.Integer(), nullable=False),
+        sa.Column("name", sa.String(), nullable=True),
+        sa.Column("identifier", sa.String(), nullable=True),
+        sa.Column("value", sa.String(), nullable=True),
+        sa.Column("category_id", sa.Integer(), nullable=True),
+        sa.Column("parent_variable_id", sa.Integer(), nullable=True),
+        sa.Column("created_at", sa.DateTime(), nullable=True),
+        sa.Column("updated_at", sa.DateTime(), nullable=True),
+        sa.Column("owner_id", sa.Integer(), nullable=True),
+        sa.ForeignKeyConstraint(["category_id"], ["categories.id"]),
+        sa.ForeignKeyConstraint(["owner_id"], ["users.id"]),
+        sa.ForeignKeyConstraint(["parent_variable_id"], ["variables.id"]),
+        sa.PrimaryKeyConstraint("id"),
+    )
+    op.create_index("ix_variables_id", "variables", ["id"])
+    op.create_index("ix_variables_name", "variables", ["name"])
+    op.create_index("ix_variables_identifier", "variables", ["identifier"], unique=True)
+
+
+def downgrade() -> None:
+    op.drop_table("variables")
+    op.drop_table("categories")
+    op.drop_table("users")
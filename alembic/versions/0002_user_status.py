@@ -0,0 +1,34 @@
+"""user status and token version
+
+Colonnes is_active et token_version (révocation des jetons).
+
+Revision ID: 0002
+Revises: 0001
+Create Date: 2024-06-03 10:00:00
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = "0002"
+down_revision = "0001"
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    # Une base créée par create_all après l'ajout des colonnes les contient déjà
+    existing = {column["name"] for column in sa.inspect(op.get_bind()).get_columns("users")}
+    with op.batch_alter_table("users") as batch_op:
+        if "is_active" not in existing:
+            batch_op.add_column(sa.Column("is_active", sa.Boolean(), server_default="1", nullable=False))
+        if "token_version" not in existing:
+            batch_op.add_column(sa.Column("token_version", sa.Integer(), server_default="0", nullable=False))
+
+
+def downgrade() -> None:
+    with op.batch_alter_table("users") as batch_op:
+        batch_op.drop_column("token_version")
+        batch_op.drop_column("is_active")
@@ -0,0 +1,39 @@
+"""composite and foreign key indexes
+
+Index des requêtes des routes :
+- variables (owner_id, identifier) : résolution des références et ETag ;
+- variables (owner_id, id), categories (owner_id, id) : listes paginées par propriétaire ;
+- variables.category_id, variables.parent_variable_id : cascades et chargement des parents.
+Le préfixe owner_id des index composites sert aussi d'index de clé étrangère.
+
+Revision ID: 0003
+Revises: 0002
+Create Date: 2024-06-17 10:00:00
+
+"""
+from alembic import op
+
+
+# revision identifiers, used by Alembic.
+revision = "0003"
+down_revision = "0002"
+branch_labels = None
+depends_on = None
+
+INDEXES = [
+    ("ix_variables_owner_id_identifier", "variables", ["owner_id", "identifier"]),
+    ("ix_variables_owner_id_id", "variables", ["owner_id", "id"]),
+    ("ix_variables_category_id", "variables", ["category_id"]),
+    ("ix_variables_parent_variable_id", "variables", ["parent_variable_id"]),
+    ("ix_categories_owner_id_id", "categories", ["owner_id", "id"]),
+]
+
+
+def upgrade() -> None:
+    for name, table, columns in INDEXES:
+        op.create_index(name, table, columns, if_not_exists=True)
+
+
+def downgrade() -> None:
+    for name, table, _ in reversed(INDEXES):
+        op.drop_index(name, table_name=table)
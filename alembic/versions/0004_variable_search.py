@@ -0,0 +1,80 @@
+"""full-text search index on variables
+
+SQLite : table FTS5 à contenu externe (variables_fts) sur owner_id, name,
+identifier et value, tenue à jour par des triggers (toute écriture, ORM ou
+ensembliste, met l'index à jour dans la même transaction) ; préfixes de 2 et
+3 caractères indexés pour l'autocomplétion.
+MySQL : index FULLTEXT (name, identifier, value), maintenu par le moteur.
+
+Revision ID: 0004
+Revises: 0003
+Create Date: 2024-06-24 10:00:00
+
+"""
+from alembic import op
+
+
+# revision identifiers, used by Alembic.
+revision = "0004"
+down_revision = "0003"
+branch_labels = None
+depends_on = None
+
+SQLITE_UPGRADE = [
+    """
+    CREATE VIRTUAL TABLE IF NOT EXISTS variables_fts USING fts5(
+        owner_id, name, identifier, value,
+        content='variables', content_rowid='id',
+        tokenize='unicode61 remove_diacritics 2', prefix='2 3'
+    )
+    """,
+    """
+    CREATE TRIGGER IF NOT EXISTS variables_fts_insert AFTER INSERT ON variables BEGIN
+        INSERT INTO variables_fts(rowid, owner_id, name, identifier, value)
+        VALUES (new.id, new.owner_id, new.name, new.identifier, new.value);
+    END
+    """,
+    """
+    CREATE TRIGGER IF NOT EXISTS variables_fts_delete AFTER DELETE ON variables BEGIN
+        INSERT INTO variables_fts(variables_fts, rowid, owner_id, name, identifier, value)
+        VALUES ('delete', old.id, old.owner_id, old.name, old.identifier, old.value);
+    END
+    """,
+    # Seules les colonnes indexées déclenchent la mise à jour (pas updated_at, category_id...)
+    """
+    CREATE TRIGGER IF NOT EXISTS variables_fts_update AFTER UPDATE OF owner_id, name, identifier, value ON variables BEGIN
+        INSERT INTO variables_fts(variables_fts, rowid, owner_id, name, identifier, value)
+        VALUES ('delete', old.id, old.owner_id, old.name, old.identifier, old.value);
+        INSERT INTO variables_fts(rowid, owner_id, name, identifier, value)
+        VALUES (new.id, new.owner_id, new.name, new.identifier, new.value);
+    END
+    """,
+    # Classement par défaut (ORDER BY rank) : bm25 pondéré par colonne, l'identifiant d'abord
+    "INSERT INTO variables_fts(variables_fts, rank) VALUES ('rank', 'bm25(0.0, 5.0, 10.0, 1.0)')",
+    "INSERT INTO variables_fts(variables_fts) VALUES ('rebuild')",
+]
+
+SQLITE_DOWNGRADE = [
+    "DROP TRIGGER IF EXISTS variables_fts_update",
+    "DROP TRIGGER IF EXISTS variables_fts_delete",
+    "DROP TRIGGER IF EXISTS variables_fts_insert",
+    "DROP TABLE IF EXISTS variables_fts",
+]
+
+
+def upgrade() -> None:
+    dialect = op.get_context().dialect.name
+    if dialect == "sqlite":
+        for statement in SQLITE_UPGRADE:
+            op.execute(statement)
+    elif dialect == "mysql":
+        op.execute("CREATE FULLTEXT INDEX ix_variables_fulltext ON variables (name, identifier, value)")
+
+
+def downgrade() -> None:
+    dialect = op.get_context().dialect.name
+    if dialect == "sqlite":
+        for statement in SQLITE_DOWNGRADE:
+            op.execute(statement)
+    elif dialect == "mysql":
+        op.drop_index("ix_variables_fulltext", table_name="variables")
@@ -0,0 +1,87 @@
+"""change log of variables and categories
+
+Table changes (journal append-only, id croissant = curseur de synchronisation)
+alimentée par des triggers AFTER INSERT / UPDATE / DELETE sur variables et
+categories : les écritures ORM, ensemblistes (app.bulk), les cascades et
+l'import y sont toutes journalisées, dans la même transaction. Un changement
+de propriétaire laisse aussi une suppression pour l'ancien propriétaire.
+
+Revision ID: 0005
+Revises: 0004
+Create Date: 2024-07-01 10:00:00
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = "0005"
+down_revision = "0004"
+branch_labels = None
+depends_on = None
+
+# (table, entité journalisée, colonne identifiant ou NULL)
+TABLES = [
+    ("variables", "variable", "identifier"),
+    ("categories", "category", None),
+]
+
+INSERT = "INSERT INTO changes (owner_id, entity, entity_id, identifier, deleted, changed_at)"
+
+
+def _values(row: str, entity: str, identifier, deleted: int, now: str) -> str:
+    identifier = f"{row}.{identifier}" if identifier else "NULL"
+    return f"{row}.owner_id, '{entity}', {row}.id, {identifier}, {deleted}, {now}"
+
+
+def _triggers(dialect: str):
+    """
+    (nom, CREATE TRIGGER) des six triggers, pour SQLite ou MySQL.
+    """
+    for table, entity, identifier in TABLES:
+        if dialect == "mysql":
+            now, each_row = "UTC_TIMESTAMP(6)", "FOR EACH ROW "
+            old, new = _values("OLD", entity, identifier, 1, now), _values("NEW", entity, identifier, 0, now)
+            owner_changed = f"IF NOT (OLD.owner_id <=> NEW.owner_id) THEN {INSERT} VALUES ({old}); END IF;"
+        else:
+            # SQLite n'a pas de IF dans un trigger : INSERT ... SELECT ... WHERE
+            now, each_row = "CURRENT_TIMESTAMP", ""
+            old, new = _values("old", entity, identifier, 1, now), _values("new", entity, identifier, 0, now)
+            owner_changed = f"{INSERT} SELECT {old} WHERE old.owner_id IS NOT new.owner_id;"
+        prefix = f"CREATE TRIGGER changes_{table}"
+        yield f"changes_{table}_insert", f"{prefix}_insert AFTER INSERT ON {table} {each_row}BEGIN {INSERT} VALUES ({new}); END"
+        yield f"changes_{table}_delete", f"{prefix}_delete AFTER DELETE ON {table} {each_row}BEGIN {INSERT} VALUES ({old}); END"
+        yield f"changes_{table}_update", f"{prefix}_update AFTER UPDATE ON {table} {each_row}BEGIN {INSERT} VALUES ({new}); {owner_changed} END"
+
+
+def upgrade() -> None:
+    dialect = op.get_context().dialect.name
+    # Une base créée par create_all après l'ajout du modèle contient déjà la table
+    if "changes" not in sa.inspect(op.get_bind()).get_table_names():
+        op.create_table(
+            "changes",
+            sa.Column("id", sa.Integer(), primary_key=True),
+            sa.Column("owner_id", sa.Integer(), nullable=True),
+            sa.Column("entity", sa.String(16), nullable=False),
+            sa.Column("entity_id", sa.Integer(), nullable=False),
+            sa.Column("identifier", sa.String(), nullable=True),
+            sa.Column("deleted", sa.Boolean(), nullable=False),
+            sa.Column("changed_at", sa.DateTime(), nullable=False),
+            sqlite_autoincrement=True,
+        )
+        op.create_index("ix_changes_owner_id_id", "changes", ["owner_id", "id"])
+        op.create_index("ix_changes_changed_at", "changes", ["changed_at"])
+    if dialect in ("sqlite", "mysql"):
+        for _, statement in _triggers(dialect):
+            op.execute(statement)
+
+
+def downgrade() -> None:
+    dialect = op.get_context().dialect.name
+    if dialect in ("sqlite", "mysql"):
+        for name, _ in _triggers(dialect):
+            op.execute(f"DROP TRIGGER IF EXISTS {name}")
+    op.drop_index("ix_changes_changed_at", table_name="changes")
+    op.drop_index("ix_changes_owner_id_id", table_name="changes")
+    op.drop_table("changes")
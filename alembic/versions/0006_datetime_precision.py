@@ -0,0 +1,38 @@
+"""microsecond precision for variable timestamps
+
+updated_at sert de marque de version (ETag, reconstruction incrémentale des
+bundles). Le DATETIME de MySQL est à la seconde : deux modifications dans la
+même seconde donnaient la même marque, donc des 304 et des bundles périmés.
+Les colonnes passent en DATETIME(6). SQLite conserve déjà les microsecondes.
+
+Revision ID: 0006
+Revises: 0005
+Create Date: 2024-07-08 10:00:00
+
+"""
+from alembic import op
+import sqlalchemy as sa
+from sqlalchemy.dialects import mysql
+
+
+# revision identifiers, used by Alembic.
+revision = "0006"
+down_revision = "0005"
+branch_labels = None
+depends_on = None
+
+COLUMNS = [("variables", "created_at"), ("variables", "updated_at")]
+
+
+def upgrade() -> None:
+    if op.get_context().dialect.name != "mysql":
+        return
+    for table, column in COLUMNS:
+        op.alter_column(table, column, type_=mysql.DATETIME(fsp=6), existing_type=sa.DateTime(), existing_nullable=True)
+
+
+def downgrade() -> None:
+    if op.get_context().dialect.name != "mysql":
+        return
+    for table, column in COLUMNS:
+        op.alter_column(table, column, type_=sa.DateTime(), existing_type=mysql.DATETIME(fsp=6), existing_nullable=True)
@@ -0,0 +1,43 @@
+"""background job state shared by all workers
+
+Table jobs : état et progression des opérations de masse en tâche de fond,
+écrits par le worker qui les exécute et lus par tous (GET /jobs/{id}).
+
+Revision ID: 0007
+Revises: 0006
+Create Date: 2024-07-15 10:00:00
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = "0007"
+down_revision = "0006"
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    # Une base créée par create_all après l'ajout du modèle contient déjà la table (SQL hors ligne : rien à inspecter)
+    if not op.get_context().as_sql and "jobs" in sa.inspect(op.get_bind()).get_table_names():
+        return
+    op.create_table(
+        "jobs",
+        sa.Column("id", sa.String(32), primary_key=True),
+        sa.Column("kind", sa.String(32), nullable=False),
+        sa.Column("user_id", sa.Integer(), nullable=False),
+        sa.Column("status", sa.String(16), nullable=False),
+        sa.Column("total", sa.Integer(), nullable=False),
+        sa.Column("done", sa.Integer(), nullable=False),
+        sa.Column("error", sa.Text(), nullable=True),
+        sa.Column("created_at", sa.DateTime(), nullable=False),
+        sa.Column("finished_at", sa.DateTime(), nullable=True),
+    )
+    op.create_index("ix_jobs_finished_at", "jobs", ["finished_at"])
+
+
+def downgrade() -> None:
+    op.drop_index("ix_jobs_finished_at", table_name="jobs")
+    op.drop_table("jobs")
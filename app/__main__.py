@@ -0,0 +1,75 @@
+# app/__main__.py
+"""
+Commandes d'administration : python -m app <commande>.
+
+    init-db         applique les migrations (alembic upgrade head) et crée l'administrateur initial
+    prune-changes   purge le journal des modifications au-delà de CHANGES_RETENTION_DAYS
+    serve           lance l'API en production (un worker par cœur, uvloop, httptools) ;
+                    SIGHUP : redémarrage progressif sans interruption
+"""
+import argparse
+import logging
+
+
+def init_db_command(args: argparse.Namespace) -> None:
+    from app.database import get_engine
+    from app.initial_data import init_db
+
+    init_db(get_engine())
+
+
+def prune_changes_command(args: argparse.Namespace) -> None:
+    from datetime import datetime, timedelta
+
+    from app.changes import prune_changes
+    from app.config import settings
+    from app.database import SessionLocal
+
+    days = settings.CHANGES_RETENTION_DAYS if args.days is None else args.days
+    with SessionLocal() as session:
+        removed = prune_changes(session, datetime.utcnow() - timedelta(days=days))
+    logging.getLogger(__name__).info("%d modifications purgées du journal", removed)
+
+
+def serve_command(args: argparse.Namespace) -> None:
+    from app.server import serve
+
+    serve(
+        host=args.host,
+        port=args.port,
+        workers=args.workers,
+        max_requests=args.max_requests,
+        max_requests_jitter=args.max_requests_jitter,
+        graceful_timeout=args.timeout_graceful_shutdown,
+    )
+
+
+def main(argv=None) -> None:
+    parser = argparse.ArgumentParser(prog="python -m app")
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    init_db_parser = commands.add_parser("init-db", help="Applique les migrations et crée l'administrateur initial")
+    init_db_parser.set_defaults(handler=init_db_command)
+
+    prune_parser = commands.add_parser("prune-changes", help="Purge les anciennes lignes du journal des modifications")
+    prune_parser.add_argument("--days", type=int, default=None, help="Conservation en jours (défaut : CHANGES_RETENTION_DAYS)")
+    prune_parser.set_defaults(handler=prune_changes_command)
+
+    serve_parser = commands.add_parser("serve", help="Lance l'API avec un superviseur et plusieurs workers")
+    serve_parser.add_argument("--host", default=None, help="Adresse d'écoute (défaut : SERVER_HOST)")
+    serve_parser.add_argument("--port", type=int, default=None, help="Port (défaut : SERVER_PORT)")
+    serve_parser.add_argument("--workers", type=int, default=None, help="Workers (défaut : SERVER_WORKERS, sinon un par cœur)")
+    serve_parser.add_argument("--max-requests", type=int, default=None, help="Requêtes avant recyclage d'un worker (défaut : SERVER_MAX_REQUESTS)")
+    serve_parser.add_argument("--max-requests-jitter", type=int, default=None, help="Part aléatoire ajoutée à --max-requests")
+    serve_parser.add_argument("--timeout-graceful-shutdown", type=int, default=None, help="Délai d'arrêt gracieux en secondes (défaut : SERVER_GRACEFUL_TIMEOUT)")
+    serve_parser.set_defaults(handler=serve_command)
+
+    args = parser.parse_args(argv)
+    from app.logs import configure_logging
+
+    configure_logging()
+    args.handler(args)
+
+
+if __name__ == "__main__":
+    main()
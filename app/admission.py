@@ -0,0 +1,298 @@
+# app/admission.py
+import itertools
+import logging
+import math
+import os
+import time
+from collections import OrderedDict
+from typing import Dict, List, Optional
+
+from jose import JWTError, jwt
+from starlette.responses import JSONResponse
+from starlette.routing import Match
+
+from app.auth import ALGORITHM, SECRET_KEY, principal_cache
+from app.config import settings
+
+logger = logging.getLogger(__name__)
+
+KEY_PREFIX = "shortpress:admission:"
+
+API = settings.API_V1_STR
+
+# Coût par défaut d'une requête : 1 jeton. Résolutions, rendus, exports, opérations de masse
+# et hachage bcrypt coûtent davantage (clé : "MÉTHODE modèle de chemin")
+DEFAULT_COSTS: Dict[str, float] = {
+    f"POST {API}/auth/token": 10,
+    f"POST {API}/auth/users/": 10,
+    f"GET {API}/variables/variables/{{variable_id}}/resolved": 5,
+    f"GET {API}/variables/variables/by-identifier/{{identifier}}/resolved": 5,
+    f"POST {API}/variables/resolve": 10,
+    f"POST {API}/variables/render": 10,
+    f"GET {API}/variables/export": 20,
+    f"GET {API}/categories/export": 20,
+    f"POST {API}/variables/import": 50,
+    f"DELETE {API}/variables/users/{{user_id}}/variables/": 50,
+    f"DELETE {API}/categories/users/{{user_id}}/categories/": 50,
+    f"DELETE {API}/admin/categories/users/{{user_id}}/categories/": 50,
+    f"POST {API}/admin/categories/users/bulk": 50,
+    f"POST {API}/documents/render": 50,
+    f"POST {API}/bundles/users/{{user_id}}": 20,
+    f"POST {API}/bundles/categories/{{category_id}}": 20,
+}
+
+# Requêtes simultanées par route, toutes origines confondues (0 : sans limite) ;
+# les autres routes sont limitées à ADMISSION_MAX_CONCURRENCY
+DEFAULT_CONCURRENCY: Dict[str, int] = {
+    f"POST {API}/variables/import": 2,
+    f"DELETE {API}/variables/users/{{user_id}}/variables/": 2,
+    f"DELETE {API}/categories/users/{{user_id}}/categories/": 2,
+    f"DELETE {API}/admin/categories/users/{{user_id}}/categories/": 2,
+    f"POST {API}/admin/categories/users/bulk": 2,
+    f"POST {API}/documents/render": 4,
+    f"GET {API}/variables/export": 4,
+    f"GET {API}/categories/export": 4,
+    f"POST {API}/bundles/users/{{user_id}}": 4,
+    f"POST {API}/bundles/categories/{{category_id}}": 4,
+    # Flux SSE : une connexion occupe son créneau pendant toute sa durée
+    f"GET {API}/variables/variables/changes/stream": 0,
+}
+
+
+class Rejected(Exception):
+    """
+    Requête refusée : 429 (jetons épuisés) ou 503 (route saturée), avec le délai à respecter.
+    """
+
+    def __init__(self, status_code: int, retry_after: float):
+        super().__init__(status_code, retry_after)
+        self.status_code = status_code
+        self.retry_after = retry_after
+
+
+class LocalBackend:
+    """
+    État d'admission propre au worker : seaux de jetons par client, créneaux
+    occupés par route.
+
+    Appelé uniquement depuis la boucle asynchrone, sans point d'attente :
+    aucun verrou n'est nécessaire. Au-delà de max_clients, les seaux les
+    moins récemment utilisés sont oubliés (ils repartiraient pleins).
+    """
+
+    def __init__(self, rate: float, burst: float, max_clients: int = 100000):
+        self.rate = rate
+        self.burst = burst
+        self.max_clients = max_clients
+        # client -> [jetons, instant de la dernière mise à jour]
+        self._buckets: "OrderedDict[str, List[float]]" = OrderedDict()
+        self._active: Dict[str, int] = {}
+
+    def _refill(self, client: str, now: float) -> List[float]:
+        bucket = self._buckets.get(client)
+        if bucket is None:
+            bucket = self._buckets[client] = [self.burst, now]
+            while len(self._buckets) > self.max_clients:
+                self._buckets.popitem(last=False)
+        else:
+            self._buckets.move_to_end(client)
+            bucket[0] = min(self.burst, bucket[0] + (now - bucket[1]) * self.rate)
+            bucket[1] = now
+        return bucket
+
+    async def admit(self, route: str, limit: int, client: str, cost: float) -> Optional[str]:
+        if limit and self._active.get(route, 0) >= limit:
+            raise Rejected(503, 1)
+        bucket = self._refill(client, time.monotonic())
+        if bucket[0] < cost:
+            raise Rejected(429, (cost - bucket[0]) / self.rate)
+        bucket[0] -= cost
+        if not limit:
+            return None
+        self._active[route] = self._active.get(route, 0) + 1
+        return route
+
+    async def release(self, route: str, slot: str) -> None:
+        self._active[route] -= 1
+
+
+# Un seul aller-retour par requête : créneau de la route puis seau du client, atomiquement.
+# Les créneaux sont datés (ensemble trié) : ceux d'un worker arrêté expirent après slot_ttl.
+ADMIT_SCRIPT = """
+local now = redis.call('TIME')
+now = tonumber(now[1]) + tonumber(now[2]) / 1000000
+local limit, cost, rate, burst = tonumber(ARGV[1]), tonumber(ARGV[2]), tonumber(ARGV[3]), tonumber(ARGV[4])
+local slot_ttl = tonumber(ARGV[6])
+if limit > 0 then
+    redis.call('ZREMRANGEBYSCORE', KEYS[1], '-inf', now - slot_ttl)
+    if redis.call('ZCARD', KEYS[1]) >= limit then
+        return {503, '1'}
+    end
+end
+local bucket = redis.call('HMGET', KEYS[2], 'tokens', 'updated')
+local tokens = tonumber(bucket[1]) or burst
+local updated = tonumber(bucket[2]) or now
+tokens = math.min(burst, tokens + math.max(0, now - updated) * rate)
+if tokens < cost then
+    return {429, tostring((cost - tokens) / rate)}
+end
+redis.call('HSET', KEYS[2], 'tokens', tostring(tokens - cost), 'updated', tostring(now))
+redis.call('EXPIRE', KEYS[2], math.ceil(burst / rate) + 1)
+if limit > 0 then
+    redis.call('ZADD', KEYS[1], now, ARGV[5])
+    redis.call('EXPIRE', KEYS[1], slot_ttl)
+end
+return {0, '0'}
+"""
+
+
+class RedisBackend:
+    """
+    État d'admission partagé par tous les workers (Redis).
+
+    Si Redis est indisponible, la requête est admise : le contrôle
+    d'admission ne doit pas rendre l'API indisponible à lui seul.
+    """
+
+    def __init__(self, client, rate: float, burst: float, slot_ttl: int = 60):
+        self.client = client
+        self.rate = rate
+        self.burst = burst
+        self.slot_ttl = slot_ttl
+        self._script = client.register_script(ADMIT_SCRIPT)
+        self._slots = itertools.count()
+        self._worker = f"{os.getpid()}:{id(self)}"
+
+    async def admit(self, route: str, limit: int, client: str, cost: float) -> Optional[str]:
+        slot = f"{self._worker}:{next(self._slots)}"
+        try:
+            status_code, retry_after = await self._script(
+                keys=[f"{KEY_PREFIX}route:{route}", f"{KEY_PREFIX}client:{client}"],
+                args=[limit, cost, self.rate, self.burst, slot, self.slot_ttl],
+            )
+        except Exception as e:
+            logger.warning("Contrôle d'admission partagé indisponible : %s", e)
+            return None
+        if int(status_code):
+            raise Rejected(int(status_code), float(retry_after))
+        return slot if limit else None
+
+    async def release(self, route: str, slot: str) -> None:
+        try:
+            await self.client.zrem(f"{KEY_PREFIX}route:{route}", slot)
+        except Exception as e:
+            logger.warning("Contrôle d'admission partagé indisponible : %s", e)
+
+
+def build_backend():
+    if not settings.ADMISSION_REDIS_URL:
+        return LocalBackend(settings.ADMISSION_USER_RATE, settings.ADMISSION_USER_BURST)
+    try:
+        from redis import asyncio as aioredis
+    except ImportError:
+        import aioredis
+
+    client = aioredis.from_url(settings.ADMISSION_REDIS_URL, decode_responses=True)
+    return RedisBackend(client, settings.ADMISSION_USER_RATE, settings.ADMISSION_USER_BURST, settings.ADMISSION_SLOT_TTL)
+
+
+def client_key(scope) -> str:
+    """
+    Seau du client : l'utilisateur du jeton Bearer, sinon l'adresse IP.
+
+    Le jeton n'est retenu qu'une fois sa signature vérifiée (cache des
+    jetons validés, sinon décodage) : un jeton forgé ne vide pas le seau
+    d'un autre utilisateur.
+    """
+    for name, value in scope["headers"]:
+        if name == b"authorization":
+            scheme, _, token = value.decode("latin-1").partition(" ")
+            if scheme.lower() != "bearer" or not token:
+                break
+            principal = principal_cache.get(token)
+            if principal is not None:
+                return f"user:{principal.id}"
+            try:
+                return f"user:{int(jwt.decode(token, SECRET_KEY, algorithms=[ALGORITHM])['user_id'])}"
+            except (JWTError, KeyError, TypeError, ValueError):
+                break
+    client = scope.get("client")
+    return f"ip:{client[0] if client else 'unknown'}"
+
+
+class AdmissionMiddleware:
+    """
+    Contrôle d'admission : refus immédiat plutôt que file d'attente sans borne.
+
+    Chaque requête HTTP coûte des jetons au seau de son client (coût de sa
+    route) et occupe un créneau de sa route jusqu'à la fin de la réponse.
+    Seau vide : 429 ; route saturée : 503 ; Retry-After dans les deux cas.
+    Middleware ASGI pur, placé dans la pile de l'application (la route est
+    reconnue avec son routeur, et renseignée pour les métriques) ; les
+    WebSocket et les chemins inconnus ne sont pas limités.
+    """
+
+    def __init__(
+        self,
+        app,
+        backend=None,
+        costs: Optional[Dict[str, float]] = None,
+        concurrency: Optional[Dict[str, int]] = None,
+        default_concurrency: Optional[int] = None,
+        router=None,
+    ):
+        self.app = app
+        self.backend = backend or build_backend()
+        self.costs = {**DEFAULT_COSTS, **settings.ADMISSION_ROUTE_COSTS} if costs is None else costs
+        self.concurrency = {**DEFAULT_CONCURRENCY, **settings.ADMISSION_ROUTE_CONCURRENCY} if concurrency is None else concurrency
+        self.default_concurrency = settings.ADMISSION_MAX_CONCURRENCY if default_concurrency is None else default_concurrency
+        self.router = router
+        self._routes = None
+
+    def _route(self, scope):
+        if self._routes is None:
+            router = self.router or scope["app"].router
+            # Partie fixe du chemin, avant le premier paramètre : écarte la plupart des routes sans regex
+            self._routes = [(getattr(route, "path", "").partition("{")[0], route) for route in router.routes]
+        path = scope["path"]
+        for prefix, route in self._routes:
+            if path.startswith(prefix):
+                match, _ = route.matches(scope)
+                if match == Match.FULL:
+                    return route
+        return None
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+        route = self._route(scope)
+        if route is None:
+            await self.app(scope, receive, send)
+            return
+
+        scope["route"] = route
+        key = f"{scope['method']} {route.path}"
+        limit = self.concurrency.get(key, self.default_concurrency)
+        # Un coût supérieur à la réserve la vide entièrement, sans bloquer la route pour toujours
+        cost = min(self.costs.get(key, 1), self.backend.burst)
+        try:
+            slot = await self.backend.admit(key, limit, client_key(scope), cost)
+        except Rejected as rejection:
+            if rejection.status_code == 429:
+                detail = "Too many requests"
+            else:
+                detail = "Service overloaded, retry later"
+            response = JSONResponse(
+                status_code=rejection.status_code,
+                content={"detail": detail},
+                headers={"Retry-After": str(max(1, math.ceil(rejection.retry_after)))},
+            )
+            await response(scope, receive, send)
+            return
+
+        try:
+            await self.app(scope, receive, send)
+        finally:
+            if slot is not None:
+                await self.backend.release(key, slot)
@@ -1,22 +1,26 @@
 # auth.py
+import threading
+import time
+from collections import OrderedDict
+from dataclasses import dataclass
 from datetime import datetime, timedelta
 from jose import JWTError, jwt
-from passlib.context import CryptContext
-from typing import Optional
+from typing import Dict, Optional, Set, Tuple
 from fastapi import Depends, HTTPException, status
 from fastapi.security import OAuth2PasswordBearer
-from sqlalchemy.orm import Session
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
+from app.config import settings
 from app.models import User
-from app.database import get_db
+from app.database import open_session
+from app.passwords import password_hasher, pwd_context
 import app.schemas as schemas
-import os
 
-SECRET_KEY = os.getenv("SECRET_KEY")
+SECRET_KEY = settings.SECRET_KEY
 if not SECRET_KEY:
     raise ValueError("SECRET_KEY environment variable not set")
 ALGORITHM = "HS256"
 ACCESS_TOKEN_EXPIRE_MINUTES = 30
-pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
 oauth2_scheme = OAuth2PasswordBearer(tokenUrl="token")
 
 def verify_password(plain_password, hashed_password):
@@ -25,10 +29,17 @@ def verify_password(plain_password, hashed_password):
 def get_password_hash(password):
     return pwd_context.hash(password)
 
-def authenticate_user(db: Session, username: str, password: str):
-    user = db.query(User).filter(User.username == username).first()
-    if not user or not verify_password(password, user.hashed_password):
+async def authenticate_user(db: AsyncSession, username: str, password: str):
+    user = await db.scalar(select(User).where(User.username == username))
+    if not user:
         return None
+    valid, new_hash = await password_hasher.verify_and_update(password, user.hashed_password)
+    if not valid:
+        return None
+    if new_hash:
+        # Coût bcrypt modifié depuis le dernier calcul : hash remplacé de façon transparente
+        user.hashed_password = new_hash
+        await db.commit()
     return user
 
 def create_access_token(data: dict, expires_delta: Optional[timedelta] = None):
@@ -41,7 +52,114 @@ def create_access_token(data: dict, expires_delta: Optional[timedelta] = None):
     encoded_jwt = jwt.encode(to_encode, SECRET_KEY, algorithm=ALGORITHM)
     return encoded_jwt
 
-async def get_current_user(token: str = Depends(oauth2_scheme), db: Session = Depends(get_db)):
+def token_claims(user: User) -> dict:
+    """
+    Revendications du jeton : tout ce qu'il faut pour authentifier une requête sans lire la base.
+    """
+    return {
+        "sub": user.username,
+        "user_id": user.id,
+        "is_admin": bool(user.is_admin),
+        "is_active": bool(user.is_active),
+        "version": user.token_version or 0,
+    }
+
+
+@dataclass(frozen=True)
+class Principal:
+    """
+    Utilisateur authentifié, tel que décrit par son jeton.
+    """
+
+    id: int
+    username: str
+    is_admin: bool
+    is_active: bool
+    token_version: int
+
+
+class PrincipalCache:
+    """
+    Cache des jetons déjà validés, avec durée de vie.
+
+    Un jeton n'est vérifié en base (numéro de version) qu'à son premier
+    passage ; ensuite, l'authentification ne coûte ni requête ni décodage
+    JWT. L'index par utilisateur permet d'écarter tous ses jetons quand son
+    statut change ; les autres workers les écartent au plus tard après
+    AUTH_CACHE_TTL secondes.
+    """
+
+    def __init__(self, maxsize: int = 10000, ttl: int = 60):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self._entries: "OrderedDict[str, Tuple[Principal, float]]" = OrderedDict()
+        self._tokens: Dict[int, Set[str]] = {}
+        self._lock = threading.Lock()
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def _drop(self, token: str) -> None:
+        item = self._entries.pop(token, None)
+        if item is not None:
+            tokens = self._tokens.get(item[0].id)
+            if tokens is not None:
+                tokens.discard(token)
+                if not tokens:
+                    del self._tokens[item[0].id]
+
+    def get(self, token: str) -> Optional[Principal]:
+        with self._lock:
+            item = self._entries.get(token)
+            if item is None:
+                return None
+            if item[1] < time.monotonic():
+                self._drop(token)
+                return None
+            self._entries.move_to_end(token)
+            return item[0]
+
+    def set(self, token: str, principal: Principal, expires_at: float) -> None:
+        with self._lock:
+            self._drop(token)
+            self._entries[token] = (principal, min(expires_at, time.monotonic() + self.ttl))
+            self._tokens.setdefault(principal.id, set()).add(token)
+            while len(self._entries) > self.maxsize:
+                self._drop(next(iter(self._entries)))
+
+    def invalidate_user(self, user_id: int) -> None:
+        with self._lock:
+            for token in list(self._tokens.get(user_id, ())):
+                self._drop(token)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+            self._tokens.clear()
+
+
+principal_cache = PrincipalCache(maxsize=settings.AUTH_CACHE_SIZE, ttl=settings.AUTH_CACHE_TTL)
+
+
+async def set_user_status(db: AsyncSession, user: User, is_admin: Optional[bool] = None, is_active: Optional[bool] = None) -> User:
+    """
+    Change le statut d'un utilisateur et révoque ses jetons émis auparavant.
+    """
+    if is_admin is not None:
+        user.is_admin = is_admin
+    if is_active is not None:
+        user.is_active = is_active
+    user.token_version = (user.token_version or 0) + 1
+    await db.commit()
+    principal_cache.invalidate_user(user.id)
+    return user
+
+
+async def get_current_user(token: str = Depends(oauth2_scheme)) -> Principal:
+    principal = principal_cache.get(token)
+    if principal is not None:
+        return principal
+
     credentials_exception = HTTPException(
         status_code=status.HTTP_401_UNAUTHORIZED,
         detail="Could not validate credentials",
@@ -49,12 +167,26 @@ async def get_current_user(token: str = Depends(oauth2_scheme), db: Session = De
     )
     try:
         payload = jwt.decode(token, SECRET_KEY, algorithms=[ALGORITHM])
-        username: str = payload.get("sub")
-        if username is None:
-            raise credentials_exception
-    except JWTError:
+        principal = Principal(
+            id=int(payload["user_id"]),
+            username=payload["sub"],
+            is_admin=bool(payload["is_admin"]),
+            is_active=bool(payload["is_active"]),
+            token_version=int(payload["version"]),
+        )
+    except (JWTError, KeyError, TypeError, ValueError):
         raise credentials_exception
-    user = db.query(User).filter(User.username == username).first()
-    if user is None:
+
+    # Premier passage du jeton : un changement de statut depuis son émission le révoque
+    db = open_session()
+    try:
+        version = await db.scalar(select(User.token_version).where(User.id == principal.id))
+    finally:
+        await db.close()
+    if version is None or version != principal.token_version:
         raise credentials_exception
-    return user
\ No newline at end of file
+
+    # Le jeton ne reste pas en cache au-delà de son expiration
+    lifetime = payload["exp"] - time.time() if "exp" in payload else principal_cache.ttl
+    principal_cache.set(token, principal, expires_at=time.monotonic() + lifetime)
+    return principal
\ No newline at end of file
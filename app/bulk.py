@@ -0,0 +1,84 @@
+# app/bulk.py
+from typing import Iterator, List
+
+from sqlalchemy import delete, select, update
+from sqlalchemy.orm import Session
+
+from app.cache import resolved_cache
+from app.models import Category, Variable
+
+# Une opération de masse est un générateur sur une session synchrone : chaque
+# itération traite un lot dans sa propre transaction et renvoie le nombre de
+# variables traitées. Le verrou d'écriture n'est tenu que le temps d'un lot.
+
+
+def _next_ids(session: Session, criteria: List, chunk_size: int) -> List[int]:
+    # Index (category_id) ou (owner_id, id) ; les mises à jour se font ensuite par clé primaire
+    return list(session.scalars(select(Variable.id).where(*criteria).order_by(Variable.id).limit(chunk_size)))
+
+
+def reassign_variables(session: Session, category_id: int, new_category_id: int, chunk_size: int) -> Iterator[int]:
+    """
+    UPDATE variables SET category_id = :new WHERE category_id = :old, par lots.
+
+    Les valeurs résolues ne changent pas : le cache reste valide ; updated_at
+    (onupdate) est avancé, les ETag des variables déplacées changent.
+    """
+    criteria = [Variable.category_id == category_id]
+    while True:
+        ids = _next_ids(session, criteria, chunk_size)
+        if not ids:
+            return
+        session.execute(update(Variable).where(Variable.id.in_(ids)).values(category_id=new_category_id))
+        session.commit()
+        yield len(ids)
+
+
+def delete_variables(session: Session, criteria: List, chunk_size: int) -> Iterator[int]:
+    """
+    DELETE FROM variables WHERE <criteria>, par lots.
+
+    Comme la suppression ORM, les variables dont le parent est supprimé sont
+    détachées (parent_variable_id = NULL) ; les valeurs résolues qui
+    référençaient les variables supprimées sont invalidées.
+    """
+    while True:
+        rows = session.execute(
+            select(Variable.id, Variable.owner_id, Variable.identifier).where(*criteria).order_by(Variable.id).limit(chunk_size)
+        ).all()
+        if not rows:
+            return
+        ids = [row.id for row in rows]
+        session.execute(update(Variable).where(Variable.parent_variable_id.in_(ids)).values(parent_variable_id=None))
+        session.execute(delete(Variable).where(Variable.id.in_(ids)))
+        session.commit()
+        resolved_cache.invalidate_variables(rows)
+        yield len(ids)
+
+
+def delete_category(session: Session, category_id: int, chunk_size: int) -> Iterator[int]:
+    """
+    Supprime une catégorie et ses variables (équivalent ensembliste de cascade="all, delete-orphan").
+    """
+    yield from delete_variables(session, [Variable.category_id == category_id], chunk_size)
+    session.execute(delete(Category).where(Category.id == category_id))
+    session.commit()
+
+
+def move_category(session: Session, category_id: int, new_category_id: int, chunk_size: int) -> Iterator[int]:
+    """
+    Déplace les variables d'une catégorie vers une autre, puis supprime la catégorie vide.
+    """
+    yield from reassign_variables(session, category_id, new_category_id, chunk_size)
+    session.execute(delete(Category).where(Category.id == category_id))
+    session.commit()
+
+
+def delete_owner_categories(session: Session, owner_id: int, chunk_size: int) -> Iterator[int]:
+    """
+    Supprime les catégories d'un utilisateur et leurs variables.
+    """
+    owned = select(Category.id).where(Category.owner_id == owner_id)
+    yield from delete_variables(session, [Variable.category_id.in_(owned)], chunk_size)
+    session.execute(delete(Category).where(Category.owner_id == owner_id))
+    session.commit()
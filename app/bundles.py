@@ -0,0 +1,245 @@
+# app/bundles.py
+import asyncio
+import hashlib
+import os
+import threading
+from collections import OrderedDict
+from typing import Any, Dict, FrozenSet, List, NamedTuple, Optional, Set, Tuple
+
+import orjson
+from fastapi import HTTPException, status
+from fastapi.concurrency import run_in_threadpool
+from sqlalchemy import String, func, select, type_coerce
+
+from app.cache import resolved_cache
+from app.config import settings
+from app.models import Change, Variable
+from app.utils import chunked, resolve_cached
+
+FORMATS = {
+    "json": "application/json",
+    "msgpack": "application/msgpack",
+}
+
+# Version d'une variable : (id, updated_at) ; None si l'identifiant n'existe pas
+Stamp = Optional[Tuple[int, Any]]
+# updated_at tel que renvoyé par le pilote : seule l'égalité compte, sans conversion en datetime.
+# Deux écritures dans la même seconde (DATETIME de MySQL avant 0006) ont la même
+# marque : le journal des modifications (_ScopeState.cursor) complète la comparaison.
+RAW_UPDATED_AT = type_coerce(Variable.updated_at, String)
+
+
+class _Item(NamedTuple):
+    identifier: str
+    value: Optional[str]
+    error: Optional[str]
+    dependencies: FrozenSet[str]
+
+
+class Bundle(NamedTuple):
+    digest: str
+    owner_id: int
+    category_id: Optional[int]
+    variables: int
+    errors: int
+    rebuilt: int
+
+
+class _ScopeState:
+    """
+    Dernier bundle compilé d'une portée, conservé pour la reconstruction incrémentale.
+    """
+
+    def __init__(self):
+        self.items: Dict[int, _Item] = {}
+        # Versions des variables de la portée et de leurs dépendances transitives lors de la compilation
+        self.stamps: Dict[str, Stamp] = {}
+        # Dernière ligne du journal des modifications du propriétaire vue lors de la compilation
+        self.cursor = 0
+        self.bundle: Optional[Bundle] = None
+
+
+def _msgpack():
+    try:
+        import msgpack
+    except ImportError:
+        raise HTTPException(status_code=status.HTTP_406_NOT_ACCEPTABLE, detail="msgpack support is not installed")
+    return msgpack
+
+
+def bundle_document(owner_id: int, category_id: Optional[int], items: Dict[int, _Item]) -> dict:
+    """
+    Contenu d'un bundle : aucune date, pour qu'un même état donne la même empreinte.
+    """
+    ordered = sorted(items.values(), key=lambda item: item.identifier)
+    return {
+        "owner_id": owner_id,
+        "category_id": category_id,
+        "variables": {item.identifier: item.value for item in ordered if item.error is None},
+        "errors": {item.identifier: item.error for item in ordered if item.error is not None},
+    }
+
+
+class BundleStore:
+    """
+    Bundles publiés, adressés par l'empreinte SHA-256 de leur JSON.
+
+    Les contenus sont gardés en mémoire (LRU de `size` bundles) et, avec
+    `directory`, écrits sur disque (<directory>/<owner_id>/<empreinte>.<format>) :
+    un bundle reste servi après un redémarrage, ou par un autre worker qui
+    partage le répertoire. Le contenu d'une empreinte ne change jamais.
+
+    Chaque portée (utilisateur ou catégorie) garde son dernier état : une
+    nouvelle publication ne résout que les variables ajoutées, modifiées,
+    ou dont une dépendance transitive a changé.
+    """
+
+    def __init__(self, size: int = 128, directory: Optional[str] = None):
+        self.size = size
+        self.directory = directory
+        self._contents: "OrderedDict[Tuple[int, str, str], bytes]" = OrderedDict()
+        self._scopes: "OrderedDict[Tuple[int, Optional[int]], _ScopeState]" = OrderedDict()
+        self._locks: Dict[Tuple[int, Optional[int]], asyncio.Lock] = {}
+        self._lock = threading.Lock()
+
+    def _path(self, owner_id: int, digest: str, fmt: str) -> str:
+        return os.path.join(self.directory, str(owner_id), f"{digest}.{fmt}")
+
+    def _remember(self, key: Tuple[int, str, str], content: bytes) -> None:
+        with self._lock:
+            self._contents[key] = content
+            self._contents.move_to_end(key)
+            while len(self._contents) > self.size * len(FORMATS):
+                self._contents.popitem(last=False)
+
+    def _write(self, owner_id: int, digest: str, fmt: str, content: bytes) -> None:
+        if self.directory is None:
+            return
+        path = self._path(owner_id, digest, fmt)
+        if os.path.exists(path):
+            return
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        # Écriture atomique : un lecteur ne voit jamais de fichier partiel
+        temporary = f"{path}.{os.getpid()}.tmp"
+        with open(temporary, "wb") as output:
+            output.write(content)
+        os.replace(temporary, path)
+
+    def get(self, owner_id: int, digest: str, fmt: str) -> Optional[bytes]:
+        """
+        Contenu d'un bundle publié dans un format, ou None s'il est inconnu.
+
+        Bloquant (lecture disque, encodage msgpack) : à appeler dans le pool de threads.
+        """
+        with self._lock:
+            content = self._contents.get((owner_id, digest, fmt))
+            if content is not None:
+                self._contents.move_to_end((owner_id, digest, fmt))
+                return content
+        if fmt != "json":
+            source = self.get(owner_id, digest, "json")
+            if source is None:
+                return None
+            content = _msgpack().packb(orjson.loads(source), use_bin_type=True)
+        elif self.directory is not None and os.path.exists(self._path(owner_id, digest, fmt)):
+            with open(self._path(owner_id, digest, fmt), "rb") as source:
+                content = source.read()
+        else:
+            return None
+        self._write(owner_id, digest, fmt, content)
+        self._remember((owner_id, digest, fmt), content)
+        return content
+
+    async def publish(self, db, owner_id: int, category_id: Optional[int] = None) -> Bundle:
+        """
+        Compile (ou recompile partiellement) le bundle d'un utilisateur ou d'une catégorie.
+        """
+        key = (owner_id, category_id)
+        lock = self._locks.setdefault(key, asyncio.Lock())
+        async with lock:
+            with self._lock:
+                state = self._scopes.pop(key, None) or _ScopeState()
+            try:
+                return await self._refresh(db, state, owner_id, category_id)
+            finally:
+                with self._lock:
+                    self._scopes[key] = state
+                    while len(self._scopes) > self.size:
+                        self._scopes.popitem(last=False)
+
+    async def _stamps(self, db, owner_id: int, identifiers: Set[str]) -> Dict[str, Stamp]:
+        stamps: Dict[str, Stamp] = dict.fromkeys(identifiers)
+        for batch in chunked(sorted(identifiers)):
+            for identifier, variable_id, updated_at in await db.execute(
+                select(Variable.identifier, Variable.id, RAW_UPDATED_AT).where(Variable.owner_id == owner_id, Variable.identifier.in_(batch))
+            ):
+                stamps[identifier] = (variable_id, updated_at)
+        return stamps
+
+    async def _refresh(self, db, state: _ScopeState, owner_id: int, category_id: Optional[int]) -> Bundle:
+        criteria = [Variable.owner_id == owner_id]
+        if category_id is not None:
+            criteria.append(Variable.category_id == category_id)
+        # Journal lu avant les variables : une écriture concurrente est au pire revue à la publication suivante
+        logged: Set[str] = set()
+        if state.bundle is None:
+            cursor = await db.scalar(select(func.max(Change.id)).where(Change.owner_id == owner_id)) or 0
+        else:
+            cursor = state.cursor
+            for change_id, identifier in await db.execute(
+                select(Change.id, Change.identifier).where(Change.owner_id == owner_id, Change.entity == "variable", Change.id > state.cursor)
+            ):
+                cursor = max(cursor, change_id)
+                logged.add(identifier)
+        rows = (await db.execute(select(Variable.id, Variable.identifier, RAW_UPDATED_AT).where(*criteria))).all()
+
+        # Versions actuelles : variables de la portée, puis dépendances connues hors portée
+        current: Dict[str, Stamp] = {identifier: (variable_id, updated_at) for variable_id, identifier, updated_at in rows}
+        known = set(state.stamps).difference(current)
+        current.update(await self._stamps(db, owner_id, known))
+        previous = state.stamps
+        changed = {identifier for identifier in previous.keys() | current.keys() if previous.get(identifier) != current.get(identifier)}
+        changed.update(logged)
+
+        items = state.items
+        stale = [
+            variable_id for variable_id, identifier, _ in rows
+            # Une variable en erreur est toujours recompilée : ses dépendances ne sont pas connues
+            if variable_id not in items or items[variable_id].error is not None
+            or (changed and (identifier in changed or not changed.isdisjoint(items[variable_id].dependencies)))
+        ]
+        removed = set(items).difference(variable_id for variable_id, _, _ in rows)
+        if state.bundle is not None and not stale and not removed:
+            state.cursor = cursor
+            return state.bundle._replace(rebuilt=0)
+
+        for variable_id in removed:
+            del state.items[variable_id]
+        if stale:
+            # Une valeur modifiée par un autre worker peut être encore dans le tier local du cache
+            resolved_cache.invalidate_variables_by_id(stale)
+            variables: List[Variable] = []
+            for batch in chunked(stale):
+                variables.extend(await db.scalars(select(Variable).where(Variable.id.in_(batch))))
+            dependencies: Dict[int, FrozenSet[str]] = {}
+            values = await resolve_cached(db, variables, return_exceptions=True, dependencies=dependencies)
+            for variable, value in zip(variables, values):
+                error = value.detail if isinstance(value, HTTPException) else None
+                state.items[variable.id] = _Item(variable.identifier, None if error else value, error, dependencies.get(variable.id, frozenset()))
+
+        wanted = set().union(*(item.dependencies for item in state.items.values())) if state.items else set()
+        missing = wanted.difference(current)
+        current.update(await self._stamps(db, owner_id, missing))
+        state.stamps = {identifier: current.get(identifier) for identifier in wanted | {item.identifier for item in state.items.values()}}
+
+        content = orjson.dumps(bundle_document(owner_id, category_id, state.items))
+        digest = hashlib.sha256(content).hexdigest()
+        await run_in_threadpool(self._write, owner_id, digest, "json", content)
+        self._remember((owner_id, digest, "json"), content)
+        errors = sum(1 for item in state.items.values() if item.error is not None)
+        state.cursor = cursor
+        state.bundle = Bundle(digest, owner_id, category_id, len(state.items) - errors, errors, len(stale))
+        return state.bundle
+
+
+bundle_store = BundleStore(size=settings.BUNDLE_CACHE_SIZE, directory=settings.BUNDLE_DIR)
@@ -0,0 +1,251 @@
+# app/cache.py
+import json
+import logging
+import threading
+import time
+from collections import OrderedDict
+from typing import Dict, FrozenSet, Iterable, List, NamedTuple, Optional, Set, Tuple
+
+from app.config import settings
+
+logger = logging.getLogger(__name__)
+
+KEY_PREFIX = "shortpress:resolved:"
+
+
+class InMemoryBackend:
+    """
+    Tier partagé de remplacement, en mémoire (tests, déploiement mono-worker).
+
+    Expose la même interface que les backends de fastapi-cache2.
+    """
+
+    def __init__(self):
+        self._store: Dict[str, Tuple[str, Optional[float]]] = {}
+
+    async def get(self, key: str) -> Optional[str]:
+        item = self._store.get(key)
+        if item is None:
+            return None
+        value, expires_at = item
+        if expires_at is not None and expires_at < time.monotonic():
+            del self._store[key]
+            return None
+        return value
+
+    async def set(self, key: str, value: str, expire: Optional[int] = None) -> None:
+        self._store[key] = (value, time.monotonic() + expire if expire else None)
+
+    async def clear(self, namespace: Optional[str] = None, key: Optional[str] = None) -> int:
+        if namespace:
+            keys = [k for k in self._store if k.startswith(namespace)]
+        else:
+            keys = [key] if key in self._store else []
+        for k in keys:
+            del self._store[k]
+        return len(keys)
+
+
+class _Entry(NamedTuple):
+    value: str
+    owner_id: int
+    identifier: str
+    dependencies: FrozenSet[str]
+    expires_at: float
+
+
+class ResolvedValueCache:
+    """
+    Cache des valeurs résolues, indexé par identifiant de variable.
+
+    Chaque entrée connaît l'ensemble transitif des identifiants dont sa valeur
+    dépend ; l'index inverse (« qui référence X ») permet d'invalider
+    exactement les entrées concernées lorsqu'une variable change.
+
+    Le tier local est un LRU borné. Le tier partagé optionnel (Redis via
+    fastapi-cache2) est alimenté par flush(). Les écritures des autres
+    workers sont invalidées d'après le journal des modifications
+    (app.changes.CacheSync), à CACHE_SYNC_INTERVAL près.
+    """
+
+    def __init__(self, maxsize: int = 10000, ttl: int = 300, backend=None):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self.backend = backend
+        self.hits = 0
+        self.misses = 0
+        self._entries: "OrderedDict[int, _Entry]" = OrderedDict()
+        self._dependents: Dict[Tuple[int, str], Set[int]] = {}
+        self._pending_sets: Dict[int, _Entry] = {}
+        self._pending_deletes: Set[int] = set()
+        self._lock = threading.Lock()
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def _index(self, variable_id: int, entry: _Entry) -> None:
+        for identifier in entry.dependencies | {entry.identifier}:
+            self._dependents.setdefault((entry.owner_id, identifier), set()).add(variable_id)
+
+    def _drop(self, variable_id: int) -> Optional[_Entry]:
+        entry = self._entries.pop(variable_id, None)
+        if entry is None:
+            return None
+        for identifier in entry.dependencies | {entry.identifier}:
+            ids = self._dependents.get((entry.owner_id, identifier))
+            if ids is not None:
+                ids.discard(variable_id)
+                if not ids:
+                    del self._dependents[(entry.owner_id, identifier)]
+        return entry
+
+    def _store(self, variable_id: int, entry: _Entry) -> None:
+        self._drop(variable_id)
+        self._entries[variable_id] = entry
+        self._index(variable_id, entry)
+        while len(self._entries) > self.maxsize:
+            self._drop(next(iter(self._entries)))
+
+    def __contains__(self, variable_id: int) -> bool:
+        # Sans effet sur le LRU ni sur les statistiques
+        with self._lock:
+            entry = self._entries.get(variable_id)
+            return entry is not None and entry.expires_at >= time.monotonic()
+
+    def get(self, variable_id: int) -> Optional[str]:
+        entry = self.get_entry(variable_id)
+        return entry.value if entry is not None else None
+
+    def get_entry(self, variable_id: int) -> Optional[_Entry]:
+        """
+        Entrée valide d'une variable (valeur résolue et dépendances transitives), ou None.
+        """
+        with self._lock:
+            entry = self._entries.get(variable_id)
+            if entry is None or entry.expires_at < time.monotonic():
+                if entry is not None:
+                    self._drop(variable_id)
+                self.misses += 1
+                return None
+            self._entries.move_to_end(variable_id)
+            self.hits += 1
+            return entry
+
+    def set(self, variable_id: int, owner_id: int, identifier: str, value: str, dependencies: Iterable[str]) -> None:
+        entry = _Entry(value, owner_id, identifier, frozenset(dependencies), time.monotonic() + self.ttl)
+        with self._lock:
+            self._store(variable_id, entry)
+            if self.backend is not None:
+                self._pending_sets[variable_id] = entry
+                self._pending_deletes.discard(variable_id)
+
+    def invalidate(self, owner_id: int, identifiers: Iterable[str]) -> List[int]:
+        """
+        Invalide les entrées qui dépendent, directement ou non, des identifiants donnés.
+        """
+        with self._lock:
+            affected: Set[int] = set()
+            for identifier in identifiers:
+                affected |= self._dependents.get((owner_id, identifier), set())
+            for variable_id in affected:
+                self._drop(variable_id)
+                self._pending_sets.pop(variable_id, None)
+            if self.backend is not None:
+                self._pending_deletes |= affected
+            return sorted(affected)
+
+    def invalidate_variables(self, variables: Iterable) -> List[int]:
+        """
+        Invalide des variables modifiées ou supprimées ainsi que tout ce qui en dépend.
+        """
+        affected: Set[int] = set()
+        by_owner: Dict[int, Set[str]] = {}
+        for variable in variables:
+            by_owner.setdefault(variable.owner_id, set()).add(variable.identifier)
+            affected.add(variable.id)
+        for owner_id, identifiers in by_owner.items():
+            affected.update(self.invalidate(owner_id, identifiers))
+        # Les identifiants propres sont aussi purgés du tier partagé, même s'ils n'étaient pas indexés ici
+        return self.invalidate_variables_by_id(affected)
+
+    def invalidate_owner(self, owner_id: int) -> List[int]:
+        with self._lock:
+            affected = [variable_id for variable_id, entry in self._entries.items() if entry.owner_id == owner_id]
+        return self.invalidate_variables_by_id(affected)
+
+    def invalidate_variables_by_id(self, variable_ids: Iterable[int]) -> List[int]:
+        with self._lock:
+            affected = set(variable_ids)
+            for variable_id in affected:
+                self._drop(variable_id)
+                self._pending_sets.pop(variable_id, None)
+            if self.backend is not None:
+                self._pending_deletes |= affected
+            return sorted(affected)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+            self._dependents.clear()
+            self._pending_sets.clear()
+            self._pending_deletes.clear()
+
+    async def load(self, variable_ids: Iterable[int]) -> None:
+        """
+        Complète le tier local à partir du tier partagé pour les identifiants absents.
+        """
+        if self.backend is None:
+            return
+        with self._lock:
+            missing = [variable_id for variable_id in variable_ids if variable_id not in self._entries]
+        for variable_id in missing:
+            payload = await self.backend.get(f"{KEY_PREFIX}{variable_id}")
+            if not payload:
+                continue
+            data = json.loads(payload)
+            entry = _Entry(data["value"], data["owner_id"], data["identifier"], frozenset(data["dependencies"]), time.monotonic() + self.ttl)
+            with self._lock:
+                if variable_id not in self._pending_deletes:
+                    self._store(variable_id, entry)
+
+    async def flush(self) -> None:
+        """
+        Pousse vers le tier partagé les écritures et invalidations en attente.
+        """
+        if self.backend is None:
+            return
+        with self._lock:
+            pending_sets, self._pending_sets = self._pending_sets, {}
+            pending_deletes, self._pending_deletes = self._pending_deletes, set()
+        try:
+            for variable_id in pending_deletes:
+                await self.backend.clear(key=f"{KEY_PREFIX}{variable_id}")
+            for variable_id, entry in pending_sets.items():
+                payload = json.dumps({
+                    "value": entry.value,
+                    "owner_id": entry.owner_id,
+                    "identifier": entry.identifier,
+                    "dependencies": sorted(entry.dependencies),
+                })
+                await self.backend.set(f"{KEY_PREFIX}{variable_id}", payload, expire=self.ttl)
+        except Exception as e:
+            logger.warning("Tier partagé du cache indisponible : %s", e)
+
+
+def _build_backend():
+    if not settings.CACHE_REDIS_URL:
+        return None
+    try:
+        from redis import asyncio as aioredis
+    except ImportError:
+        import aioredis
+    from fastapi_cache.backends.redis import RedisBackend
+
+    return RedisBackend(aioredis.from_url(settings.CACHE_REDIS_URL, decode_responses=True))
+
+
+resolved_cache = ResolvedValueCache(
+    maxsize=settings.RESOLVED_CACHE_SIZE,
+    ttl=settings.RESOLVED_CACHE_TTL,
+    backend=_build_backend(),
+)
@@ -0,0 +1,560 @@
+# app/changes.py
+import asyncio
+import logging
+from collections import OrderedDict
+from datetime import datetime
+from typing import Any, AsyncIterator, Dict, FrozenSet, List, NamedTuple, Optional, Set, Tuple
+
+import orjson
+from fastapi import HTTPException, status
+from sqlalchemy import delete, event, func, select
+from sqlalchemy.orm import Session
+
+from app.cache import resolved_cache
+from app.config import settings
+from app.database import open_session
+from app.models import Category, Change, Variable
+from app.serialization import category_records, load_parent_rows, select_category_rows, select_variable_rows, variable_records
+from app.utils import chunked, resolve_cached, template_references
+
+logger = logging.getLogger(__name__)
+
+CHANGE_COLUMNS = (Change.id, Change.owner_id, Change.entity, Change.entity_id, Change.identifier, Change.deleted)
+
+
+class _VariableKey(NamedTuple):
+    # Ce qu'attend resolved_cache.invalidate_variables, pour une variable éventuellement supprimée
+    id: int
+    owner_id: int
+    identifier: str
+
+
+async def current_cursor(db) -> int:
+    return await db.scalar(select(func.max(Change.id))) or 0
+
+
+class _OwnerReferences:
+    """
+    Index inverse des références d'un propriétaire, à jour jusqu'à la ligne `cursor` du journal.
+    """
+
+    def __init__(self, cursor: int):
+        self.cursor = cursor
+        # Variables à modèle : id -> (identifiant, identifiants référencés)
+        self.variables: Dict[int, Tuple[str, FrozenSet[str]]] = {}
+        self.referenced_by: Dict[str, Set[int]] = {}
+
+    def put(self, variable_id: int, identifier: str, value: Optional[str]) -> None:
+        self.drop(variable_id)
+        try:
+            references = frozenset(template_references(value))
+        except HTTPException:
+            # Référence mal formée : la variable est en erreur quoi qu'il arrive
+            return
+        if references:
+            self.variables[variable_id] = (identifier, references)
+            for reference in references:
+                self.referenced_by.setdefault(reference, set()).add(variable_id)
+
+    def drop(self, variable_id: int) -> None:
+        entry = self.variables.pop(variable_id, None)
+        if entry is None:
+            return
+        for reference in entry[1]:
+            ids = self.referenced_by.get(reference)
+            if ids is not None:
+                ids.discard(variable_id)
+                if not ids:
+                    del self.referenced_by[reference]
+
+    def dependents(self, identifiers: Set[str]) -> Set[int]:
+        found: Set[int] = set()
+        frontier = set(identifiers)
+        seen = set(identifiers)
+        while frontier:
+            following = set()
+            for reference in frontier:
+                for variable_id in self.referenced_by.get(reference, ()):
+                    found.add(variable_id)
+                    identifier = self.variables[variable_id][0]
+                    if identifier not in seen:
+                        seen.add(identifier)
+                        following.add(identifier)
+            frontier = following
+        return found
+
+
+class ReferenceIndex:
+    """
+    Index inverse des références {{identifiant}}, par propriétaire, pour build_deltas.
+
+    Construit à la première demande (lecture des valeurs à modèle du
+    propriétaire), puis tenu à jour depuis le journal : seules les variables
+    journalisées depuis sont relues. Les triggers journalisant toute écriture
+    (ORM, ensembliste, import), l'index de chaque worker reste exact ; il est
+    reconstruit si le journal a été purgé au-delà de son curseur.
+    """
+
+    def __init__(self, size: int = 1000):
+        self.size = size
+        self._owners: "OrderedDict[int, _OwnerReferences]" = OrderedDict()
+        self._locks: Dict[int, asyncio.Lock] = {}
+
+    async def _load(self, db, owner_id: int) -> _OwnerReferences:
+        # Curseur lu avant les valeurs : une écriture concurrente est relue au rattrapage suivant
+        references = _OwnerReferences(await db.scalar(select(func.max(Change.id)).where(Change.owner_id == owner_id)) or 0)
+        for variable_id, identifier, value in await db.execute(
+            select(Variable.id, Variable.identifier, Variable.value).where(Variable.owner_id == owner_id, Variable.value.contains("{{"))
+        ):
+            references.put(variable_id, identifier, value)
+        return references
+
+    async def _catch_up(self, db, owner_id: int, references: _OwnerReferences) -> bool:
+        oldest = await db.scalar(select(func.min(Change.id)))
+        if oldest is not None and references.cursor < oldest - 1:
+            return False
+        changes = (await db.execute(
+            select(Change.id, Change.entity_id).where(Change.owner_id == owner_id, Change.entity == "variable", Change.id > references.cursor)
+        )).all()
+        if not changes:
+            return True
+        changed = {entity_id for _, entity_id in changes}
+        rows: Dict[int, Any] = {}
+        for batch in chunked(sorted(changed)):
+            rows.update((row.id, row) for row in await db.execute(
+                select(Variable.id, Variable.identifier, Variable.value).where(Variable.id.in_(batch), Variable.owner_id == owner_id)
+            ))
+        for variable_id in changed:
+            # Absente : supprimée, ou passée à un autre propriétaire
+            row = rows.get(variable_id)
+            if row is None:
+                references.drop(variable_id)
+            else:
+                references.put(row.id, row.identifier, row.value)
+        references.cursor = max(change_id for change_id, _ in changes)
+        return True
+
+    async def dependents(self, db, owner_id: int, identifiers: Set[str]) -> Set[int]:
+        """
+        Ids des variables du propriétaire qui référencent, directement ou non, les identifiants donnés.
+        """
+        lock = self._locks.setdefault(owner_id, asyncio.Lock())
+        async with lock:
+            references = self._owners.pop(owner_id, None)
+            if references is None or not await self._catch_up(db, owner_id, references):
+                references = await self._load(db, owner_id)
+            self._owners[owner_id] = references
+            while len(self._owners) > self.size:
+                evicted, _ = self._owners.popitem(last=False)
+                self._locks.pop(evicted, None)
+            return references.dependents(identifiers)
+
+    def clear(self) -> None:
+        self._owners.clear()
+
+
+reference_index = ReferenceIndex(size=settings.CHANGES_REFERENCE_OWNERS)
+
+
+async def dependent_rows(db, owner_id: int, identifiers: Set[str], exclude: Set[int]) -> List[Any]:
+    """
+    Variables du propriétaire dont la valeur résolue dépend, directement ou
+    non, des identifiants donnés (leur ligne n'a pas changé, leur valeur si).
+    """
+    found = await reference_index.dependents(db, owner_id, identifiers)
+    rows = []
+    for batch in chunked(sorted(found.difference(exclude))):
+        rows.extend((await db.execute(select_variable_rows().where(Variable.id.in_(batch)))).all())
+    return rows
+
+
+async def build_deltas(db, changes: List[Any]) -> List[Dict[str, Any]]:
+    """
+    Deltas d'une suite de lignes du journal : état actuel de chaque entité
+    modifiée (une entrée par entité, au curseur de sa dernière modification),
+    suppressions, et variables dont seule la valeur résolue a changé.
+
+    Une entité modifiée puis supprimée (plus loin dans le journal) est déjà
+    renvoyée comme supprimée.
+    """
+    latest: Dict[tuple, Any] = {}
+    for change in changes:
+        latest.pop((change.entity, change.entity_id), None)
+        latest[(change.entity, change.entity_id)] = change
+    if not latest:
+        return []
+
+    variable_ids = [entity_id for (entity, entity_id), change in latest.items() if entity == "variable" and not change.deleted]
+    category_ids = [entity_id for (entity, entity_id), change in latest.items() if entity == "category" and not change.deleted]
+    variables: Dict[int, Any] = {}
+    for batch in chunked(variable_ids):
+        variables.update((row.id, row) for row in (await db.execute(select_variable_rows().where(Variable.id.in_(batch)))).all())
+    categories: Dict[int, Dict[str, Any]] = {}
+    for batch in chunked(category_ids):
+        categories.update((record["id"], record) for record in category_records((await db.execute(select_category_rows().where(Category.id.in_(batch)))).all()))
+
+    # Valeurs résolues : variables modifiées et celles qui en dépendent, par propriétaire
+    changed = [
+        _VariableKey(change.entity_id, change.owner_id, change.identifier)
+        for (entity, _), change in latest.items() if entity == "variable" and change.owner_id is not None
+    ]
+    by_owner: Dict[int, Set[str]] = {}
+    last: Dict[int, int] = {}
+    for (entity, _), change in latest.items():
+        if entity == "variable" and change.owner_id is not None:
+            by_owner.setdefault(change.owner_id, set()).add(change.identifier)
+            last[change.owner_id] = max(last.get(change.owner_id, 0), change.id)
+    # Une variable dont seule la valeur résolue change prend le curseur du dernier changement de son propriétaire
+    dependents: Dict[int, Any] = {}
+    for owner_id, identifiers in by_owner.items():
+        for row in await dependent_rows(db, owner_id, identifiers, set(variables)):
+            dependents[row.id] = (last[owner_id], row)
+
+    # Écritures possibles dans un autre worker : le tier local du cache n'en a pas été informé
+    resolved_cache.invalidate_variables(changed)
+    rows = list(variables.values()) + [row for _, row in dependents.values()]
+    values = dict(zip((row.id for row in rows), await resolve_cached(db, rows, return_exceptions=True)))
+    records = {record["id"]: record for record in variable_records(rows, await load_parent_rows(db, rows))}
+
+    def entry(cursor: int, entity: str, entity_id: int, record: Optional[Dict[str, Any]]) -> Dict[str, Any]:
+        data = {"cursor": cursor, "entity": entity, "id": entity_id, "deleted": record is None, entity: record}
+        if entity == "variable" and record is not None:
+            value = values[entity_id]
+            error = isinstance(value, HTTPException)
+            data.update(resolved_value=None if error else value, detail=value.detail if error else None)
+        return data
+
+    deltas = []
+    for (entity, entity_id), change in latest.items():
+        record = None if change.deleted else (records if entity == "variable" else categories).get(entity_id)
+        deltas.append(entry(change.id, entity, entity_id, record))
+    deltas.extend(entry(cursor, "variable", row.id, records[row.id]) for cursor, row in dependents.values())
+    deltas.sort(key=lambda item: item["cursor"])
+    return deltas
+
+
+async def read_changes(db, owner_id: Optional[int], since: int, limit: int) -> Dict[str, Any]:
+    """
+    Page du journal après `since` : {"cursor", "changes", "has_more"}.
+
+    owner_id None : tous les propriétaires (administrateurs). Un curseur
+    antérieur à la purge du journal (prune_changes) est refusé (410) : le
+    client doit tout relire.
+    """
+    oldest = await db.scalar(select(func.min(Change.id)))
+    if oldest is not None and since < oldest - 1:
+        raise HTTPException(status_code=status.HTTP_410_GONE, detail="Cursor is older than the change log; resynchronize")
+    statement = select(*CHANGE_COLUMNS).where(Change.id > since)
+    if owner_id is not None:
+        statement = statement.where(Change.owner_id == owner_id)
+    rows = (await db.execute(statement.order_by(Change.id).limit(limit + 1))).all()
+    has_more = len(rows) > limit
+    rows = rows[:limit]
+    return {"cursor": rows[-1].id if rows else since, "changes": await build_deltas(db, rows), "has_more": has_more}
+
+
+def prune_changes(session: Session, before: datetime) -> int:
+    """
+    Supprime les lignes du journal antérieures à `before` ; la plus récente est
+    toujours gardée (elle borne les curseurs encore valides).
+    """
+    newest = session.scalar(select(func.max(Change.id)))
+    if newest is None:
+        return 0
+    result = session.execute(delete(Change).where(Change.changed_at < before, Change.id < newest))
+    session.commit()
+    return result.rowcount
+
+
+class CacheSync:
+    """
+    Invalidation du cache des valeurs résolues d'après le journal.
+
+    Une écriture n'invalide que le tier local du worker qui l'a faite (et
+    les entrées partagées qu'il a indexées). Chaque worker lit donc le
+    journal toutes les `interval` secondes : les variables modifiées par
+    les autres workers ou processus (python -m app, autre instance), et ce
+    qui en dépend, sont invalidées dans son tier local et dans le tier
+    partagé. Ses propres écritures y repassent : au pire un défaut de cache.
+    """
+
+    def __init__(self, interval: float = 1.0, batch_size: int = 1000):
+        self.interval = interval
+        self.batch_size = batch_size
+        self._cursor: Optional[int] = None
+        self._task: Optional[asyncio.Task] = None
+
+    def start(self) -> None:
+        if self.interval > 0 and (self._task is None or self._task.done()):
+            self._task = asyncio.get_running_loop().create_task(self._run())
+
+    async def _run(self) -> None:
+        while True:
+            try:
+                await self.poll()
+            except Exception:
+                logger.exception("Invalidation du cache d'après le journal en échec")
+            await asyncio.sleep(self.interval)
+
+    async def poll(self) -> int:
+        """
+        Invalide les variables journalisées depuis la lecture précédente ; renvoie le nombre de lignes lues.
+        """
+        db = open_session()
+        read = 0
+        try:
+            if self._cursor is not None:
+                oldest = await db.scalar(select(func.min(Change.id)))
+                if oldest is not None and self._cursor < oldest - 1:
+                    # Journal purgé au-delà du curseur : les modifications manquantes sont inconnues
+                    resolved_cache.clear()
+                    self._cursor = None
+            if self._cursor is None:
+                # Premier passage : seules les modifications suivantes concernent le cache
+                self._cursor = await current_cursor(db)
+                return 0
+            while True:
+                rows = (await db.execute(
+                    select(*CHANGE_COLUMNS).where(Change.id > self._cursor).order_by(Change.id).limit(self.batch_size)
+                )).all()
+                if not rows:
+                    break
+                # Les catégories n'entrent pas dans les valeurs résolues
+                variables = [row for row in rows if row.entity == "variable"]
+                resolved_cache.invalidate_variables(_VariableKey(row.entity_id, row.owner_id, row.identifier) for row in variables if row.owner_id is not None)
+                resolved_cache.invalidate_variables_by_id(row.entity_id for row in variables if row.owner_id is None)
+                self._cursor = rows[-1].id
+                read += len(rows)
+                if len(rows) < self.batch_size:
+                    break
+        finally:
+            await db.close()
+        await resolved_cache.flush()
+        return read
+
+    async def close(self) -> None:
+        if self._task is not None:
+            self._task.cancel()
+            await asyncio.gather(self._task, return_exceptions=True)
+            self._task = None
+
+
+cache_sync = CacheSync(interval=settings.CACHE_SYNC_INTERVAL, batch_size=settings.CHANGES_PAGE_SIZE)
+
+
+class ChangeEvent(NamedTuple):
+    first: int
+    cursor: int
+    changes: List[Dict[str, Any]]
+    # Encodé une fois, partagé par tous les abonnés
+    payload: bytes
+
+
+def encode_event(first: int, cursor: int, changes: List[Dict[str, Any]]) -> ChangeEvent:
+    return ChangeEvent(first, cursor, changes, orjson.dumps({"cursor": cursor, "changes": changes, "has_more": False}))
+
+
+class Subscription:
+    """
+    Abonné au flux d'un propriétaire (None : tous). La file est bornée : un
+    abonné trop lent est marqué en retard et relit le journal à son curseur.
+    """
+
+    def __init__(self, owner_id: Optional[int], cursor: int, size: int):
+        self.owner_id = owner_id
+        self.cursor = cursor
+        # None : battement (maintien de la connexion) ou fin du flux
+        self.queue: "asyncio.Queue[Optional[ChangeEvent]]" = asyncio.Queue(size)
+        self.lagging = False
+
+    def push(self, change_event: ChangeEvent) -> None:
+        if self.lagging:
+            return
+        try:
+            self.queue.put_nowait(change_event)
+        except asyncio.QueueFull:
+            self.lagging = True
+
+    def tick(self) -> None:
+        # Une file pleine n'a pas besoin de battement
+        if self.queue.empty():
+            self.queue.put_nowait(None)
+
+
+class ChangeHub:
+    """
+    Diffusion en processus des deltas du journal aux abonnés du worker.
+
+    Une seule tâche lit le journal (toutes les `poll_interval` secondes, ou
+    dès qu'une session de ce worker valide une transaction) et construit les
+    deltas une fois par propriétaire ; chaque abonné ne coûte qu'une file
+    (les battements sont envoyés par cette même tâche, sans minuterie par
+    abonné). La tâche s'arrête sans abonné. Le journal étant en base, les écritures
+    des autres workers et des tâches de fond sont aussi diffusées.
+    """
+
+    def __init__(self, poll_interval: float = 1.0, heartbeat: float = 15.0, queue_size: int = 100, batch_size: int = 1000):
+        self.poll_interval = poll_interval
+        self.heartbeat = heartbeat
+        self.queue_size = queue_size
+        self.batch_size = batch_size
+        self._subscriptions: Dict[Optional[int], Set[Subscription]] = {}
+        self._cursor = 0
+        self._task: Optional[asyncio.Task] = None
+        self._wakeup: Optional[asyncio.Event] = None
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._closed = False
+
+    def __len__(self) -> int:
+        return sum(len(subscriptions) for subscriptions in self._subscriptions.values())
+
+    def notify(self) -> None:
+        """
+        Réveille la tâche de lecture ; appelable depuis n'importe quel thread.
+        """
+        loop, wakeup = self._loop, self._wakeup
+        if loop is not None and wakeup is not None and not loop.is_closed():
+            loop.call_soon_threadsafe(wakeup.set)
+
+    async def _subscribe(self, owner_id: Optional[int], since: Optional[int]) -> Subscription:
+        if self._task is None or self._task.done():
+            db = open_session()
+            try:
+                cursor = await current_cursor(db)
+            finally:
+                await db.close()
+        if self._task is None or self._task.done():
+            self._cursor = cursor
+            self._loop = asyncio.get_running_loop()
+            self._wakeup = asyncio.Event()
+            self._task = self._loop.create_task(self._run())
+        subscription = Subscription(owner_id, self._cursor if since is None else since, self.queue_size)
+        # Reprise : le journal est relu depuis `since` avant les événements diffusés
+        subscription.lagging = since is not None
+        self._subscriptions.setdefault(owner_id, set()).add(subscription)
+        return subscription
+
+    def _unsubscribe(self, subscription: Subscription) -> None:
+        subscriptions = self._subscriptions.get(subscription.owner_id)
+        if subscriptions is not None:
+            subscriptions.discard(subscription)
+            if not subscriptions:
+                del self._subscriptions[subscription.owner_id]
+
+    async def stream(self, owner_id: Optional[int], since: Optional[int]) -> AsyncIterator[Optional[ChangeEvent]]:
+        """
+        Événements d'un abonné, dans l'ordre du journal ; None toutes les
+        `heartbeat` secondes (maintien de la connexion).
+        """
+        subscription = await self._subscribe(owner_id, since)
+        try:
+            while not self._closed:
+                if subscription.lagging:
+                    while not subscription.queue.empty():
+                        subscription.queue.get_nowait()
+                    subscription.lagging = False
+                    db = open_session()
+                    try:
+                        page = await read_changes(db, owner_id, subscription.cursor, self.batch_size)
+                    finally:
+                        await db.close()
+                    subscription.lagging = page["has_more"]
+                    if page["changes"]:
+                        yield encode_event(subscription.cursor + 1, page["cursor"], page["changes"])
+                    subscription.cursor = page["cursor"]
+                    continue
+                change_event = await subscription.queue.get()
+                if change_event is None:
+                    if not self._closed:
+                        yield None
+                    continue
+                if change_event.cursor <= subscription.cursor:
+                    continue
+                if change_event.first <= subscription.cursor:
+                    # Déjà lu en partie lors de la reprise
+                    changes = [item for item in change_event.changes if item["cursor"] > subscription.cursor]
+                    change_event = encode_event(subscription.cursor + 1, change_event.cursor, changes)
+                subscription.cursor = change_event.cursor
+                if change_event.changes:
+                    yield change_event
+        finally:
+            self._unsubscribe(subscription)
+
+    async def _run(self) -> None:
+        beat = self._loop.time()
+        while self._subscriptions and not self._closed:
+            try:
+                await asyncio.wait_for(self._wakeup.wait(), self.poll_interval)
+            except asyncio.TimeoutError:
+                pass
+            self._wakeup.clear()
+            if self._loop.time() - beat >= self.heartbeat:
+                beat = self._loop.time()
+                for subscriptions in list(self._subscriptions.values()):
+                    for subscription in list(subscriptions):
+                        subscription.tick()
+            try:
+                await self._poll()
+            except Exception:
+                logger.exception("Lecture du journal des modifications en échec")
+
+    async def _poll(self) -> None:
+        db = open_session()
+        try:
+            while self._subscriptions:
+                rows = (await db.execute(
+                    select(*CHANGE_COLUMNS).where(Change.id > self._cursor).order_by(Change.id).limit(self.batch_size)
+                )).all()
+                if not rows:
+                    return
+                everyone = None in self._subscriptions
+                by_owner: Dict[int, List[Any]] = {}
+                for row in rows:
+                    if everyone or row.owner_id in self._subscriptions:
+                        by_owner.setdefault(row.owner_id, []).append(row)
+                first, cursor = rows[0].id, rows[-1].id
+                combined = []
+                for owner_id, owner_rows in by_owner.items():
+                    changes = await build_deltas(db, owner_rows)
+                    combined.extend(changes)
+                    change_event = encode_event(first, cursor, changes)
+                    for subscription in list(self._subscriptions.get(owner_id, ())):
+                        subscription.push(change_event)
+                if everyone:
+                    combined.sort(key=lambda item: item["cursor"])
+                    change_event = encode_event(first, cursor, combined)
+                    for subscription in list(self._subscriptions.get(None, ())):
+                        subscription.push(change_event)
+                self._cursor = cursor
+                if len(rows) < self.batch_size:
+                    return
+        finally:
+            await db.close()
+
+    async def close(self) -> None:
+        """
+        Termine les flux et la tâche de lecture (arrêt de l'application).
+        """
+        self._closed = True
+        for subscriptions in self._subscriptions.values():
+            for subscription in subscriptions:
+                while not subscription.queue.empty():
+                    subscription.queue.get_nowait()
+                subscription.queue.put_nowait(None)
+        if self._task is not None:
+            self._task.cancel()
+            await asyncio.gather(self._task, return_exceptions=True)
+
+
+change_hub = ChangeHub(
+    poll_interval=settings.CHANGES_POLL_INTERVAL,
+    heartbeat=settings.CHANGES_HEARTBEAT,
+    queue_size=settings.CHANGES_QUEUE_SIZE,
+    batch_size=settings.CHANGES_PAGE_SIZE,
+)
+
+
+@event.listens_for(Session, "after_commit")
+def _notify_hub(session: Session) -> None:
+    # Toute transaction validée dans ce worker peut avoir écrit dans le journal
+    change_hub.notify()
@@ -1,8 +1,135 @@
 # app/config.py
+from typing import Dict, Optional
+
+from pydantic_settings import BaseSettings, SettingsConfigDict
+
+
+class Settings(BaseSettings):
+    """
+    Configuration de l'application, lue depuis l'environnement (et le fichier .env).
+    """
+
+    model_config = SettingsConfigDict(env_file=".env", extra="ignore")
 
-class Settings:
     PROJECT_NAME: str = "shortpress"
     API_V1_STR: str = "/api/v1"
+    SECRET_KEY: Optional[str] = None
+
+    # Création du schéma et de l'administrateur initial au démarrage (sinon : python -m app init-db)
+    DB_INIT_ON_STARTUP: bool = False
+    FIRST_SUPERUSER: Optional[str] = None
+    FIRST_SUPERUSER_PASSWORD: Optional[str] = None
+
+    # Base de données (URL synchrone ; le pilote asynchrone est déduit du dialecte)
+    DATABASE_URL: str = "sqlite:///./variables.db"
+    # Accès base de données : pilote asynchrone (aiosqlite / aiomysql) ou session synchrone dans le pool de threads
+    DB_ASYNC: bool = True
+    DB_ECHO: bool = False
+    DB_POOL_SIZE: int = 5
+    DB_MAX_OVERFLOW: int = 10
+    DB_POOL_TIMEOUT: int = 30
+    # Inférieur au wait_timeout de MySQL : une connexion inactive n'est jamais réutilisée après coupure
+    DB_POOL_RECYCLE: int = 1800
+    DB_POOL_PRE_PING: bool = True
+
+    # Pragmas SQLite appliqués à chaque connexion
+    SQLITE_JOURNAL_MODE: str = "WAL"
+    SQLITE_SYNCHRONOUS: str = "NORMAL"
+    SQLITE_MMAP_SIZE: int = 256 * 1024 * 1024
+    # Valeur négative : taille en Kio (ici 64 Mio par connexion)
+    SQLITE_CACHE_SIZE: int = -64000
+    SQLITE_BUSY_TIMEOUT: int = 5000
+
+    # Hash des mots de passe (bcrypt) : coût, threads dédiés, calculs en attente avant refus (503)
+    BCRYPT_ROUNDS: int = 12
+    PASSWORD_HASH_WORKERS: Optional[int] = None
+    PASSWORD_HASH_MAX_QUEUE: int = 64
+
+    # Cache des jetons validés (authentification sans requête)
+    AUTH_CACHE_SIZE: int = 10000
+    AUTH_CACHE_TTL: int = 60
+
+    # Cache des valeurs résolues ; lecture du journal des modifications (secondes, 0 : jamais)
+    # pour invalider ce qu'ont modifié les autres workers ou processus
+    RESOLVED_CACHE_SIZE: int = 10000
+    RESOLVED_CACHE_TTL: int = 300
+    CACHE_REDIS_URL: Optional[str] = None
+    CACHE_SYNC_INTERVAL: float = 1.0
+
+    # Métriques Prometheus (/metrics) et en-tête Server-Timing
+    METRICS_ENABLED: bool = True
+    METRICS_SERVER_TIMING: bool = False
+
+    # Listes sérialisées directement depuis les lignes SQL, encodées par orjson (sans validation pydantic)
+    FAST_SERIALIZATION: bool = False
+
+    # Opérations de masse (suppressions, réaffectations) : lignes par transaction, et au-delà
+    # de combien de variables l'opération passe en tâche de fond (202 + /jobs/{id})
+    BULK_CHUNK_SIZE: int = 1000
+    BULK_BACKGROUND_THRESHOLD: int = 10000
+    JOB_HISTORY_SIZE: int = 100
+
+    # Bundles publiés (variables résolues d'un utilisateur ou d'une catégorie) : nombre gardé
+    # en mémoire, répertoire de persistance facultatif, durée de cache HTTP (contenu immuable)
+    BUNDLE_CACHE_SIZE: int = 128
+    BUNDLE_DIR: Optional[str] = None
+    BUNDLE_MAX_AGE: int = 365 * 24 * 3600
+
+    # Journal des modifications et flux temps réel : lecture du journal (secondes), message de
+    # maintien des flux inactifs (secondes), événements en attente par abonné, lignes par page,
+    # conservation (python -m app prune-changes), propriétaires dont l'index inverse des
+    # références est gardé en mémoire par worker
+    CHANGES_POLL_INTERVAL: float = 1.0
+    CHANGES_HEARTBEAT: float = 15.0
+    CHANGES_QUEUE_SIZE: int = 100
+    CHANGES_PAGE_SIZE: int = 1000
+    CHANGES_RETENTION_DAYS: int = 30
+    CHANGES_REFERENCE_OWNERS: int = 1000
+
+    # Contrôle d'admission (429 / 503 avec Retry-After) : jetons par utilisateur ou adresse IP
+    # (coût rendu par seconde, réserve), requêtes simultanées par route (0 : sans limite),
+    # coûts et limites propres à certaines routes, en JSON ({"GET /api/v1/...": 5}).
+    # Sans Redis, les limites s'appliquent par worker ; un créneau d'un worker arrêté
+    # expire après ADMISSION_SLOT_TTL secondes
+    ADMISSION_ENABLED: bool = False
+    ADMISSION_USER_RATE: float = 50.0
+    ADMISSION_USER_BURST: float = 200.0
+    ADMISSION_MAX_CONCURRENCY: int = 64
+    ADMISSION_ROUTE_COSTS: Dict[str, float] = {}
+    ADMISSION_ROUTE_CONCURRENCY: Dict[str, int] = {}
+    ADMISSION_REDIS_URL: Optional[str] = None
+    ADMISSION_SLOT_TTL: int = 60
+
+    # Serveur de production (python -m app serve) : adresse, workers (défaut : un par cœur),
+    # recyclage d'un worker après N requêtes (0 : jamais) plus une part aléatoire, délai d'arrêt
+    # gracieux (secondes), préchauffage avant d'accepter des connexions et nombre de variables
+    # récemment modifiées dont la valeur résolue est préchargée
+    SERVER_HOST: str = "0.0.0.0"
+    SERVER_PORT: int = 8000
+    SERVER_WORKERS: Optional[int] = None
+    SERVER_MAX_REQUESTS: int = 0
+    SERVER_MAX_REQUESTS_JITTER: int = 0
+    SERVER_GRACEFUL_TIMEOUT: int = 30
+    SERVER_WARMUP: bool = True
+    SERVER_WARMUP_VARIABLES: int = 1000
+
+    # Journalisation : niveau racine et niveaux par logger ({"app.changes": "DEBUG"} en JSON),
+    # format (json : une ligne JSON par message ; text), part conservée des messages INFO et
+    # DEBUG par logger ({"uvicorn.access": 0.1}), messages en attente d'écriture (0 : écriture
+    # synchrone, sans thread), en-tête portant l'identifiant de requête
+    LOG_LEVEL: str = "INFO"
+    LOG_LEVELS: Dict[str, str] = {}
+    LOG_FORMAT: str = "json"
+    LOG_SAMPLING: Dict[str, float] = {}
+    LOG_QUEUE_SIZE: int = 10000
+    LOG_REQUEST_ID_HEADER: str = "X-Request-ID"
+
+    # Génération de documents Word par lots
+    DOCX_WORKERS: Optional[int] = None
+    DOCX_BATCH_SIZE: int = 16
+    DOCX_MAX_TASKS_PER_CHILD: int = 100
+    DOCX_MAX_ROWS: int = 10000
+    DOCX_SPOOL_MAX_SIZE: int = 64 * 1024 * 1024
 
 
 settings = Settings()
\ No newline at end of file
@@ -1,19 +1,252 @@
 # database.py
-from sqlalchemy import create_engine
+from typing import Optional
+
+from fastapi.concurrency import run_in_threadpool
+from sqlalchemy import create_engine, event
+from sqlalchemy.engine import Engine, make_url
 from sqlalchemy.ext.declarative import declarative_base
-from sqlalchemy.orm import sessionmaker
+from sqlalchemy.orm import Session, sessionmaker
+from sqlalchemy.pool import AsyncAdaptedQueuePool, StaticPool
+
+from app.config import settings
+
+SQLALCHEMY_DATABASE_URL = settings.DATABASE_URL
+
+# Pilotes asynchrones utilisés à la place des pilotes synchrones
+ASYNC_DRIVERS = {
+    "sqlite": "aiosqlite",
+    "mysql": "aiomysql",
+}
+
+
+def is_memory_database(url) -> bool:
+    url = make_url(url)
+    return url.get_backend_name() == "sqlite" and (url.database in (None, "", ":memory:") or url.query.get("mode") == "memory")
+
+
+def shared_memory_url(url: str) -> str:
+    """
+    Base SQLite en mémoire nommée, commune à toutes les connexions du processus.
+
+    Sans nom, chaque connexion ouvre sa propre base vide : le moteur
+    synchrone (migrations, imports, opérations de masse) et le moteur
+    asynchrone des routes ne verraient pas les mêmes données.
+    """
+    url = make_url(url)
+    if url.database not in (None, "", ":memory:"):
+        return url.render_as_string(hide_password=False)
+    return url.set(database="file:shortpress", query={"mode": "memory", "cache": "shared", "uri": "true"}).render_as_string(hide_password=False)
+
+
+def async_url(url: str) -> str:
+    """
+    Équivalent asynchrone d'une URL de base de données (sqlite -> aiosqlite, mysql -> aiomysql).
+    """
+    url = make_url(url)
+    driver = ASYNC_DRIVERS.get(url.get_backend_name())
+    if driver is None:
+        raise ValueError(f"No async driver configured for '{url.get_backend_name()}'")
+    return url.set(drivername=f"{url.get_backend_name()}+{driver}").render_as_string(hide_password=False)
+
+
+def _set_sqlite_pragmas(dbapi_connection, connection_record) -> None:
+    cursor = dbapi_connection.cursor()
+    try:
+        # busy_timeout en premier : le passage en WAL peut attendre un autre processus
+        cursor.execute(f"PRAGMA busy_timeout = {int(settings.SQLITE_BUSY_TIMEOUT)}")
+        cursor.execute(f"PRAGMA journal_mode = {settings.SQLITE_JOURNAL_MODE}")
+        cursor.execute(f"PRAGMA synchronous = {settings.SQLITE_SYNCHRONOUS}")
+        cursor.execute(f"PRAGMA mmap_size = {int(settings.SQLITE_MMAP_SIZE)}")
+        cursor.execute(f"PRAGMA cache_size = {int(settings.SQLITE_CACHE_SIZE)}")
+    finally:
+        cursor.close()
+
+
+def engine_options(url: str) -> dict:
+    """
+    Options de create_engine pour une URL, d'après les réglages DB_* et SQLITE_*.
+
+    SQLite fichier : pool de connexions et journal WAL, plusieurs workers
+    peuvent lire pendant qu'un autre écrit (busy_timeout couvre l'attente
+    du verrou d'écriture). SQLite en mémoire : une seule connexion par
+    moteur, sur une base partagée par les deux moteurs (shared_memory_url),
+    réservé aux tests et au mode mono-processus.
+    """
+    options = {"echo": settings.DB_ECHO, "pool_pre_ping": settings.DB_POOL_PRE_PING}
+    if make_url(url).get_backend_name() == "sqlite":
+        options["connect_args"] = {"check_same_thread": False}
+        if is_memory_database(url):
+            options["poolclass"] = StaticPool
+            return options
+    else:
+        options["pool_recycle"] = settings.DB_POOL_RECYCLE
+    options.update(
+        pool_size=settings.DB_POOL_SIZE,
+        max_overflow=settings.DB_MAX_OVERFLOW,
+        pool_timeout=settings.DB_POOL_TIMEOUT,
+    )
+    return options
+
+
+def build_engine(url: Optional[str] = None, asynchronous: bool = False):
+    """
+    Crée le moteur (synchrone ou asynchrone) configuré par les réglages.
+
+    C'est le seul point de création de moteur de l'application.
+    """
+    url = url or SQLALCHEMY_DATABASE_URL
+    if is_memory_database(url):
+        url = shared_memory_url(url)
+    options = engine_options(url)
+    if asynchronous:
+        from sqlalchemy.ext.asyncio import create_async_engine
+
+        if "pool_size" in options and make_url(url).get_backend_name() == "sqlite":
+            # aiosqlite utilise NullPool par défaut pour un fichier : une connexion (et un thread) par session
+            options["poolclass"] = AsyncAdaptedQueuePool
+        engine = create_async_engine(async_url(url), **options)
+        sync_engine = engine.sync_engine
+    else:
+        engine = sync_engine = create_engine(url, **options)
+    if sync_engine.dialect.name == "sqlite":
+        event.listen(sync_engine, "connect", _set_sqlite_pragmas)
+    if settings.METRICS_ENABLED:
+        from app.metrics import instrument_engine
+
+        instrument_engine(sync_engine)
+    return engine
+
+
+_engine: Optional[Engine] = None
+_async_engine = None
+_async_sessionmaker = None
+
+
+def get_engine() -> Engine:
+    """
+    Moteur synchrone, créé à la première utilisation (pas de coût à l'import).
+    """
+    global _engine
+    if _engine is None:
+        _engine = build_engine()
+    return _engine
+
+
+class LazySessionMaker(sessionmaker):
+    """
+    sessionmaker lié au moteur synchrone lors de la première session créée.
+    """
 
-SQLALCHEMY_DATABASE_URL = "sqlite:///./variables.db"
+    def __call__(self, **local_kw) -> Session:
+        if self.kw.get("bind") is None and "bind" not in local_kw:
+            self.configure(bind=get_engine())
+        return super().__call__(**local_kw)
 
-engine = create_engine(
-    SQLALCHEMY_DATABASE_URL, connect_args={"check_same_thread": False}
-)
-SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
+
+SessionLocal = LazySessionMaker(autocommit=False, autoflush=False)
 Base = declarative_base()
 
-def get_db():
-    db = SessionLocal()
+
+def __getattr__(name: str):
+    # app.database.engine reste disponible, créé à la demande
+    if name == "engine":
+        return get_engine()
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+
+
+def get_async_sessionmaker():
+    """
+    Fabrique de sessions asynchrones ; le moteur est créé à la première utilisation.
+    """
+    global _async_engine, _async_sessionmaker
+    if _async_sessionmaker is None:
+        from sqlalchemy.ext.asyncio import async_sessionmaker
+
+        _async_engine = build_engine(asynchronous=True)
+        # Pas d'expiration au commit : un attribut expiré serait rechargé hors de la boucle asynchrone
+        _async_sessionmaker = async_sessionmaker(_async_engine, autoflush=False, expire_on_commit=False)
+    return _async_sessionmaker
+
+
+async def dispose_engines() -> None:
+    """
+    Ferme les connexions des pools (arrêt de l'application).
+    """
+    global _engine, _async_engine, _async_sessionmaker
+    if _async_engine is not None:
+        await _async_engine.dispose()
+        _async_engine = _async_sessionmaker = None
+    if _engine is not None:
+        _engine.dispose()
+        _engine = None
+
+
+class SyncSessionAdapter:
+    """
+    Session synchrone exposée avec l'interface d'AsyncSession.
+
+    Chaque appel bloquant est exécuté dans le pool de threads ; les routes
+    s'écrivent une seule fois pour les deux modes (DB_ASYNC).
+    """
+
+    def __init__(self, session: Session):
+        self.sync_session = session
+
+    def add(self, instance) -> None:
+        self.sync_session.add(instance)
+
+    def add_all(self, instances) -> None:
+        self.sync_session.add_all(instances)
+
+    async def execute(self, statement, params=None, **kwargs):
+        return await run_in_threadpool(self.sync_session.execute, statement, params, **kwargs)
+
+    async def scalar(self, statement, params=None, **kwargs):
+        return await run_in_threadpool(self.sync_session.scalar, statement, params, **kwargs)
+
+    async def scalars(self, statement, params=None, **kwargs):
+        # Lignes lues dans le thread, comme AsyncSession.scalars qui renvoie un résultat en mémoire
+        result = await run_in_threadpool(lambda: self.sync_session.execute(statement, params, **kwargs).freeze())
+        return result().scalars()
+
+    async def get(self, entity, ident, **kwargs):
+        return await run_in_threadpool(self.sync_session.get, entity, ident, **kwargs)
+
+    async def delete(self, instance) -> None:
+        await run_in_threadpool(self.sync_session.delete, instance)
+
+    async def flush(self) -> None:
+        await run_in_threadpool(self.sync_session.flush)
+
+    async def commit(self) -> None:
+        await run_in_threadpool(self.sync_session.commit)
+
+    async def rollback(self) -> None:
+        await run_in_threadpool(self.sync_session.rollback)
+
+    async def refresh(self, instance, attribute_names: Optional[list] = None) -> None:
+        await run_in_threadpool(self.sync_session.refresh, instance, attribute_names)
+
+    async def close(self) -> None:
+        await run_in_threadpool(self.sync_session.close)
+
+    async def run_sync(self, fn, *args, **kwargs):
+        return await run_in_threadpool(fn, self.sync_session, *args, **kwargs)
+
+
+def open_session():
+    """
+    Ouvre une session selon le mode configuré : AsyncSession, ou session synchrone adaptée.
+    """
+    if settings.DB_ASYNC:
+        return get_async_sessionmaker()()
+    # Même comportement au commit que la session asynchrone
+    return SyncSessionAdapter(SessionLocal(expire_on_commit=False))
+
+
+async def get_db():
+    db = open_session()
     try:
         yield db
     finally:
-        db.close()
\ No newline at end of file
+        await db.close()
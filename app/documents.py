@@ -0,0 +1,196 @@
+# app/documents.py
+import hashlib
+import io
+import multiprocessing
+import os
+import re
+import threading
+import zipfile
+from collections import OrderedDict
+from concurrent.futures import FIRST_COMPLETED, Future, ProcessPoolExecutor, wait
+from typing import IO, Dict, Iterable, List, Optional, Set, Tuple
+
+
+class CompiledDocxTemplate:
+    """
+    Modèle .docx analysé et compilé une seule fois, rendu autant de fois que nécessaire.
+
+    Le corps, les en-têtes et les pieds de page sont nettoyés par docxtpl puis
+    compilés en modèles Jinja ; chaque rendu remplace ces parties dans le même
+    document python-docx avant de le sérialiser.
+    """
+
+    def __init__(self, template_bytes: bytes):
+        from docxtpl import DocxTemplate
+        from jinja2 import Environment
+
+        self.tpl = DocxTemplate(io.BytesIO(template_bytes))
+        self.tpl.init_docx()
+        self.env = Environment(autoescape=True)
+        self.sources: List[str] = []
+
+        self.body = self._compile(self.tpl.get_xml())
+        self.parts: List[Tuple[str, str, object]] = []
+        for uri in (self.tpl.HEADER_URI, self.tpl.FOOTER_URI):
+            for rel_key, part in self.tpl.get_headers_footers(uri):
+                xml = self.tpl.get_part_xml(part)
+                encoding = self.tpl.get_headers_footers_encoding(xml)
+                self.parts.append((rel_key, encoding, self._compile(xml)))
+
+    def _compile(self, xml: str):
+        source = self.tpl.patch_xml(xml)
+        source = re.sub(r'<w:p([ >])', r'\n<w:p\1', source)
+        self.sources.append(source)
+        return self.env.from_string(source)
+
+    def _render_part(self, template, context: Dict) -> str:
+        xml = template.render(context)
+        xml = re.sub(r'\n<w:p([ >])', r'<w:p\1', xml)
+        xml = xml.replace('{_{', '{{').replace('}_}', '}}').replace('{_%', '{%').replace('%_}', '%}')
+        return self.tpl.resolve_listing(xml)
+
+    @property
+    def variables(self) -> Set[str]:
+        """
+        Noms de variables utilisés par le modèle.
+        """
+        from jinja2 import meta
+
+        names: Set[str] = set()
+        for source in self.sources:
+            names |= meta.find_undeclared_variables(self.env.parse(source))
+        return names
+
+    def render(self, context: Dict) -> bytes:
+        self.tpl.docx_ids_index = 1000
+        tree = self.tpl.fix_tables(self._render_part(self.body, context))
+        self.tpl.fix_docpr_ids(tree)
+        self.tpl.map_tree(tree)
+        for rel_key, encoding, template in self.parts:
+            self.tpl.map_headers_footers_xml(rel_key, self._render_part(template, context).encode(encoding))
+
+        output = io.BytesIO()
+        self.tpl.docx.save(output)
+        return output.getvalue()
+
+
+# État propre à chaque processus du pool : les derniers modèles reçus, compilés une seule fois
+_worker_templates: "OrderedDict[str, CompiledDocxTemplate]" = OrderedDict()
+WORKER_TEMPLATES = 4
+
+
+def _worker_template(digest: str, template_bytes: bytes) -> CompiledDocxTemplate:
+    template = _worker_templates.get(digest)
+    if template is None:
+        template = _worker_templates[digest] = CompiledDocxTemplate(template_bytes)
+        while len(_worker_templates) > WORKER_TEMPLATES:
+            _worker_templates.popitem(last=False)
+    else:
+        _worker_templates.move_to_end(digest)
+    return template
+
+
+def _render_rows(digest: str, template_bytes: bytes, base_context: Dict, rows: List[Tuple[int, Dict]]) -> List[Tuple[int, str, bytes]]:
+    template = _worker_template(digest, template_bytes)
+    documents = []
+    for index, row in rows:
+        context = {**base_context, **row}
+        filename = str(row.get("_filename") or f"document_{index + 1:05d}") + ".docx"
+        documents.append((index, os.path.basename(filename), template.render(context)))
+    return documents
+
+
+class RenderPool:
+    """
+    Pool de processus partagé par tous les rendus, créé au premier rendu.
+
+    Processus lancés par spawn : le processus de l'API a déjà des threads
+    (aiosqlite, pool de threads, journalisation), un fork pourrait en hériter
+    des verrous tenus. Après max_tasks_per_child lots par worker en moyenne,
+    le pool est remplacé (les lots en cours se terminent dans l'ancien) : la
+    mémoire accumulée par les workers est rendue, y compris en Python 3.9
+    où ProcessPoolExecutor n'a pas d'option max_tasks_per_child.
+    """
+
+    def __init__(self):
+        self._executor: Optional[ProcessPoolExecutor] = None
+        self._workers = 0
+        self._tasks = 0
+        self._lock = threading.Lock()
+
+    def submit(self, workers: int, max_tasks_per_child: Optional[int], fn, *args) -> Future:
+        with self._lock:
+            if self._executor is not None and (
+                self._workers != workers or (max_tasks_per_child and self._tasks >= max_tasks_per_child * workers)
+            ):
+                self._executor.shutdown(wait=False)
+                self._executor = None
+            if self._executor is None:
+                self._executor = ProcessPoolExecutor(max_workers=workers, mp_context=multiprocessing.get_context("spawn"))
+                self._workers = workers
+                self._tasks = 0
+            self._tasks += 1
+            return self._executor.submit(fn, *args)
+
+    def shutdown(self) -> None:
+        with self._lock:
+            if self._executor is not None:
+                self._executor.shutdown(wait=False)
+                self._executor = None
+
+
+render_pool = RenderPool()
+
+
+def _batches(rows: Iterable[Dict], size: int) -> Iterable[List[Tuple[int, Dict]]]:
+    batch = []
+    for index, row in enumerate(rows):
+        batch.append((index, row))
+        if len(batch) >= size:
+            yield batch
+            batch = []
+    if batch:
+        yield batch
+
+
+def render_batch(
+    template_bytes: bytes,
+    base_context: Dict,
+    rows: Iterable[Dict],
+    output: IO[bytes],
+    workers: Optional[int] = None,
+    batch_size: int = 16,
+    max_tasks_per_child: Optional[int] = None,
+) -> int:
+    """
+    Rend un document par ligne sur un pool de processus et les écrit dans une archive zip.
+
+    Au plus deux lots par worker sont en vol à la fois, et chaque document est
+    écrit dans l'archive dès sa réception : la mémoire reste bornée quel que
+    soit le nombre de lignes. Retourne le nombre de documents générés.
+    """
+    workers = workers or os.cpu_count() or 1
+    digest = hashlib.sha256(template_bytes).hexdigest()
+    count = 0
+    with zipfile.ZipFile(output, "w", compression=zipfile.ZIP_DEFLATED) as archive:
+        pending = set()
+        names: Set[str] = set()
+
+        def drain(return_when):
+            nonlocal pending, count
+            done, pending = wait(pending, return_when=return_when)
+            for future in done:
+                for index, filename, document in future.result():
+                    if filename in names:
+                        filename = f"{filename[:-5]}_{index + 1}.docx"
+                    names.add(filename)
+                    archive.writestr(filename, document)
+                    count += 1
+
+        for batch in _batches(rows, batch_size):
+            if len(pending) >= workers * 2:
+                drain(FIRST_COMPLETED)
+            pending.add(render_pool.submit(workers, max_tasks_per_child, _render_rows, digest, template_bytes, base_context, batch))
+        while pending:
+            drain(FIRST_COMPLETED)
+    return count
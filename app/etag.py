@@ -0,0 +1,86 @@
+# app/etag.py
+import hashlib
+from typing import Any, Dict, FrozenSet, Iterable, List, Optional, Set, Tuple
+
+from fastapi import Request, Response, status
+from sqlalchemy import select
+
+from app.models import Category, Variable
+from app.utils import chunked
+
+
+def compute_etag(*parts) -> str:
+    """
+    ETag fort : empreinte des éléments qui déterminent le contenu de la réponse.
+    """
+    return '"' + hashlib.blake2b(repr(parts).encode(), digest_size=16).hexdigest() + '"'
+
+
+def etag_matches(request: Request, etag: str) -> bool:
+    """
+    Vrai si l'en-tête If-None-Match de la requête désigne cet ETag (comparaison faible, RFC 9110).
+    """
+    header = request.headers.get("if-none-match")
+    if not header:
+        return False
+    if header.strip() == "*":
+        return True
+    return any(candidate.strip().removeprefix("W/") == etag for candidate in header.split(","))
+
+
+def not_modified(etag: str) -> Response:
+    return Response(status_code=status.HTTP_304_NOT_MODIFIED, headers={"ETag": etag})
+
+
+def categories_etag(categories: List[Category], next_cursor: Optional[str] = None) -> str:
+    # Les catégories n'ont pas de date de modification : l'empreinte porte sur le contenu des lignes
+    return compute_etag("categories", next_cursor, [(category.id, category.name, category.owner_id) for category in categories])
+
+
+def _parent_stamps(variable: Variable, parent_rows: Optional[Dict[int, Any]] = None) -> List[Tuple]:
+    # Chaîne des parents déjà chargée (selectinload, ou lignes par id) : sérialisée dans la réponse
+    stamps = []
+    parent = variable.parent_variable if parent_rows is None else parent_rows.get(variable.parent_variable_id)
+    while parent is not None:
+        stamps.append((parent.id, parent.updated_at))
+        parent = parent.parent_variable if parent_rows is None else parent_rows.get(parent.parent_variable_id)
+    return stamps
+
+
+async def variable_stamps(
+    db,
+    variables: Iterable[Variable],
+    dependencies: Dict[int, FrozenSet[str]],
+    parents: bool = False,
+    parent_rows: Optional[Dict[int, Any]] = None,
+) -> List[Tuple]:
+    """
+    Marques de version d'un ensemble de variables et de leurs dépendances transitives.
+
+    Une dépendance modifiée change son updated_at ; supprimée ou recréée,
+    elle disparaît ou change d'id : l'empreinte change dans tous les cas.
+    Une requête par propriétaire (et par lot de clause IN) lit les dépendances.
+    Les variables peuvent être des lignes de colonnes : leurs parents sont
+    alors cherchés dans parent_rows.
+    """
+    variables = list(variables)
+    stamps: List[Tuple] = []
+    wanted: Dict[int, Set[str]] = {}
+    for variable in variables:
+        stamps.append((variable.id, variable.updated_at))
+        if parents:
+            stamps.append(_parent_stamps(variable, parent_rows))
+        wanted.setdefault(variable.owner_id, set()).update(dependencies.get(variable.id, ()))
+
+    for owner_id in sorted(wanted):
+        rows = []
+        for batch in chunked(sorted(wanted[owner_id])):
+            rows.extend(
+                tuple(row) for row in await db.execute(
+                    select(Variable.identifier, Variable.id, Variable.updated_at).where(
+                        Variable.owner_id == owner_id, Variable.identifier.in_(batch)
+                    )
+                )
+            )
+        stamps.append((owner_id, sorted(rows)))
+    return stamps
@@ -0,0 +1,169 @@
+# app/fieldsets.py
+from dataclasses import dataclass, replace
+from typing import Any, Dict, FrozenSet, Iterable, List, Optional, Tuple
+
+from fastapi import HTTPException, Query, Request, Response, status
+from fastapi.encoders import jsonable_encoder
+from fastapi.responses import JSONResponse
+from sqlalchemy.orm import joinedload, load_only, raiseload, selectinload
+
+from app.config import settings
+from app.etag import compute_etag, etag_matches, not_modified
+from app.models import Category, Variable
+from app.pagination import NEXT_CURSOR_HEADER
+from app.serialization import json_response
+
+# Colonnes exposées, dans l'ordre de sérialisation des schémas
+VARIABLE_FIELDS = ("name", "identifier", "value", "category_id", "parent_variable_id", "id", "created_at", "updated_at", "owner_id")
+CATEGORY_FIELDS = ("name", "id", "owner_id")
+VARIABLE_EXPANSIONS = ("parent_variable", "category")
+CATEGORY_EXPANSIONS = ("variables",)
+
+# Colonnes toujours lues : autorisation, pagination (owner_id, id) et ETag
+VARIABLE_REQUIRED = ("id", "owner_id", "updated_at")
+CATEGORY_REQUIRED = ("id", "owner_id")
+
+
+@dataclass(frozen=True)
+class Fieldset:
+    """
+    Représentation demandée par expand= et fields=.
+
+    default : représentation historique (schéma de réponse complet),
+    servie telle quelle par le response_model de la route.
+    """
+    expand: FrozenSet[str]
+    fields: Optional[Tuple[str, ...]]
+    default: bool
+
+    @property
+    def etag_parts(self) -> Tuple:
+        if self.default:
+            return ()
+        return ("expand", tuple(sorted(self.expand)), "fields", self.fields)
+
+
+def _parse(raw: Optional[str], allowed: Tuple[str, ...], name: str) -> Optional[Tuple[str, ...]]:
+    if raw is None:
+        return None
+    items = {item.strip() for item in raw.split(",") if item.strip()}
+    unknown = sorted(items.difference(allowed))
+    if unknown:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=f"Unknown {name}: {', '.join(unknown)} (allowed: {', '.join(allowed)})",
+        )
+    return tuple(item for item in allowed if item in items)
+
+
+def variable_fieldset(
+    expand: Optional[str] = Query(None, description="Relations incluses, séparées par des virgules : parent_variable, category (par défaut : parent_variable)"),
+    fields: Optional[str] = Query(None, description="Colonnes renvoyées, séparées par des virgules (par défaut : toutes)"),
+) -> Fieldset:
+    expanded = _parse(expand, VARIABLE_EXPANSIONS, "expand")
+    expanded = frozenset(("parent_variable",) if expanded is None else expanded)
+    columns = _parse(fields, VARIABLE_FIELDS, "fields")
+    return Fieldset(expanded, columns, default=columns is None and expanded == {"parent_variable"})
+
+
+def category_fieldset(
+    expand: Optional[str] = Query(None, description="Relations incluses : variables (par défaut : aucune)"),
+    fields: Optional[str] = Query(None, description="Colonnes renvoyées, séparées par des virgules (par défaut : toutes)"),
+) -> Fieldset:
+    expanded = frozenset(_parse(expand, CATEGORY_EXPANSIONS, "expand") or ())
+    columns = _parse(fields, CATEGORY_FIELDS, "fields")
+    return Fieldset(expanded, columns, default=columns is None and not expanded)
+
+
+def variable_options(fieldset: Fieldset) -> List:
+    """
+    Options de chargement : colonnes demandées seulement, relations demandées
+    chargées d'avance, toute autre relation interdite (raiseload) pour qu'un
+    chargement paresseux par ligne échoue au lieu de passer inaperçu.
+    """
+    options = []
+    if fieldset.fields is not None:
+        columns = set(fieldset.fields).union(VARIABLE_REQUIRED)
+        if "parent_variable" in fieldset.expand:
+            columns.add("parent_variable_id")
+        if "category" in fieldset.expand:
+            columns.add("category_id")
+        options.append(load_only(*(getattr(Variable, name) for name in VARIABLE_FIELDS if name in columns), raiseload=True))
+    if "parent_variable" in fieldset.expand:
+        options.append(selectinload(Variable.parent_variable, recursion_depth=-1))
+    if "category" in fieldset.expand:
+        # Plusieurs-à-un : une jointure plutôt qu'une seconde requête
+        options.append(joinedload(Variable.category))
+    options.append(raiseload("*"))
+    return options
+
+
+def category_options(fieldset: Fieldset) -> List:
+    options = []
+    if fieldset.fields is not None:
+        columns = set(fieldset.fields).union(CATEGORY_REQUIRED)
+        options.append(load_only(*(getattr(Category, name) for name in CATEGORY_FIELDS if name in columns), raiseload=True))
+    if "variables" in fieldset.expand:
+        options.append(selectinload(Category.variables).raiseload("*"))
+    options.append(raiseload("*"))
+    return options
+
+
+def _columns(item, names: Iterable[str]) -> Dict[str, Any]:
+    return {name: getattr(item, name) for name in names}
+
+
+def variable_dict(variable: Variable, fieldset: Fieldset) -> Dict[str, Any]:
+    data = _columns(variable, fieldset.fields or VARIABLE_FIELDS)
+    if "parent_variable" in fieldset.expand:
+        parent = variable.parent_variable
+        # Les parents sont chargés par selectinload, sans leur catégorie
+        data["parent_variable"] = variable_dict(parent, replace(fieldset, expand=frozenset(("parent_variable",)))) if parent is not None else None
+    if "category" in fieldset.expand:
+        category = variable.category
+        data["category"] = _columns(category, CATEGORY_FIELDS) if category is not None else None
+    return data
+
+
+def category_dict(category: Category, fieldset: Fieldset) -> Dict[str, Any]:
+    data = _columns(category, fieldset.fields or CATEGORY_FIELDS)
+    if "variables" in fieldset.expand:
+        data["variables"] = [_columns(variable, VARIABLE_FIELDS) for variable in sorted(category.variables, key=lambda v: v.id)]
+    return data
+
+
+def expansion_stamps(items: Iterable, fieldset: Fieldset) -> List[Tuple]:
+    """
+    Versions des objets inclus par expand= (hors parents, couverts par variable_stamps).
+    """
+    stamps: List[Tuple] = []
+    for item in items:
+        if "category" in fieldset.expand and item.category is not None:
+            stamps.append((item.id, item.category.id, item.category.name))
+        if "variables" in fieldset.expand:
+            stamps.append((item.id, sorted((variable.id, variable.updated_at) for variable in item.variables)))
+    return stamps
+
+
+def fieldset_response(content: Any, response: Response) -> JSONResponse:
+    """
+    Réponse JSON construite hors response_model ; reprend les en-têtes déjà posés (ETag, curseur).
+    """
+    if settings.FAST_SERIALIZATION:
+        return json_response(content, response)
+    result = JSONResponse(jsonable_encoder(content))
+    result.headers.raw.extend(response.headers.raw)
+    return result
+
+
+def fieldset_categories(request: Request, response: Response, categories: List[Category], fieldset: Fieldset) -> Response:
+    """
+    Réponse expand=/fields= d'une liste de catégories ; l'ETag porte sur les colonnes renvoyées.
+    """
+    content = [category_dict(category, fieldset) for category in categories]
+    rows = [tuple(item[name] for name in fieldset.fields or CATEGORY_FIELDS) for item in content]
+    etag = compute_etag("categories", response.headers.get(NEXT_CURSOR_HEADER), rows, expansion_stamps(categories, fieldset), *fieldset.etag_parts)
+    if etag_matches(request, etag):
+        return not_modified(etag)
+    response.headers["ETag"] = etag
+    return fieldset_response(content, response)
@@ -0,0 +1,376 @@
+# app/importer.py
+import codecs
+import csv
+import io
+import json
+from datetime import datetime
+from typing import IO, Dict, Iterator, List, Optional, Set, Tuple, Union
+
+from fastapi import HTTPException
+from sqlalchemy import insert, update
+from sqlalchemy.orm import Session
+
+from app.models import Category, Variable
+from app.utils import IDENTIFIER_PATTERN, chunked, template_references
+
+FORMATS = ("json", "ndjson", "csv")
+# Nombre maximal d'erreurs détaillées dans le rapport (les suivantes sont seulement comptées)
+MAX_REPORTED_ERRORS = 1000
+
+
+def detect_format(filename: Optional[str], content_type: Optional[str]) -> str:
+    name = (filename or "").lower()
+    content_type = (content_type or "").lower()
+    if name.endswith(".csv") or "csv" in content_type:
+        return "csv"
+    if name.endswith((".ndjson", ".jsonl")) or "ndjson" in content_type or "jsonl" in content_type:
+        return "ndjson"
+    return "json"
+
+
+def iter_records(file: IO[bytes], format: str) -> Iterator[Tuple[int, Dict]]:
+    """
+    Parcourt les enregistrements d'un fichier JSON, NDJSON ou CSV (numérotés à partir de 1).
+
+    Une ligne illisible produit un enregistrement None plutôt que d'interrompre la lecture.
+    """
+    file.seek(0)
+    if format == "json":
+        records = json.load(codecs.getreader("utf-8-sig")(file))
+        if not isinstance(records, list):
+            raise ValueError("JSON upload must be an array of objects")
+        for index, record in enumerate(records, 1):
+            yield index, record if isinstance(record, dict) else None
+        return
+
+    text = io.TextIOWrapper(file, encoding="utf-8-sig", newline="")
+    try:
+        if format == "csv":
+            for index, record in enumerate(csv.DictReader(text), 1):
+                # Cellule vide : champ absent, sauf la valeur (une valeur vide est valide)
+                yield index, {key: value for key, value in record.items() if key is not None and (value != "" or key == "value")}
+        else:
+            index = 0
+            for line in text:
+                if not line.strip():
+                    continue
+                index += 1
+                try:
+                    record = json.loads(line)
+                except ValueError:
+                    record = None
+                yield index, record if isinstance(record, dict) else None
+    finally:
+        # Le fichier sous-jacent reste ouvert pour une seconde passe
+        text.detach()
+
+
+class VariableImporter:
+    """
+    Importe des variables en masse pour un propriétaire, avec mise à jour par identifiant.
+
+    Une première passe collecte les identifiants du fichier ; la seconde
+    valide et écrit les lignes par lots (un executemany pour les créations,
+    un pour les mises à jour). Les références {{...}} et les parents sont
+    validés contre les lignes acceptées et les variables existantes ; les
+    parents et les catégories sont désignés par nom (ou par identifiant
+    numérique, du même propriétaire).
+
+    Une ligne qui référence une variable du fichier pas encore traitée attend
+    son verdict : acceptée, la ligne est écrite ; rejetée, la ligne l'est
+    aussi. Les parents sont reliés en fin d'import, sauf ceux qui fermeraient
+    une boucle.
+    """
+
+    def __init__(self, db: Session, owner_id: int, chunk_size: int = 5000, atomic: bool = True):
+        self.db = db
+        self.owner_id = owner_id
+        self.chunk_size = chunk_size
+        self.atomic = atomic
+        self.created = 0
+        self.updated = 0
+        self.failed = 0
+        self.errors: List[Dict] = []
+        self.changed_identifiers: Set[str] = set()
+        self._incoming: Set[str] = set()
+        self._accepted: Set[str] = set()
+        self._rejected: Set[str] = set()
+        self._pending: List[Tuple[int, Dict]] = []
+        self._existing: Dict[str, bool] = {}
+        self._categories: Dict[str, Optional[int]] = {}
+        self._owned: Dict[Tuple[str, int], bool] = {}
+        # Identifiant -> (ligne, parent : identifiant ou id numérique)
+        self._parents: Dict[str, Tuple[int, Union[str, int]]] = {}
+
+    def _error(self, row: int, identifier: Optional[str], detail: str) -> None:
+        self.failed += 1
+        if len(self.errors) < MAX_REPORTED_ERRORS:
+            self.errors.append({"row": row, "identifier": identifier, "detail": detail})
+
+    def _reject(self, row: int, identifier: str, detail: str) -> None:
+        # Ligne non écrite : les lignes qui la référencent sont rejetées à leur tour
+        self._rejected.add(identifier)
+        self._error(row, identifier, detail)
+
+    def _known_identifiers(self, identifiers: Set[str]) -> Set[str]:
+        """
+        Identifiants existants du propriétaire parmi ceux donnés (mis en cache).
+        """
+        missing = [identifier for identifier in identifiers if identifier not in self._existing]
+        for batch in chunked(missing):
+            found = {
+                identifier
+                for (identifier,) in self.db.query(Variable.identifier).filter(
+                    Variable.owner_id == self.owner_id, Variable.identifier.in_(batch)
+                )
+            }
+            for identifier in batch:
+                self._existing[identifier] = identifier in found
+        return {identifier for identifier in identifiers if self._existing.get(identifier)}
+
+    def _category_ids(self, names: Set[str]) -> None:
+        missing = [name for name in names if name not in self._categories]
+        for batch in chunked(missing):
+            found = dict(
+                self.db.query(Category.name, Category.id).filter(Category.owner_id == self.owner_id, Category.name.in_(batch))
+            )
+            for name in batch:
+                self._categories[name] = found.get(name)
+
+    def _owned_ids(self, model, ids: Set[int]) -> None:
+        """
+        Vérifie que ces catégories ou variables appartiennent au propriétaire (mis en cache).
+        """
+        kind = model.__tablename__
+        missing = [id for id in ids if (kind, id) not in self._owned]
+        for batch in chunked(missing):
+            found = {id for (id,) in self.db.query(model.id).filter(model.owner_id == self.owner_id, model.id.in_(batch))}
+            for id in batch:
+                self._owned[(kind, id)] = id in found
+
+    def _validate(self, row: int, record: Optional[Dict]) -> Optional[Dict]:
+        if record is None:
+            self._error(row, None, "Row is not a valid object")
+            return None
+        identifier = record.get("identifier")
+        if not isinstance(identifier, str) or not IDENTIFIER_PATTERN.fullmatch(identifier):
+            self._error(row, None, "Missing or invalid identifier")
+            return None
+        for field in ("name", "value"):
+            if not isinstance(record.get(field), str):
+                self._reject(row, identifier, f"Missing or invalid field '{field}'")
+                return None
+        for field in ("category", "parent"):
+            if record.get(field) is not None and not isinstance(record[field], str):
+                self._reject(row, identifier, f"Invalid field '{field}'")
+                return None
+        try:
+            record["_references"] = template_references(record["value"])
+        except HTTPException as e:
+            self._reject(row, identifier, e.detail)
+            return None
+        for field in ("category_id", "parent_variable_id"):
+            if record.get(field) in (None, ""):
+                record[field] = None
+                continue
+            try:
+                record[field] = int(record[field])
+            except (TypeError, ValueError):
+                self._reject(row, identifier, f"Invalid field '{field}'")
+                return None
+        return record
+
+    def _write_chunk(self, records: List[Tuple[int, Dict]]) -> None:
+        # Variables existantes portant ces identifiants, tous propriétaires confondus (identifiant unique)
+        owners: Dict[str, Tuple[int, int]] = {}
+        for batch in chunked([record["identifier"] for _, record in records]):
+            for variable_id, identifier, owner_id in self.db.query(Variable.id, Variable.identifier, Variable.owner_id).filter(
+                Variable.identifier.in_(batch)
+            ):
+                owners[identifier] = (variable_id, owner_id)
+
+        references: Set[str] = set()
+        category_names: Set[str] = set()
+        for _, record in records:
+            references.update(record["_references"])
+            if record.get("parent"):
+                references.add(record["parent"])
+            if record.get("category"):
+                category_names.add(record["category"])
+        # Y compris les identifiants du fichier : une ligne rejetée peut désigner une variable existante
+        self._known_identifiers(references)
+        self._category_ids(category_names)
+        self._owned_ids(Category, {record["category_id"] for _, record in records if record["category_id"] is not None})
+        self._owned_ids(Variable, {record["parent_variable_id"] for _, record in records if record["parent_variable_id"] is not None})
+
+        for row, record in records:
+            identifier = record["identifier"]
+            existing = owners.get(identifier)
+            if existing is not None and existing[1] != self.owner_id:
+                self._reject(row, identifier, "Variable identifier already exists")
+                continue
+            parent = record.get("parent")
+            if parent and parent not in self._incoming and not self._existing.get(parent):
+                self._reject(row, identifier, f"Parent variable '{parent}' not found")
+                continue
+            parent_id = record["parent_variable_id"]
+            if not parent and parent_id is not None and not self._owned[("variables", parent_id)]:
+                self._reject(row, identifier, f"Parent variable {parent_id} not found")
+                continue
+            category_id = record["category_id"]
+            if record.get("category"):
+                category_id = self._categories.get(record["category"])
+                if category_id is None:
+                    self._reject(row, identifier, f"Category '{record['category']}' not found")
+                    continue
+            elif category_id is not None and not self._owned[("categories", category_id)]:
+                self._reject(row, identifier, f"Category {category_id} not found")
+                continue
+            record["_id"] = existing[0] if existing is not None else None
+            record["_category_id"] = category_id
+            self._pending.append((row, record))
+        self._write_ready()
+
+    def _reference_state(self, record: Dict) -> Tuple[str, Optional[str]]:
+        """
+        "ready" : références toutes écrites ou existantes ; "waiting" : une ligne
+        du fichier n'est pas encore traitée ; "missing" : référence introuvable.
+        """
+        state = "ready"
+        for reference in record["_references"]:
+            # Une variable existante le reste, que sa ligne du fichier soit acceptée ou non
+            if reference in self._accepted or self._existing.get(reference):
+                continue
+            if reference not in self._incoming or reference in self._rejected:
+                return "missing", reference
+            state = "waiting"
+        return state, None
+
+    def _write_ready(self, final: bool = False) -> None:
+        """
+        Écrit les lignes en attente dont les références sont acceptées, jusqu'à épuisement.
+
+        En fin de fichier (final), les lignes qui n'attendent plus que
+        d'autres lignes en attente (références circulaires) sont écrites.
+        """
+        while self._pending:
+            ready, waiting = [], []
+            for row, record in self._pending:
+                state, reference = self._reference_state(record)
+                if state == "ready":
+                    ready.append((row, record))
+                elif state == "waiting":
+                    waiting.append((row, record))
+                else:
+                    self._reject(row, record["identifier"], f"Referenced variable '{reference}' not found")
+            progress = len(waiting) < len(self._pending)
+            self._pending = waiting
+            if ready:
+                self._write(ready)
+            if not progress:
+                break
+        if final and self._pending:
+            self._write(self._pending)
+            self._pending = []
+
+    def _write(self, records: List[Tuple[int, Dict]]) -> None:
+        inserts: List[Dict] = []
+        updates: List[Dict] = []
+        now = datetime.utcnow()
+        for row, record in records:
+            identifier = record["identifier"]
+            # Toutes les lignes d'un lot ont les mêmes clés : un seul executemany par lot.
+            # Le parent est relié en fin d'import (_link_parents), après contrôle des boucles
+            values = {
+                "name": record["name"],
+                "value": record["value"],
+                "category_id": record["_category_id"],
+                "parent_variable_id": None,
+            }
+            parent = record.get("parent") or record["parent_variable_id"]
+            if parent is not None:
+                self._parents[identifier] = (row, parent)
+            if record["_id"] is None:
+                inserts.append({**values, "identifier": identifier, "owner_id": self.owner_id, "created_at": now, "updated_at": now})
+            else:
+                updates.append({**values, "id": record["_id"], "updated_at": now})
+            self._accepted.add(identifier)
+            self.changed_identifiers.add(identifier)
+
+        if inserts:
+            # INSERT Core sur la table : executemany direct, sans relecture des clés générées
+            self.db.execute(insert(Variable.__table__), inserts)
+            self.created += len(inserts)
+        if updates:
+            self.db.execute(update(Variable), updates)
+            self.updated += len(updates)
+        if not self.atomic:
+            self.db.commit()
+
+    def _link_parents(self) -> None:
+        if not self._parents:
+            return
+        ids: Dict[str, int] = {}
+        names = list(set(self._parents) | {parent for _, parent in self._parents.values() if isinstance(parent, str)})
+        for batch in chunked(names):
+            ids.update(
+                self.db.query(Variable.identifier, Variable.id).filter(Variable.owner_id == self.owner_id, Variable.identifier.in_(batch))
+            )
+        # Liens parent existants du propriétaire (ceux des lignes importées viennent d'être effacés)
+        parents: Dict[int, int] = dict(
+            self.db.query(Variable.id, Variable.parent_variable_id).filter(
+                Variable.owner_id == self.owner_id, Variable.parent_variable_id.isnot(None)
+            )
+        )
+        links = []
+        now = datetime.utcnow()
+        for identifier, (row, parent) in self._parents.items():
+            parent_id = parent if isinstance(parent, int) else ids.get(parent)
+            if parent_id is None or identifier not in ids:
+                # Le parent faisait partie du fichier mais sa ligne a été rejetée
+                self._error(row, identifier, f"Parent variable '{parent}' not found")
+                continue
+            variable_id = ids[identifier]
+            ancestor = parent_id
+            while ancestor is not None and ancestor != variable_id:
+                ancestor = parents.get(ancestor)
+            if ancestor == variable_id:
+                self._error(row, identifier, f"Parent variable '{parent}' would create a cycle")
+                continue
+            parents[variable_id] = parent_id
+            links.append({"id": variable_id, "parent_variable_id": parent_id, "updated_at": now})
+        if links:
+            self.db.execute(update(Variable), links)
+
+    def run(self, file: IO[bytes], format: str) -> None:
+        # Première passe : identifiants présents dans le fichier
+        for _, record in iter_records(file, format):
+            if record is not None and isinstance(record.get("identifier"), str):
+                self._incoming.add(record["identifier"])
+
+        seen: Set[str] = set()
+        chunk: List[Tuple[int, Dict]] = []
+        try:
+            for row, record in iter_records(file, format):
+                record = self._validate(row, record)
+                if record is None:
+                    continue
+                if record["identifier"] in seen:
+                    self._error(row, record["identifier"], "Duplicate identifier in upload")
+                    continue
+                seen.add(record["identifier"])
+                chunk.append((row, record))
+                if len(chunk) >= self.chunk_size:
+                    self._write_chunk(chunk)
+                    chunk = []
+            if chunk:
+                self._write_chunk(chunk)
+            self._write_ready(final=True)
+            self._link_parents()
+            self.db.commit()
+        except Exception:
+            self.db.rollback()
+            raise
+
+    def report(self) -> Dict:
+        return {"created": self.created, "updated": self.updated, "failed": self.failed, "errors": self.errors}
@@ -2,52 +2,70 @@
 import logging
 import os
 
+from sqlalchemy import inspect
 from sqlalchemy.orm import Session
 
+from app.config import settings
 from app.models import User
-from app.schemas import UserCreate
-from app.auth import get_password_hash
 
-# Configurer le logging
 logger = logging.getLogger(__name__)
 
-def init_db(engine):
+ROOT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+# Révision correspondant aux tables créées par create_all avant les migrations
+BASELINE_REVISION = "0001"
+
+
+def alembic_config():
+    from alembic.config import Config
+
+    config = Config(os.path.join(ROOT_DIR, "alembic.ini"))
+    config.set_main_option("script_location", os.path.join(ROOT_DIR, "alembic"))
+    config.attributes["configure_logger"] = False
+    return config
+
+
+def upgrade_schema(engine, revision: str = "head") -> None:
     """
-    Initialise la base de données en créant le superutilisateur.
+    Applique les migrations Alembic jusqu'à `revision`.
+
+    Une base créée par create_all (tables présentes, pas de table
+    alembic_version) est d'abord marquée à la révision initiale.
     """
-    logger.info("Début de l'initialisation de la base de données")
-    try:
-        from app.database import Base
-    except ImportError as e:
-        logger.error(f"Erreur lors de l'importation du module Base : {e}")
-        raise
-
-    try:
-        Base.metadata.create_all(bind=engine)
-    except Exception as e:
-        logger.error(f"Erreur lors de la création des tables : {e}")
-        raise
-
-    logger.info("Tables créées avec succès")
-    
-    db = Session(engine)
-
-    user = db.query(User).filter(User.is_superuser == True).first()
-    if not user:
-        try:
-            user_in = UserCreate(
-                email=os.getenv("FIRST_SUPERUSER_EMAIL"),
-                password=os.getenv("FIRST_SUPERUSER_PASSWORD"),
-                is_superuser=True,
-            )
-            user = User(
-                **user_in.dict(exclude={"password"}),
-                hashed_password=get_password_hash(user_in.password),
-            )
-            db.add(user)
-            db.commit()
-            db.refresh(user)
-            logger.info("Superutilisateur créé avec succès")
-        except Exception as e:
-            logger.error(f"Erreur lors de la création du superutilisateur : {e}")
-            raise
+    from alembic import command
+
+    config = alembic_config()
+    with engine.begin() as connection:
+        config.attributes["connection"] = connection
+        tables = set(inspect(connection).get_table_names())
+        if "users" in tables and "alembic_version" not in tables:
+            command.stamp(config, BASELINE_REVISION)
+        command.upgrade(config, revision)
+
+
+def init_db(engine, revision: str = "head"):
+    """
+    Initialise la base de données : migrations, puis administrateur initial.
+
+    L'administrateur (FIRST_SUPERUSER / FIRST_SUPERUSER_PASSWORD) n'est créé
+    que s'il n'existe pas encore ; sans ces réglages, rien n'est inséré.
+    Appelé par `python -m app init-db`, ou au démarrage si DB_INIT_ON_STARTUP.
+    """
+    upgrade_schema(engine, revision)
+    logger.info("Schéma à jour")
+
+    if not settings.FIRST_SUPERUSER or not settings.FIRST_SUPERUSER_PASSWORD:
+        logger.info("FIRST_SUPERUSER non défini : aucun administrateur initial créé")
+        return
+
+    with Session(engine) as db:
+        if db.query(User.id).filter(User.username == settings.FIRST_SUPERUSER).first():
+            return
+        from app.passwords import pwd_context
+
+        db.add(User(
+            username=settings.FIRST_SUPERUSER,
+            hashed_password=pwd_context.hash(settings.FIRST_SUPERUSER_PASSWORD),
+            is_admin=True,
+        ))
+        db.commit()
+        logger.info("Superutilisateur créé avec succès")
@@ -0,0 +1,195 @@
+# app/jobs.py
+import asyncio
+import logging
+import uuid
+from datetime import datetime
+from typing import Awaitable, Callable, Dict, Iterator, Optional, Union
+
+from fastapi import Request
+from fastapi.concurrency import run_in_threadpool
+from fastapi.responses import JSONResponse
+from sqlalchemy import delete, insert, select, update
+from sqlalchemy.orm import Session
+
+from app.cache import resolved_cache
+from app.config import settings
+from app.database import SessionLocal
+from app.models import JobRecord
+from app.schemas import JobStatus
+
+logger = logging.getLogger(__name__)
+
+# Opération de masse (voir app.bulk) : session synchrone -> lots traités
+Work = Callable[[Session], Iterator[int]]
+
+
+class Job:
+    """
+    Opération de masse exécutée en tâche de fond, avec sa progression.
+    """
+
+    def __init__(self, kind: str, user_id: int, total: int):
+        self.id = uuid.uuid4().hex
+        self.kind = kind
+        self.user_id = user_id
+        self.status = "pending"
+        self.total = total
+        self.done = 0
+        self.error: Optional[str] = None
+        self.created_at = datetime.utcnow()
+        self.finished_at: Optional[datetime] = None
+
+    @property
+    def finished(self) -> bool:
+        return self.status in ("succeeded", "failed")
+
+
+async def run_bulk(work: Work, progress: Optional[Callable[[int], Awaitable[None]]] = None) -> int:
+    """
+    Exécute une opération de masse lot par lot dans le pool de threads.
+
+    Entre deux lots, la boucle est libre et le tier partagé du cache reçoit
+    les invalidations du lot. Retourne le nombre de variables traitées.
+    """
+    session = SessionLocal()
+    done = 0
+    try:
+        steps = work(session)
+        while True:
+            count = await run_in_threadpool(next, steps, None)
+            if count is None:
+                break
+            done += count
+            if progress is not None:
+                await progress(done)
+            await resolved_cache.flush()
+    except BaseException:
+        await run_in_threadpool(session.rollback)
+        raise
+    finally:
+        await run_in_threadpool(session.close)
+        await resolved_cache.flush()
+    return done
+
+
+class JobRegistry:
+    """
+    Tâches de fond : une à la fois par worker, état enregistré dans la table jobs.
+
+    Le worker qui exécute une tâche tient l'objet Job à jour et enregistre
+    chaque étape (lancement, lots, fin) ; les autres workers lisent la
+    table. Seules les `history` tâches terminées les plus récentes sont
+    conservées.
+    """
+
+    def __init__(self, history: int = 100):
+        self.history = history
+        # Tâches en cours dans ce processus
+        self._jobs: Dict[str, Job] = {}
+        self._tasks: Dict[str, asyncio.Task] = {}
+        self._semaphore: Optional[asyncio.Semaphore] = None
+
+    def __len__(self) -> int:
+        return len(self._jobs)
+
+    def _save(self, job: Job, created: bool = False) -> None:
+        values = {"status": job.status, "done": job.done, "error": job.error, "finished_at": job.finished_at}
+        with SessionLocal() as session:
+            if created:
+                session.execute(insert(JobRecord).values(
+                    id=job.id, kind=job.kind, user_id=job.user_id, total=job.total, created_at=job.created_at, **values
+                ))
+            else:
+                session.execute(update(JobRecord).where(JobRecord.id == job.id).values(**values))
+            if job.finished:
+                # Date de fin de la plus ancienne tâche terminée conservée
+                cutoff = session.scalar(
+                    select(JobRecord.finished_at).where(JobRecord.finished_at.isnot(None))
+                    .order_by(JobRecord.finished_at.desc()).offset(max(self.history, 1) - 1).limit(1)
+                )
+                if cutoff is not None:
+                    session.execute(delete(JobRecord).where(JobRecord.finished_at < cutoff))
+            session.commit()
+
+    def _load(self, job_id: str) -> Optional[JobRecord]:
+        with SessionLocal() as session:
+            return session.get(JobRecord, job_id)
+
+    async def get(self, job_id: str) -> Optional[Union[Job, JobRecord]]:
+        job = self._jobs.get(job_id)
+        if job is not None:
+            return job
+        return await run_in_threadpool(self._load, job_id)
+
+    async def submit(self, kind: str, user_id: int, total: int, work: Work) -> Job:
+        job = Job(kind, user_id, total)
+        await run_in_threadpool(self._save, job, True)
+        self._jobs[job.id] = job
+        task = asyncio.get_running_loop().create_task(self._run(job, work))
+        # Référence conservée jusqu'à la fin : une tâche sans référence peut être collectée
+        self._tasks[job.id] = task
+        task.add_done_callback(lambda _: self._forget(job.id))
+        return job
+
+    def _forget(self, job_id: str) -> None:
+        # État final enregistré : la table fait foi
+        self._tasks.pop(job_id, None)
+        self._jobs.pop(job_id, None)
+
+    async def _run(self, job: Job, work: Work) -> None:
+        if self._semaphore is None:
+            self._semaphore = asyncio.Semaphore(1)
+        # Une opération à la fois : les écritures sont de toute façon sérialisées par la base
+        async with self._semaphore:
+            job.status = "running"
+
+            async def progress(done: int) -> None:
+                job.done = done
+                await run_in_threadpool(self._save, job)
+
+            try:
+                await progress(0)
+                await run_bulk(work, progress)
+                job.status = "succeeded"
+            except Exception as e:
+                logger.exception("Tâche %s (%s) en échec", job.id, job.kind)
+                job.status = "failed"
+                job.error = str(e)
+            finally:
+                job.finished_at = datetime.utcnow()
+                try:
+                    await run_in_threadpool(self._save, job)
+                except Exception:
+                    logger.exception("État final de la tâche %s non enregistré", job.id)
+
+    async def wait(self) -> None:
+        """
+        Attend la fin des tâches en cours (arrêt de l'application).
+        """
+        tasks = list(self._tasks.values())
+        if tasks:
+            await asyncio.gather(*tasks, return_exceptions=True)
+
+
+jobs = JobRegistry(history=settings.JOB_HISTORY_SIZE)
+
+
+async def run_or_submit(request: Request, kind: str, user_id: int, total: int, work: Work, background: Optional[bool]) -> Optional[JSONResponse]:
+    """
+    Exécute l'opération dans la requête, ou en tâche de fond au-delà de
+    BULK_BACKGROUND_THRESHOLD variables (ou si background est demandé).
+
+    En tâche de fond, renvoie la réponse 202 qui désigne l'état de la tâche ;
+    sinon None, une fois l'opération terminée.
+    """
+    if background is None:
+        background = total > settings.BULK_BACKGROUND_THRESHOLD
+    if not background:
+        await run_bulk(work)
+        return None
+    job = await jobs.submit(kind, user_id, total, work)
+    return JSONResponse(
+        status_code=202,
+        content=JobStatus.model_validate(job).model_dump(mode="json"),
+        headers={"Location": str(request.url_for("read_job", job_id=job.id))},
+    )
@@ -0,0 +1,246 @@
+# app/logs.py
+import atexit
+import contextvars
+import copy
+import logging
+import logging.handlers
+import queue
+import random
+import re
+import sys
+import uuid
+from datetime import datetime, timezone
+from typing import Dict, Optional
+
+import orjson
+
+from app.config import settings
+
+# Identifiant de la requête HTTP en cours, repris dans chaque message ("-" hors requête)
+request_id: contextvars.ContextVar = contextvars.ContextVar("request_id", default="-")
+
+REQUEST_ID_PATTERN = re.compile(r"^[A-Za-z0-9._:-]{1,128}$")
+
+# Attributs propres à LogRecord : les autres (extra=...) sont ajoutés tels quels au JSON
+# (sauf color_message, variante colorée du message ajoutée par uvicorn)
+_RECORD_ATTRIBUTES = set(vars(logging.LogRecord("", 0, "", 0, "", (), None))) | {"message", "asctime", "request_id", "color_message"}
+
+
+class ContextFilter(logging.Filter):
+    """
+    Ajoute request_id à chaque enregistrement, dans le thread qui journalise.
+    """
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        record.request_id = request_id.get()
+        return True
+
+
+class SamplingFilter(logging.Filter):
+    """
+    Ne garde qu'une part des messages INFO et DEBUG d'un logger (et de ses enfants).
+
+    Les avertissements et erreurs sont toujours conservés.
+    """
+
+    def __init__(self, rates: Dict[str, float]):
+        super().__init__()
+        self.rates = rates
+        self._resolved: Dict[str, float] = {}
+
+    def _rate(self, name: str) -> float:
+        rate = self._resolved.get(name)
+        if rate is None:
+            parent = name
+            while parent not in self.rates and "." in parent:
+                parent = parent.rpartition(".")[0]
+            rate = self._resolved[name] = self.rates.get(parent, 1.0)
+        return rate
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        if record.levelno > logging.INFO or not self.rates:
+            return True
+        rate = self._rate(record.name)
+        return rate >= 1 or random.random() < rate
+
+
+class JsonFormatter(logging.Formatter):
+    """
+    Une ligne JSON par message : horodatage UTC, niveau, logger, message, request_id, extra.
+    """
+
+    def format(self, record: logging.LogRecord) -> str:
+        document = {
+            "time": datetime.fromtimestamp(record.created, timezone.utc).isoformat(timespec="milliseconds"),
+            "level": record.levelname,
+            "logger": record.name,
+            "message": record.getMessage(),
+            "process": record.process,
+        }
+        if getattr(record, "request_id", "-") != "-":
+            document["request_id"] = record.request_id
+        for key, value in vars(record).items():
+            if key not in _RECORD_ATTRIBUTES:
+                document[key] = value
+        if record.exc_info:
+            document["exc_info"] = self.formatException(record.exc_info)
+        elif record.exc_text:
+            # Trace déjà mise en forme par QueueHandler.prepare
+            document["exc_info"] = record.exc_text
+        if record.stack_info:
+            document["stack_info"] = self.formatStack(record.stack_info)
+        return orjson.dumps(document, default=str).decode()
+
+
+class QueueHandler(logging.handlers.QueueHandler):
+    """
+    Dépose les enregistrements dans la file.
+
+    Comme le QueueHandler standard, le message (arguments compris) et la
+    trace sont mis en forme dans le thread appelant : un argument modifié
+    ensuite ne change pas le message. Le rendu JSON et l'écriture se font
+    dans le thread du QueueListener. File pleine : le message est abandonné
+    et compté, jamais attendu.
+    """
+
+    def __init__(self, queue):
+        super().__init__(queue)
+        self.dropped = 0
+
+    def prepare(self, record: logging.LogRecord) -> logging.LogRecord:
+        # Copie : les autres handlers du logger reçoivent l'enregistrement d'origine
+        record = copy.copy(record)
+        record.msg = record.message = record.getMessage()
+        record.args = None
+        if record.exc_info:
+            # Trace mise en forme ici : les frames ne sont pas gardées en vie dans la file
+            record.exc_text = logging.Formatter().formatException(record.exc_info)
+            record.exc_info = None
+        return record
+
+    def enqueue(self, record: logging.LogRecord) -> None:
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            self.dropped += 1
+
+
+class QueueListener(logging.handlers.QueueListener):
+    """
+    Écrit les messages de la file ; à l'arrêt, attend une place pour le signal de fin.
+    """
+
+    def enqueue_sentinel(self) -> None:
+        self.queue.put(self._sentinel)
+
+
+_handler: Optional[logging.Handler] = None
+_listener: Optional[QueueListener] = None
+
+
+def dropped_records() -> int:
+    return _handler.dropped if isinstance(_handler, QueueHandler) else 0
+
+
+def configure_logging(
+    level: Optional[str] = None,
+    levels: Optional[Dict[str, str]] = None,
+    fmt: Optional[str] = None,
+    sampling: Optional[Dict[str, float]] = None,
+    queue_size: Optional[int] = None,
+    stream=None,
+    force: bool = False,
+) -> None:
+    """
+    Configure la journalisation de tout le processus d'après les réglages LOG_*.
+
+    Le logger racine reçoit un seul handler : avec une file (LOG_QUEUE_SIZE
+    > 0), un QueueHandler dont un thread dédié (QueueListener) écrit les
+    messages ; sans file, l'écriture a lieu dans le thread appelant. Sans
+    effet si la journalisation est déjà configurée, sauf avec force.
+    """
+    global _handler, _listener
+    if _handler is not None and not force:
+        return
+    shutdown_logging()
+
+    level = level or settings.LOG_LEVEL
+    levels = settings.LOG_LEVELS if levels is None else levels
+    fmt = fmt or settings.LOG_FORMAT
+    sampling = settings.LOG_SAMPLING if sampling is None else sampling
+    queue_size = settings.LOG_QUEUE_SIZE if queue_size is None else queue_size
+
+    output = logging.StreamHandler(stream or sys.stderr)
+    if fmt == "json":
+        output.setFormatter(JsonFormatter())
+    else:
+        output.setFormatter(logging.Formatter("%(asctime)s %(levelname)s %(name)s [%(request_id)s] %(message)s"))
+
+    if queue_size > 0:
+        _handler = QueueHandler(queue.Queue(queue_size))
+        _listener = QueueListener(_handler.queue, output, respect_handler_level=True)
+        _listener.start()
+    else:
+        _handler = output
+    # Filtres dans le thread appelant : request_id est une variable de contexte de la requête
+    _handler.addFilter(ContextFilter())
+    if sampling:
+        _handler.addFilter(SamplingFilter(sampling))
+
+    root = logging.getLogger()
+    root.setLevel(level.upper())
+    root.addHandler(_handler)
+    for name, logger_level in levels.items():
+        logging.getLogger(name).setLevel(logger_level.upper())
+
+
+def shutdown_logging() -> None:
+    """
+    Écrit les messages en attente et retire le handler installé par configure_logging.
+    """
+    global _handler, _listener
+    if _listener is not None:
+        _listener.stop()
+        _listener = None
+    if _handler is not None:
+        logging.getLogger().removeHandler(_handler)
+        _handler = None
+
+
+atexit.register(shutdown_logging)
+
+
+class RequestIdMiddleware:
+    """
+    Identifiant de requête : repris de l'en-tête LOG_REQUEST_ID_HEADER s'il est
+    valide, sinon généré ; exposé aux messages de la requête et renvoyé dans
+    la réponse.
+    """
+
+    def __init__(self, app, header: Optional[str] = None):
+        self.app = app
+        self.header = (header or settings.LOG_REQUEST_ID_HEADER).lower().encode("latin-1")
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] not in ("http", "websocket"):
+            await self.app(scope, receive, send)
+            return
+
+        value = None
+        for name, header in scope["headers"]:
+            if name == self.header:
+                value = header.decode("latin-1")
+                break
+        if value is None or not REQUEST_ID_PATTERN.match(value):
+            value = uuid.uuid4().hex
+        token = request_id.set(value)
+
+        async def send_wrapper(message):
+            if message["type"] == "http.response.start":
+                message = dict(message, headers=list(message.get("headers", [])) + [(self.header, value.encode("latin-1"))])
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            request_id.reset(token)
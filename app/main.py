@@ -1,25 +1,27 @@
-import sys
-import os
 import logging
-from dotenv import load_dotenv
 from fastapi import FastAPI, HTTPException, Request, Response, Depends
+from fastapi.concurrency import run_in_threadpool
 from fastapi.responses import JSONResponse
 from fastapi.middleware.cors import CORSMiddleware
-from sqlalchemy import create_engine
-from sqlalchemy.orm import sessionmaker, Session
+from sqlalchemy import text
+from sqlalchemy.ext.asyncio import AsyncSession
 
-from app.database import Base
 from app.config import settings
-from app.routes import auth_routes, variable_routes, category_routes, admin_routes
 
-# Charger les variables d'environnement
-load_dotenv()
-
-if not os.getenv("SECRET_KEY"):
+# Les variables d'environnement (et le fichier .env) sont lues par Settings
+if not settings.SECRET_KEY:
     raise ValueError("SECRET_KEY environment variable not set")
 
-# Configurer le logging
-logging.basicConfig(level=logging.INFO)
+from app.changes import cache_sync, change_hub
+from app.database import dispose_engines, get_db, get_engine
+from app.documents import render_pool
+from app.jobs import jobs
+from app.logs import RequestIdMiddleware, configure_logging
+from app.passwords import password_hasher
+from app.routes import auth_routes, variable_routes, category_routes, admin_routes, bundle_routes, document_routes, job_routes, metrics_routes
+
+# Journalisation (réglages LOG_*) : écriture hors du chemin des requêtes
+configure_logging()
 logger = logging.getLogger(__name__)
 
 # Création de l'application FastAPI
@@ -28,6 +30,13 @@ app = FastAPI(
     openapi_url=f"{settings.API_V1_STR}/openapi.json"
 )
 
+# Contrôle d'admission par route et par utilisateur ; ajouté avant CORS pour que les
+# réponses 429 / 503 portent les en-têtes CORS (et soient comptées par les métriques)
+if settings.ADMISSION_ENABLED:
+    from app.admission import AdmissionMiddleware
+
+    app.add_middleware(AdmissionMiddleware)
+
 # Ajout de CORS pour permettre les requêtes cross-origin
 origins = ["*"]
 
@@ -39,51 +48,49 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
-# Configuration de la base de données (utiliser le dialecte MySQL)
-DATABASE_URL = os.getenv("DATABASE_URL")
-if not DATABASE_URL:
-    raise ValueError("DATABASE_URL environment variable not set")
-engine = create_engine(DATABASE_URL, pool_pre_ping=True, echo=True)  # Activer les logs SQLAlchemy
-SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
-
-
-# Dépendance pour obtenir une session de base de données
-def get_db():
-    try:
-        logger.info(f"Tentative de connexion à la base de données : {DATABASE_URL}")
-        db = SessionLocal()
-        yield db
-    except Exception as e:
-        logger.error(f"Erreur de connexion à la base de données : {e}")
-        raise HTTPException(status_code=500, detail="Erreur de connexion à la base de données")
-    finally:
-        db.close()
+# Métriques : latence, statuts et requêtes SQL par route, exposées sur /metrics
+if settings.METRICS_ENABLED:
+    from app.metrics import MetricsMiddleware, register_collectors
 
+    register_collectors()
+    app.add_middleware(MetricsMiddleware, server_timing=settings.METRICS_SERVER_TIMING)
+    app.include_router(metrics_routes.router, tags=["metrics"])
 
-# Créer les tables de la base de données si elles n'existent pas
-try:
-    logger.info("Tentative de création des tables de la base de données")
-    Base.metadata.create_all(bind=engine)
-    logger.info("Création des tables réussie")
-except Exception as e:
-    logger.error(f"Erreur lors de la création des tables : {e}")
-    raise  # Remonter l'erreur pour arrêter le démarrage
+# Identifiant de requête (en-tête X-Request-ID) : middleware le plus externe, tous les messages le portent
+app.add_middleware(RequestIdMiddleware)
 
 # Inclure les routeurs
 app.include_router(auth_routes.router, prefix=settings.API_V1_STR + '/auth', tags=["auth"])
 app.include_router(variable_routes.router, prefix=settings.API_V1_STR + '/variables', tags=["variables"])
 app.include_router(category_routes.router, prefix=settings.API_V1_STR + '/categories', tags=["categories"])
 app.include_router(admin_routes.router, prefix=settings.API_V1_STR + '/admin/categories', tags=["admin"])
+app.include_router(document_routes.router, prefix=settings.API_V1_STR + '/documents', tags=["documents"])
+app.include_router(bundle_routes.router, prefix=settings.API_V1_STR + '/bundles', tags=["bundles"])
+app.include_router(job_routes.router, prefix=settings.API_V1_STR + '/jobs', tags=["jobs"])
+
+# Schéma et données initiales : `python -m app init-db` (ou DB_INIT_ON_STARTUP pour le développement).
+# Rien n'est fait à l'import : le moteur est créé à la première requête.
+@app.on_event("startup")
+async def initialize_database() -> None:
+    if settings.DB_INIT_ON_STARTUP:
+        from app.initial_data import init_db
+
+        await run_in_threadpool(init_db, get_engine())
+    # En tâche de fond, sans retarder le démarrage : invalidations venues des autres workers
+    cache_sync.start()
+
+
+@app.on_event("shutdown")
+async def close_resources() -> None:
+    # Les flux de modifications se terminent : leurs connexions n'attendent pas le client
+    await change_hub.close()
+    await cache_sync.close()
+    # Les opérations de masse en cours terminent leurs lots avant la fermeture des pools
+    await jobs.wait()
+    await dispose_engines()
+    password_hasher.shutdown()
+    render_pool.shutdown()
 
-# Initialisation de la base de données
-logger.info("Tentative d'initialisation des données de la base de données")
-try:
-    from app.initial_data import init_db  # Importer votre script d'initialisation
-    init_db(engine)
-    logger.info("Initialisation des données réussie")
-except Exception as e:
-    logger.error(f"Erreur lors de l'initialisation de la base de données : {e}")
-    raise
 
 # Gestion des erreurs 404
 @app.exception_handler(404)
@@ -101,13 +108,13 @@ async def root() -> dict:
 
 
 @app.get("/test_db")
-async def test_db(db: Session = Depends(get_db)):
+async def test_db(db: AsyncSession = Depends(get_db)):
     try:
-        result = db.execute("SELECT 1")
+        result = await db.execute(text("SELECT 1"))
         if result.fetchone()[0] == 1:
             return {"db_connection": "success"}
         else:
             return {"db_connection": "failed"}
     except Exception as e:
-        logger.error(f"Erreur lors du test de la connexion à la base de données : {e}")
+        logger.error("Erreur lors du test de la connexion à la base de données : %s", e)
         raise HTTPException(status_code=500, detail=f"Database connection error: {e}")
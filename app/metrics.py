@@ -0,0 +1,260 @@
+# app/metrics.py
+import bisect
+import contextvars
+import threading
+import time
+from typing import Callable, Dict, Iterable, List, Optional, Sequence, Tuple
+
+# Bornes des histogrammes (secondes, puis nombre de requêtes SQL)
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+QUERY_COUNT_BUCKETS = (0, 1, 2, 3, 5, 10, 20, 50, 100)
+DEPTH_BUCKETS = (0, 1, 2, 3, 5, 10, 20, 50)
+
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+
+def _escape(value: str) -> str:
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _labels(names: Sequence[str], values: Sequence, extra: str = "") -> str:
+    pairs = [f'{name}="{_escape(value)}"' for name, value in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+
+def _number(value: float) -> str:
+    if value == float("inf"):
+        return "+Inf"
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+class Metric:
+    kind = "untyped"
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = ()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._lock = threading.Lock()
+
+    def samples(self) -> Iterable[str]:
+        raise NotImplementedError
+
+    def render(self) -> List[str]:
+        return [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} {self.kind}", *self.samples()]
+
+
+class Counter(Metric):
+    """
+    Compteur ; `collect` (facultatif) fournit la valeur au moment de l'export.
+    """
+    kind = "counter"
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = (), collect: Optional[Callable[[], float]] = None):
+        super().__init__(name, documentation, labelnames)
+        self.collect = collect
+        self._values: Dict[Tuple, float] = {}
+
+    def inc(self, labels: Tuple = (), amount: float = 1) -> None:
+        with self._lock:
+            self._values[labels] = self._values.get(labels, 0) + amount
+
+    def samples(self) -> Iterable[str]:
+        if self.collect is not None:
+            yield f"{self.name} {_number(self.collect())}"
+            return
+        with self._lock:
+            values = sorted(self._values.items())
+        for labels, value in values:
+            yield f"{self.name}{_labels(self.labelnames, labels)} {_number(value)}"
+
+
+class Gauge(Counter):
+    kind = "gauge"
+
+    def dec(self, labels: Tuple = (), amount: float = 1) -> None:
+        self.inc(labels, -amount)
+
+
+class Histogram(Metric):
+    kind = "histogram"
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = (), buckets: Sequence[float] = LATENCY_BUCKETS):
+        super().__init__(name, documentation, labelnames)
+        self.buckets = tuple(buckets)
+        # labels -> [effectif par intervalle (dernier : +Inf)..., somme]
+        self._values: Dict[Tuple, List[float]] = {}
+
+    def observe(self, value: float, labels: Tuple = ()) -> None:
+        index = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            counts = self._values.get(labels)
+            if counts is None:
+                counts = self._values[labels] = [0] * (len(self.buckets) + 1) + [0.0]
+            counts[index] += 1
+            counts[-1] += value
+
+    def samples(self) -> Iterable[str]:
+        with self._lock:
+            values = sorted((labels, list(counts)) for labels, counts in self._values.items())
+        for labels, counts in values:
+            cumulative = 0
+            for bound, count in zip(self.buckets + (float("inf"),), counts):
+                cumulative += count
+                le = 'le="%s"' % _number(bound)
+                yield f"{self.name}_bucket{_labels(self.labelnames, labels, le)} {cumulative}"
+            yield f"{self.name}_sum{_labels(self.labelnames, labels)} {_number(counts[-1])}"
+            yield f"{self.name}_count{_labels(self.labelnames, labels)} {cumulative}"
+
+
+class Registry:
+    def __init__(self):
+        self.metrics: List[Metric] = []
+
+    def register(self, metric: Metric) -> Metric:
+        self.metrics.append(metric)
+        return metric
+
+    def render(self) -> str:
+        lines: List[str] = []
+        for metric in self.metrics:
+            lines.extend(metric.render())
+        return "\n".join(lines) + "\n"
+
+
+registry = Registry()
+
+HTTP_REQUESTS = registry.register(Counter("http_requests_total", "HTTP requests handled", ("method", "route", "status")))
+HTTP_LATENCY = registry.register(Histogram("http_request_duration_seconds", "HTTP request latency", ("method", "route")))
+HTTP_IN_FLIGHT = registry.register(Gauge("http_requests_in_flight", "HTTP requests in progress"))
+REQUEST_QUERIES = registry.register(Histogram("http_request_db_queries", "SQL statements per HTTP request", ("method", "route"), QUERY_COUNT_BUCKETS))
+REQUEST_DB_TIME = registry.register(Histogram("http_request_db_duration_seconds", "Database time per HTTP request", ("method", "route")))
+DB_QUERIES = registry.register(Counter("db_queries_total", "SQL statements executed"))
+DB_TIME = registry.register(Counter("db_query_duration_seconds_total", "Total SQL execution time"))
+RESOLUTION_DEPTH = registry.register(Histogram("variable_resolution_depth", "Deepest reference chain per resolution", buckets=DEPTH_BUCKETS))
+RESOLUTION_EXPANDED = registry.register(Counter("variable_references_expanded_total", "Variable references expanded"))
+RESOLUTION_LOOKUPS = registry.register(Counter("variable_resolver_cache_total", "Resolved value cache lookups by the resolver", ("result",)))
+
+
+class RequestStats:
+    __slots__ = ("queries", "db_seconds")
+
+    def __init__(self):
+        self.queries = 0
+        self.db_seconds = 0.0
+
+
+_request_stats: contextvars.ContextVar = contextvars.ContextVar("request_stats", default=None)
+
+
+def before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    conn.info.setdefault("query_start", []).append(time.perf_counter())
+
+
+def after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    elapsed = time.perf_counter() - conn.info["query_start"].pop()
+    DB_QUERIES.inc()
+    DB_TIME.inc(amount=elapsed)
+    stats = _request_stats.get()
+    if stats is not None:
+        stats.queries += 1
+        stats.db_seconds += elapsed
+
+
+def handle_error(context):
+    # Requête en échec : after_cursor_execute n'est pas appelé
+    starts = context.connection.info.get("query_start") if context.connection is not None else None
+    if starts:
+        starts.pop()
+
+
+def instrument_engine(sync_engine) -> None:
+    """
+    Compte les requêtes SQL d'un moteur (et de la requête HTTP en cours).
+    """
+    from sqlalchemy import event
+
+    event.listen(sync_engine, "before_cursor_execute", before_cursor_execute)
+    event.listen(sync_engine, "after_cursor_execute", after_cursor_execute)
+    event.listen(sync_engine, "handle_error", handle_error)
+
+
+def record_resolution(depth: int, expanded: int, hits: int, misses: int) -> None:
+    RESOLUTION_DEPTH.observe(depth)
+    if expanded:
+        RESOLUTION_EXPANDED.inc(amount=expanded)
+    if hits:
+        RESOLUTION_LOOKUPS.inc(("hit",), hits)
+    if misses:
+        RESOLUTION_LOOKUPS.inc(("miss",), misses)
+
+
+class MetricsMiddleware:
+    """
+    Latence, statut et requêtes SQL de chaque requête HTTP, par route.
+
+    Middleware ASGI pur : le libellé de route est le modèle de chemin
+    (/variables/{variable_id}), ce qui borne le nombre de séries. Avec
+    server_timing, la réponse porte un en-tête Server-Timing (temps
+    applicatif et temps passé en base jusqu'à l'envoi des en-têtes).
+    """
+
+    def __init__(self, app, server_timing: bool = False):
+        self.app = app
+        self.server_timing = server_timing
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        stats = RequestStats()
+        token = _request_stats.set(stats)
+        started = time.perf_counter()
+        status_code = 500
+        HTTP_IN_FLIGHT.inc()
+
+        async def send_wrapper(message):
+            nonlocal status_code
+            if message["type"] == "http.response.start":
+                status_code = message["status"]
+                if self.server_timing:
+                    elapsed = (time.perf_counter() - started) * 1000
+                    header = f'app;dur={elapsed:.1f}, db;dur={stats.db_seconds * 1000:.1f};desc="{stats.queries} queries"'
+                    message = dict(message, headers=list(message.get("headers", [])) + [(b"server-timing", header.encode())])
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            elapsed = time.perf_counter() - started
+            HTTP_IN_FLIGHT.dec()
+            _request_stats.reset(token)
+            route = scope.get("route")
+            labels = (scope["method"], getattr(route, "path", "unmatched"))
+            HTTP_REQUESTS.inc(labels + (str(status_code),))
+            HTTP_LATENCY.observe(elapsed, labels)
+            REQUEST_QUERIES.observe(stats.queries, labels)
+            REQUEST_DB_TIME.observe(stats.db_seconds, labels)
+
+
+def register_collectors() -> None:
+    """
+    Valeurs lues au moment de l'export : caches et pool de hachage.
+    """
+    from app.auth import principal_cache
+    from app.cache import resolved_cache
+    from app.logs import dropped_records
+    from app.passwords import password_hasher
+
+    registry.register(Gauge("resolved_cache_entries", "Resolved value cache entries", collect=lambda: len(resolved_cache)))
+    registry.register(Counter("resolved_cache_hits_total", "Resolved value cache hits", collect=lambda: resolved_cache.hits))
+    registry.register(Counter("resolved_cache_misses_total", "Resolved value cache misses", collect=lambda: resolved_cache.misses))
+    registry.register(Gauge("auth_principal_cache_entries", "Validated tokens in cache", collect=lambda: len(principal_cache)))
+    registry.register(Counter("log_records_dropped_total", "Log records dropped because the log queue was full", collect=dropped_records))
+    for key in ("workers", "running", "queued"):
+        registry.register(Gauge(f"password_hash_{key}", f"Password hashing pool: {key}", collect=lambda key=key: password_hasher.stats()[key]))
+    for key in ("completed", "rejected"):
+        registry.register(Counter(f"password_hash_{key}_total", f"Password hashing pool: {key}", collect=lambda key=key: password_hasher.stats()[key]))
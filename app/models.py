@@ -1,5 +1,6 @@
 # models.py
-from sqlalchemy import Column, Integer, String, Boolean, DateTime, ForeignKey
+from sqlalchemy import Column, Integer, String, Text, Boolean, DateTime, ForeignKey, Index
+from sqlalchemy.dialects import mysql
 from sqlalchemy.orm import relationship
 from datetime import datetime
 from app.database import Base
@@ -11,6 +12,9 @@ class User(Base):
     hashed_password = Column(String)
     variables = relationship("Variable", back_populates="owner")
     is_admin = Column(Boolean, default=False)
+    is_active = Column(Boolean, default=True, server_default="1", nullable=False)
+    # Incrémenté à chaque changement de statut : les jetons émis avant sont révoqués
+    token_version = Column(Integer, default=0, server_default="0", nullable=False)
 
 class Category(Base):
     __tablename__ = "categories"
@@ -20,26 +24,82 @@ class Category(Base):
     owner = relationship("User")
     variables = relationship("Variable", back_populates="category", cascade="all, delete-orphan")
 
+    # Listes par propriétaire, paginées sur (owner_id, id) ; voir alembic/versions
+    __table_args__ = (Index("ix_categories_owner_id_id", "owner_id", "id"),)
+
+# Horodatage à la microseconde, y compris sous MySQL (DATETIME seul : à la seconde) ; voir 0006
+PreciseDateTime = DateTime().with_variant(mysql.DATETIME(fsp=6), "mysql")
+
 class Variable(Base):
     __tablename__ = "variables"
     id = Column(Integer, primary_key=True, index=True)
     name = Column(String, index=True)
     identifier = Column(String, unique=True, index=True)
     value = Column(String)
-    category_id = Column(Integer, ForeignKey("categories.id"))
+    category_id = Column(Integer, ForeignKey("categories.id"), index=True)
     category = relationship("Category", back_populates="variables")
-    parent_variable_id = Column(Integer, ForeignKey("variables.id"))  # Nouvelle relation
+    parent_variable_id = Column(Integer, ForeignKey("variables.id"), index=True)  # Nouvelle relation
     parent_variable = relationship("Variable", remote_side=[id], backref="child_variables")
-    created_at = Column(DateTime, default=datetime.utcnow)
-    updated_at = Column(DateTime, default=datetime.utcnow)
+    created_at = Column(PreciseDateTime, default=datetime.utcnow)
+    # Mis à jour par toute modification de la ligne (base des ETag et des bundles incrémentaux)
+    updated_at = Column(PreciseDateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
     owner_id = Column(Integer, ForeignKey("users.id"))
     owner = relationship("User", back_populates="variables")
 
+    # Résolution (owner_id, identifier IN ...) et pagination (owner_id, id)
+    __table_args__ = (
+        Index("ix_variables_owner_id_identifier", "owner_id", "identifier"),
+        Index("ix_variables_owner_id_id", "owner_id", "id"),
+    )
+
     def resolve_value(self, db):
-        resolved_value = self.value
-        variables = db.query(Variable).filter(Variable.owner_id == self.owner_id).all()
+        from app.utils import VariableResolver
+
+        return VariableResolver(db).resolve_variable(self)
+
+class Change(Base):
+    """
+    Journal des modifications des variables et des catégories.
+
+    Alimenté par les triggers de la migration 0005 : toute écriture (ORM,
+    ensembliste, cascade, import) y laisse une ligne dans sa transaction.
+    L'id, croissant, sert de curseur de synchronisation.
+    """
+    __tablename__ = "changes"
+    id = Column(Integer, primary_key=True)
+    # Sans clé étrangère : les suppressions (tombstones) survivent aux lignes supprimées
+    owner_id = Column(Integer)
+    entity = Column(String(16), nullable=False)
+    entity_id = Column(Integer, nullable=False)
+    # Identifiant de la variable : retrouve les variables qui la référencent, même après suppression
+    identifier = Column(String)
+    deleted = Column(Boolean, nullable=False)
+    changed_at = Column(DateTime, nullable=False)
+
+    # Curseur par propriétaire ; ids jamais réutilisés après une purge (AUTOINCREMENT sous SQLite)
+    __table_args__ = (
+        Index("ix_changes_owner_id_id", "owner_id", "id"),
+        Index("ix_changes_changed_at", "changed_at"),
+        {"sqlite_autoincrement": True},
+    )
+
+class JobRecord(Base):
+    """
+    État des opérations de masse en tâche de fond (app.jobs).
 
-        for variable in variables:
-            resolved_value = resolved_value.replace(f"{variable.identifier}", variable.value)
+    Écrit par le worker qui exécute la tâche, lu par tous : /jobs/{id}
+    répond quel que soit le worker qui reçoit la requête.
+    """
+    __tablename__ = "jobs"
+    id = Column(String(32), primary_key=True)
+    kind = Column(String(32), nullable=False)
+    user_id = Column(Integer, nullable=False)
+    status = Column(String(16), nullable=False)
+    total = Column(Integer, nullable=False)
+    done = Column(Integer, nullable=False)
+    error = Column(Text)
+    created_at = Column(DateTime, nullable=False)
+    finished_at = Column(DateTime)
 
-        return resolved_value
\ No newline at end of file
+    # Purge de l'historique (JOB_HISTORY_SIZE tâches terminées)
+    __table_args__ = (Index("ix_jobs_finished_at", "finished_at"),)
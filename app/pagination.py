@@ -0,0 +1,63 @@
+# app/pagination.py
+import base64
+import json
+from datetime import datetime
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+
+from fastapi import HTTPException, Response, status
+from sqlalchemy import and_, or_
+
+NEXT_CURSOR_HEADER = "X-Next-Cursor"
+# Taille d'une page : 100 lignes par défaut, au plus MAX_PAGE_SIZE
+MAX_PAGE_SIZE = 1000
+# Nombre de lignes lues par aller-retour lors d'un export
+EXPORT_BATCH_SIZE = 1000
+
+
+def encode_cursor(owner_id: int, last_id: int) -> str:
+    return base64.urlsafe_b64encode(f"{owner_id}:{last_id}".encode()).decode().rstrip("=")
+
+
+def decode_cursor(cursor: str) -> Tuple[int, int]:
+    try:
+        padded = cursor + "=" * (-len(cursor) % 4)
+        owner_id, last_id = base64.urlsafe_b64decode(padded.encode()).decode().split(":")
+        return int(owner_id), int(last_id)
+    except (ValueError, UnicodeDecodeError):
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="Invalid cursor")
+
+
+async def paginate(db, statement, model, response: Response, after: Optional[str] = None, limit: int = 100, skip: int = 0, rows: bool = False) -> List:
+    """
+    Pagine une requête select() par clé (owner_id, id).
+
+    Le curseur de la page suivante est renvoyé dans l'en-tête X-Next-Cursor.
+    skip (pagination par décalage) n'est appliqué qu'en l'absence de curseur.
+    Avec rows, la requête sélectionne des colonnes et renvoie des lignes.
+    """
+    statement = statement.order_by(model.owner_id, model.id)
+    if after:
+        owner_id, last_id = decode_cursor(after)
+        statement = statement.where(or_(model.owner_id > owner_id, and_(model.owner_id == owner_id, model.id > last_id)))
+    elif skip:
+        statement = statement.offset(skip)
+
+    statement = statement.limit(limit + 1)
+    items = (await db.execute(statement)).all() if rows else (await db.scalars(statement)).all()
+    if len(items) > limit:
+        items = items[:limit]
+        response.headers[NEXT_CURSOR_HEADER] = encode_cursor(items[-1].owner_id, items[-1].id)
+    return items
+
+
+def _default(value: Any):
+    if isinstance(value, datetime):
+        return value.isoformat()
+    raise TypeError(f"Object of type {type(value).__name__} is not JSON serializable")
+
+
+def dump_ndjson(records: Iterable[Dict]) -> bytes:
+    """
+    Sérialise des enregistrements en NDJSON, un objet par ligne.
+    """
+    return "".join(json.dumps(record, default=_default, ensure_ascii=False) + "\n" for record in records).encode()
\ No newline at end of file
@@ -0,0 +1,121 @@
+# app/passwords.py
+import asyncio
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, Iterable, List, Optional, Tuple
+
+from fastapi import HTTPException, status
+from passlib.context import CryptContext
+
+from app.config import settings
+
+
+def build_context(rounds: int) -> CryptContext:
+    # Coût minimal = maximal = coût configuré : tout hash d'un autre coût est à recalculer
+    return CryptContext(
+        schemes=["bcrypt"],
+        deprecated="auto",
+        bcrypt__default_rounds=rounds,
+        bcrypt__min_rounds=rounds,
+        bcrypt__max_rounds=rounds,
+    )
+
+
+pwd_context = build_context(settings.BCRYPT_ROUNDS)
+
+
+class PasswordHasher:
+    """
+    Calcul et vérification des hash bcrypt hors de la boucle asynchrone.
+
+    Les calculs s'exécutent dans un pool de threads dédié : bcrypt libère
+    le GIL, le pool occupe donc plusieurs cœurs sans bloquer les autres
+    requêtes. Au-delà de max_queue calculs en attente, une requête est
+    refusée (503) plutôt que de s'ajouter à la file.
+    """
+
+    def __init__(self, context: CryptContext, workers: Optional[int] = None, max_queue: int = 64):
+        self.context = context
+        self.workers = workers or os.cpu_count() or 1
+        self.max_queue = max_queue
+        # Calculs soumis et non terminés, dont ceux en cours d'exécution
+        self.pending = 0
+        self.running = 0
+        self.completed = 0
+        self.rejected = 0
+        self._executor: Optional[ThreadPoolExecutor] = None
+        self._lock = threading.Lock()
+
+    def _call(self, fn, *args):
+        with self._lock:
+            self.running += 1
+        try:
+            return fn(*args)
+        finally:
+            with self._lock:
+                self.running -= 1
+
+    async def _submit(self, fn, *args):
+        with self._lock:
+            if self.pending - self.running >= self.max_queue:
+                self.rejected += 1
+                raise HTTPException(
+                    status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+                    detail="Password hashing queue is full",
+                    headers={"Retry-After": "1"},
+                )
+            self.pending += 1
+            if self._executor is None:
+                self._executor = ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix="password-hash")
+        try:
+            return await asyncio.get_running_loop().run_in_executor(self._executor, self._call, fn, *args)
+        finally:
+            with self._lock:
+                self.pending -= 1
+                self.completed += 1
+
+    async def hash(self, password: str) -> str:
+        return await self._submit(self.context.hash, password)
+
+    async def verify(self, password: str, hashed_password: str) -> bool:
+        return await self._submit(self.context.verify, password, hashed_password)
+
+    async def verify_and_update(self, password: str, hashed_password: str) -> Tuple[bool, Optional[str]]:
+        """
+        Vérifie un mot de passe ; renvoie aussi un nouveau hash si le coût stocké n'est plus le coût configuré.
+        """
+        return await self._submit(self.context.verify_and_update, password, hashed_password)
+
+    async def hash_many(self, passwords: Iterable[str]) -> List[str]:
+        """
+        Calcule plusieurs hash en parallèle, un lot de la taille du pool à la fois.
+        """
+        passwords = list(passwords)
+        hashes: List[str] = []
+        for start in range(0, len(passwords), self.workers):
+            batch = passwords[start:start + self.workers]
+            hashes.extend(await asyncio.gather(*(self.hash(password) for password in batch)))
+        return hashes
+
+    def stats(self) -> Dict[str, int]:
+        with self._lock:
+            return {
+                "workers": self.workers,
+                "running": self.running,
+                "queued": max(self.pending - self.running, 0),
+                "completed": self.completed,
+                "rejected": self.rejected,
+            }
+
+    def shutdown(self) -> None:
+        if self._executor is not None:
+            self._executor.shutdown(wait=False, cancel_futures=True)
+            self._executor = None
+
+
+password_hasher = PasswordHasher(
+    pwd_context,
+    workers=settings.PASSWORD_HASH_WORKERS,
+    max_queue=settings.PASSWORD_HASH_MAX_QUEUE,
+)
@@ -0,0 +1,125 @@
+# app/render.py
+import codecs
+from typing import AsyncIterator, Awaitable, Callable, Dict, Iterable, List, Optional, Set, Tuple
+
+from starlette.responses import StreamingResponse
+from starlette.types import Receive, Scope, Send
+
+from app.utils import IDENTIFIER_PATTERN
+
+# Longueur maximale d'un placeholder retenu entre deux morceaux ; au-delà, "{{" est traité comme du texte
+MAX_PLACEHOLDER_LENGTH = 256
+
+Segment = Tuple[bool, str]
+
+
+class PlaceholderScanner:
+    """
+    Scanner incrémental des placeholders {{identifiant}}.
+
+    Le texte est parcouru une seule fois ; un placeholder coupé entre deux
+    morceaux est conservé (au plus MAX_PLACEHOLDER_LENGTH caractères) jusqu'au
+    morceau suivant. feed() renvoie des segments (est_une_référence, texte).
+    """
+
+    def __init__(self, max_placeholder_length: int = MAX_PLACEHOLDER_LENGTH):
+        self.max_placeholder_length = max_placeholder_length
+        self._carry = ""
+
+    def feed(self, text: str) -> List[Segment]:
+        buffer = self._carry + text
+        self._carry = ""
+        segments: List[Segment] = []
+        position = 0
+        while True:
+            start = buffer.find("{{", position)
+            if start == -1:
+                # Un "{" final peut être le début d'un placeholder
+                end = len(buffer) - 1 if buffer.endswith("{") else len(buffer)
+                if end > position:
+                    segments.append((False, buffer[position:end]))
+                self._carry = buffer[end:]
+                return segments
+
+            limit = start + 2 + self.max_placeholder_length
+            stop = buffer.find("}}", start + 2, limit + 2)
+            if stop == -1:
+                if len(buffer) < limit + 2:
+                    # Le placeholder peut se terminer dans le morceau suivant
+                    if start > position:
+                        segments.append((False, buffer[position:start]))
+                    self._carry = buffer[start:]
+                    return segments
+                segments.append((False, buffer[position:start + 1]))
+                position = start + 1
+                continue
+
+            name = buffer[start + 2:stop]
+            if IDENTIFIER_PATTERN.fullmatch(name):
+                if start > position:
+                    segments.append((False, buffer[position:start]))
+                segments.append((True, name))
+                position = stop + 2
+            else:
+                segments.append((False, buffer[position:start + 1]))
+                position = start + 1
+
+    def close(self) -> List[Segment]:
+        carry, self._carry = self._carry, ""
+        return [(False, carry)] if carry else []
+
+
+async def render_stream(
+    chunks: AsyncIterator[bytes],
+    lookup: Callable[[Set[str]], Awaitable[Dict[str, Optional[str]]]],
+    encoding: str = "utf-8",
+) -> AsyncIterator[bytes]:
+    """
+    Substitue les placeholders d'un flux d'octets au fil de l'eau.
+
+    Le flux est décodé selon `encoding` et renvoyé en UTF-8 : toute valeur
+    résolue y est représentable, quel que soit le jeu de caractères d'entrée.
+    lookup reçoit les identifiants encore inconnus d'un morceau et renvoie
+    leurs valeurs résolues (None si introuvable) ; les placeholders non
+    résolus sont laissés tels quels.
+    """
+    decoder = codecs.getincrementaldecoder(encoding)(errors="replace")
+    scanner = PlaceholderScanner()
+    values: Dict[str, Optional[str]] = {}
+
+    async def substitute(segments: Iterable[Segment]) -> bytes:
+        segments = list(segments)
+        unknown = {text for is_reference, text in segments if is_reference and text not in values}
+        if unknown:
+            values.update(await lookup(unknown))
+        parts = []
+        for is_reference, text in segments:
+            if not is_reference:
+                parts.append(text)
+            else:
+                value = values.get(text)
+                parts.append(value if value is not None else "{{" + text + "}}")
+        return "".join(parts).encode("utf-8")
+
+    async for chunk in chunks:
+        output = await substitute(scanner.feed(decoder.decode(chunk)))
+        if output:
+            yield output
+    output = await substitute(scanner.feed(decoder.decode(b"", final=True)) + scanner.close())
+    if output:
+        yield output
+
+
+class DuplexStreamingResponse(StreamingResponse):
+    """
+    StreamingResponse dont le contenu peut lire le corps de la requête en cours.
+
+    StreamingResponse écoute la déconnexion en consommant receive(), ce qui
+    vole les messages du corps ; ici, une déconnexion remonte via
+    request.stream() (ClientDisconnect).
+    """
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        await self.stream_response(send)
+        if self.background is not None:
+            await self.background()
@@ -1,40 +1,107 @@
-from typing import List
-from fastapi import APIRouter, Depends, HTTPException, status
-from sqlalchemy.orm import Session
+from typing import List, Optional
+from fastapi import APIRouter, Depends, HTTPException, Query, Request, Response, status
+from sqlalchemy import func, select
+from sqlalchemy.ext.asyncio import AsyncSession
 
+from app import bulk
+from app.auth import set_user_status
 from app.dependencies import get_current_active_admin
 from app.database import get_db
-from app.models import Category as CategoryModel, User as UserModel
-from app.schemas import Category
+from app.models import Category as CategoryModel, User as UserModel, Variable as VariableModel
+from app.etag import categories_etag, etag_matches, not_modified
+from app.config import settings
+from app.jobs import run_or_submit
+from app.fieldsets import Fieldset, category_fieldset, category_options, fieldset_categories
+from app.serialization import fast_categories, select_category_rows
+from app.pagination import MAX_PAGE_SIZE, NEXT_CURSOR_HEADER, paginate
+from app.passwords import password_hasher
+from app.schemas import Category, User, UserBulkCreate, UserBulkCreateReport, UserStatusUpdate
+from app.utils import chunked
 
-admin_router = APIRouter()
+router = APIRouter()
 
-@admin_router.get("/users/{user_id}/categories/", response_model=List[Category])
-def read_user_categories(user_id: int, db: Session = Depends(get_db), current_user: UserModel = Depends(get_current_active_admin)):
+@router.get("/users/{user_id}/categories/", response_model=List[Category])
+async def read_user_categories(user_id: int, request: Request, response: Response, limit: int = Query(100, ge=1, le=MAX_PAGE_SIZE), after: Optional[str] = Query(None, description="Curseur de la page suivante (en-tête X-Next-Cursor)"), fieldset: Fieldset = Depends(category_fieldset), db: AsyncSession = Depends(get_db), current_user: UserModel = Depends(get_current_active_admin)):
     """
-    Récupère toutes les catégories appartenant à un utilisateur spécifique.
+    Récupère les catégories appartenant à un utilisateur spécifique, par pages.
     
     Uniquement accessible aux administrateurs.
     """
 
-    user = db.query(UserModel).filter(UserModel.id == user_id).first()
+    user = await db.scalar(select(UserModel).where(UserModel.id == user_id))
     if user is None:
         raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="User not found")
 
-    categories = db.query(CategoryModel).filter(CategoryModel.owner_id == user_id).all()
+    if fieldset.default and settings.FAST_SERIALIZATION:
+        return await fast_categories(db, request, response, select_category_rows().where(CategoryModel.owner_id == user_id), after, limit)
+    statement = select(CategoryModel).options(*category_options(fieldset)).where(CategoryModel.owner_id == user_id)
+    categories = await paginate(db, statement, CategoryModel, response, after=after, limit=limit)
+    if not fieldset.default:
+        return fieldset_categories(request, response, categories, fieldset)
+    etag = categories_etag(categories, response.headers.get(NEXT_CURSOR_HEADER))
+    if etag_matches(request, etag):
+        return not_modified(etag)
+    response.headers["ETag"] = etag
     return categories
 
-@admin_router.delete("/users/{user_id}/categories/", status_code=status.HTTP_204_NO_CONTENT)
-def delete_all_user_categories(user_id: int, db: Session = Depends(get_db), current_user: UserModel = Depends(get_current_active_admin)):
+@router.delete("/users/{user_id}/categories/", status_code=status.HTTP_204_NO_CONTENT)
+async def delete_all_user_categories(user_id: int, request: Request, background: Optional[bool] = Query(None, description="Tâche de fond (202 + état sur /jobs/{id}) ; par défaut au-delà de BULK_BACKGROUND_THRESHOLD variables"), db: AsyncSession = Depends(get_db), current_user: UserModel = Depends(get_current_active_admin)):
     """
-    Supprime toutes les catégories appartenant à un utilisateur spécifique.
+    Supprime toutes les catégories appartenant à un utilisateur spécifique, avec leurs variables.
 
+    Les suppressions sont ensemblistes et validées par lots ; au-delà de
+    BULK_BACKGROUND_THRESHOLD variables, l'opération passe en tâche de fond
+    (202, progression sur /jobs/{id}).
     Uniquement accessible aux administrateurs.
     """
 
-    user = db.query(UserModel).filter(UserModel.id == user_id).first()
+    user = await db.scalar(select(UserModel).where(UserModel.id == user_id))
     if user is None:
         raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="User not found")
 
-    db.query(CategoryModel).filter(CategoryModel.owner_id == user_id).delete()
-    db.commit()
+    total = await db.scalar(select(func.count()).select_from(VariableModel).join(CategoryModel, VariableModel.category_id == CategoryModel.id).where(CategoryModel.owner_id == user_id))
+    chunk_size = settings.BULK_CHUNK_SIZE
+    return await run_or_submit(request, "delete_user_categories", current_user.id, total, lambda session: bulk.delete_owner_categories(session, user_id, chunk_size), background)
+
+@router.put("/users/{user_id}/status", response_model=User)
+async def update_user_status(user_id: int, user_status: UserStatusUpdate, db: AsyncSession = Depends(get_db), current_user: UserModel = Depends(get_current_active_admin)):
+    """
+    Modifie les droits administrateur ou l'activation d'un utilisateur.
+
+    Les jetons émis auparavant pour cet utilisateur sont révoqués.
+    Uniquement accessible aux administrateurs.
+    """
+
+    user = await db.scalar(select(UserModel).where(UserModel.id == user_id))
+    if user is None:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="User not found")
+
+    return await set_user_status(db, user, is_admin=user_status.is_admin, is_active=user_status.is_active)
+
+@router.post("/users/bulk", response_model=UserBulkCreateReport)
+async def create_users(request: UserBulkCreate, db: AsyncSession = Depends(get_db), current_user: UserModel = Depends(get_current_active_admin)):
+    """
+    Crée des utilisateurs en masse ; les mots de passe sont hachés en parallèle.
+
+    Les noms déjà pris ou répétés dans la requête sont rejetés individuellement.
+    Uniquement accessible aux administrateurs.
+    """
+
+    errors = []
+    accepted = {}
+    for user in request.users:
+        if user.username in accepted:
+            errors.append({"username": user.username, "detail": "Duplicate username in request"})
+        else:
+            accepted[user.username] = user
+    for batch in chunked(list(accepted)):
+        for username in await db.scalars(select(UserModel.username).where(UserModel.username.in_(batch))):
+            del accepted[username]
+            errors.append({"username": username, "detail": "Username already registered"})
+
+    users = list(accepted.values())
+    hashes = await password_hasher.hash_many(user.password for user in users)
+    created = [UserModel(username=user.username, hashed_password=hashed) for user, hashed in zip(users, hashes)]
+    db.add_all(created)
+    await db.commit()
+    return {"created": created, "errors": errors}
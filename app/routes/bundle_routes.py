@@ -0,0 +1,85 @@
+# app/routes/bundle_routes.py
+from fastapi import APIRouter, Depends, HTTPException, Path, Request, Response, status
+from fastapi.concurrency import run_in_threadpool
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.bundles import FORMATS, Bundle, bundle_store
+from app.config import settings
+from app.database import get_db
+from app.dependencies import get_current_active_user
+from app.etag import etag_matches, not_modified
+from app.models import Category, User
+from app.schemas import BundleManifest
+
+router = APIRouter()
+
+
+def _manifest(request: Request, bundle: Bundle) -> dict:
+    urls = {
+        fmt: str(request.url_for("read_bundle", user_id=bundle.owner_id, digest=bundle.digest, fmt=fmt))
+        for fmt in FORMATS
+    }
+    return dict(bundle._asdict(), urls=urls)
+
+
+# POST /users/{user_id}
+@router.post("/users/{user_id}", response_model=BundleManifest)
+async def publish_user_bundle(user_id: int, request: Request, db: AsyncSession = Depends(get_db), current_user: User = Depends(get_current_active_user)):
+    """
+    Publie les variables résolues d'un utilisateur en un bundle immuable.
+
+    Seules les variables modifiées depuis la publication précédente (ou dont
+    une dépendance a changé) sont résolues ; sans changement, l'empreinte est
+    la même.
+    """
+    if not current_user.is_admin and user_id != current_user.id:
+        raise HTTPException(status_code=status.HTTP_403_FORBIDDEN, detail="Not authorized to publish this bundle")
+    if await db.scalar(select(User.id).where(User.id == user_id)) is None:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="User not found")
+    return _manifest(request, await bundle_store.publish(db, user_id))
+
+
+# POST /categories/{category_id}
+@router.post("/categories/{category_id}", response_model=BundleManifest)
+async def publish_category_bundle(category_id: int, request: Request, db: AsyncSession = Depends(get_db), current_user: User = Depends(get_current_active_user)):
+    """
+    Publie les variables résolues d'une catégorie en un bundle immuable.
+
+    Les références vers des variables d'autres catégories du même
+    propriétaire sont résolues normalement.
+    """
+    category = await db.scalar(select(Category).where(Category.id == category_id))
+    if category is None:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Category not found")
+    if not current_user.is_admin and category.owner_id != current_user.id:
+        raise HTTPException(status_code=status.HTTP_403_FORBIDDEN, detail="Not authorized to publish this bundle")
+    return _manifest(request, await bundle_store.publish(db, category.owner_id, category_id))
+
+
+# GET /users/{user_id}/{digest}.{fmt}
+@router.get("/users/{user_id}/{digest}.{fmt}", response_class=Response)
+async def read_bundle(
+    user_id: int,
+    request: Request,
+    digest: str = Path(..., pattern="^[0-9a-f]{64}$"),
+    fmt: str = Path(..., description="json ou msgpack"),
+    current_user: User = Depends(get_current_active_user),
+):
+    """
+    Bundle publié : contenu immuable, mis en cache sans revalidation par le client.
+    """
+    if not current_user.is_admin and user_id != current_user.id:
+        raise HTTPException(status_code=status.HTTP_403_FORBIDDEN, detail="Not authorized to access this bundle")
+    if fmt not in FORMATS:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Unknown bundle format")
+    etag = f'"{digest}.{fmt}"'
+    headers = {"ETag": etag, "Cache-Control": f"private, max-age={settings.BUNDLE_MAX_AGE}, immutable"}
+    if etag_matches(request, etag):
+        response = not_modified(etag)
+        response.headers.update(headers)
+        return response
+    content = await run_in_threadpool(bundle_store.get, user_id, digest, fmt)
+    if content is None:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Bundle not found")
+    return Response(content, media_type=FORMATS[fmt], headers=headers)
@@ -1,87 +1,133 @@
 #category_routes.py
-from typing import List
-from fastapi import APIRouter, Depends, HTTPException, status, Query
-from sqlalchemy.orm import Session
+from typing import List, Optional
+from fastapi import APIRouter, Depends, HTTPException, status, Query, Request, Response
+from fastapi.responses import StreamingResponse
+from sqlalchemy import func, select
+from sqlalchemy.ext.asyncio import AsyncSession
 
 from app.dependencies import get_current_active_user, get_current_active_admin
-from app.database import get_db
-from app.models import Category as CategoryModel, User as UserModel
+from app import bulk
+from app.database import SessionLocal, get_db
+from app.models import Category as CategoryModel, User as UserModel, Variable as VariableModel
+from app.etag import categories_etag, compute_etag, etag_matches, not_modified
+from app.config import settings
+from app.jobs import run_or_submit
+from app.fieldsets import Fieldset, category_fieldset, category_options, fieldset_categories
+from app.serialization import fast_categories, select_category_rows
+from app.pagination import EXPORT_BATCH_SIZE, MAX_PAGE_SIZE, NEXT_CURSOR_HEADER, dump_ndjson, paginate
 from app.schemas import Category, CategoryCreate, Variable, CategoryUpdate
 
 router = APIRouter()
 
 # Créer une catégorie (POST)
 @router.post("/", response_model=Category)
-def create_category(category: CategoryCreate, db: Session = Depends(get_db), current_user: UserModel = Depends(get_current_active_user)):
+async def create_category(category: CategoryCreate, db: AsyncSession = Depends(get_db), current_user: UserModel = Depends(get_current_active_user)):
     db_category = CategoryModel(**category.dict(), owner_id=current_user.id)
     db.add(db_category)
-    db.commit()
-    db.refresh(db_category)
+    await db.commit()
+    await db.refresh(db_category)
     return db_category
 
 # Obtenir toutes les catégories (GET)
 @router.get("/", response_model=List[Category])
-def read_categories(skip: int = 0, limit: int = 100, db: Session = Depends(get_db), current_user: UserModel = Depends(get_current_active_user)):
-    if current_user.is_admin:
-        categories = db.query(CategoryModel).offset(skip).limit(limit).all()
-    else:
-        categories = db.query(CategoryModel).filter(CategoryModel.owner_id == current_user.id).offset(skip).limit(limit).all()
+async def read_categories(request: Request, response: Response, skip: int = Query(0, ge=0), limit: int = Query(100, ge=1, le=MAX_PAGE_SIZE), after: Optional[str] = Query(None, description="Curseur de la page suivante (en-tête X-Next-Cursor)"), fieldset: Fieldset = Depends(category_fieldset), db: AsyncSession = Depends(get_db), current_user: UserModel = Depends(get_current_active_user)):
+    criteria = [] if current_user.is_admin else [CategoryModel.owner_id == current_user.id]
+    if fieldset.default and settings.FAST_SERIALIZATION:
+        return await fast_categories(db, request, response, select_category_rows().where(*criteria), after, limit, skip)
+    statement = select(CategoryModel).options(*category_options(fieldset)).where(*criteria)
+    categories = await paginate(db, statement, CategoryModel, response, after=after, limit=limit, skip=skip)
+    if not fieldset.default:
+        return fieldset_categories(request, response, categories, fieldset)
+    etag = categories_etag(categories, response.headers.get(NEXT_CURSOR_HEADER))
+    if etag_matches(request, etag):
+        return not_modified(etag)
+    response.headers["ETag"] = etag
     return categories
 
+def _export_categories(owner_id: Optional[int]):
+    db = SessionLocal()
+    try:
+        statement = select(CategoryModel.id, CategoryModel.name, CategoryModel.owner_id).order_by(CategoryModel.owner_id, CategoryModel.id)
+        if owner_id is not None:
+            statement = statement.where(CategoryModel.owner_id == owner_id)
+        for rows in db.execute(statement.execution_options(yield_per=EXPORT_BATCH_SIZE)).partitions():
+            yield dump_ndjson(row._asdict() for row in rows)
+    finally:
+        db.close()
+
+# Exporter les catégories en NDJSON (GET)
+@router.get("/export", response_class=StreamingResponse)
+def export_categories(user_id: Optional[int] = Query(None, description="Propriétaire à exporter (administrateurs : tous par défaut)"), current_user: UserModel = Depends(get_current_active_user)):
+    if user_id is not None and not current_user.is_admin and user_id != current_user.id:
+        raise HTTPException(status_code=403, detail="Not authorized to export these categories")
+    owner_id = user_id if user_id is not None or current_user.is_admin else current_user.id
+    return StreamingResponse(_export_categories(owner_id), media_type="application/x-ndjson")
+
 # Obtenir une catégorie par ID (GET)
 @router.get("/{category_id}", response_model=Category)
-def read_category(category_id: int, db: Session = Depends(get_db), current_user: UserModel = Depends(get_current_active_user)):
-    category = db.query(CategoryModel).filter(CategoryModel.id == category_id).first()
+async def read_category(category_id: int, request: Request, response: Response, db: AsyncSession = Depends(get_db), current_user: UserModel = Depends(get_current_active_user)):
+    category = await db.scalar(select(CategoryModel).where(CategoryModel.id == category_id))
     if category is None:
         raise HTTPException(status_code=404, detail="Category not found")
     if not current_user.is_admin and category.owner_id != current_user.id:
         raise HTTPException(status_code=403, detail="Not authorized to access this category")
+    etag = compute_etag("category", category.id, category.name, category.owner_id)
+    if etag_matches(request, etag):
+        return not_modified(etag)
+    response.headers["ETag"] = etag
     return category
 
 # Mettre à jour une catégorie (PUT)
 @router.put("/{category_id}", response_model=Category)
-def update_category(category_id: int, category: CategoryUpdate, db: Session = Depends(get_db), current_user: UserModel = Depends(get_current_active_user)):
-    db_category = db.query(CategoryModel).filter(CategoryModel.id == category_id).first()
+async def update_category(category_id: int, category: CategoryUpdate, db: AsyncSession = Depends(get_db), current_user: UserModel = Depends(get_current_active_user)):
+    db_category = await db.scalar(select(CategoryModel).where(CategoryModel.id == category_id))
     if db_category is None:
         raise HTTPException(status_code=404, detail="Category not found")
     if not current_user.is_admin and db_category.owner_id != current_user.id:
         raise HTTPException(status_code=403, detail="Not authorized to update this category")
     for attr, value in category.dict(exclude_unset=True).items():
         setattr(db_category, attr, value)
-    db.commit()
-    db.refresh(db_category)
+    await db.commit()
+    await db.refresh(db_category)
     return db_category
 
 # Supprimer une catégorie (DELETE)
 @router.delete("/categories/{category_id}")
-def delete_category(
+async def delete_category(
     category_id: int, 
+    request: Request,
     action: str = Query(..., description="Action to take: 'delete' or 'reassign'"),
     new_category_id: int = Query(None, description="New category ID for reassignment (required if action is 'reassign')"),
-    db: Session = Depends(get_db)  # Changement ici
+    background: Optional[bool] = Query(None, description="Tâche de fond (202 + état sur /jobs/{id}) ; par défaut au-delà de BULK_BACKGROUND_THRESHOLD variables"),
+    db: AsyncSession = Depends(get_db),
+    current_user: UserModel = Depends(get_current_active_user)
 ):
-    category = db.query(Category).filter(Category.id == category_id).first()
+    category = await db.scalar(select(CategoryModel).where(CategoryModel.id == category_id))
     if not category:
         raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Category not found")
+    if not current_user.is_admin and category.owner_id != current_user.id:
+        raise HTTPException(status_code=status.HTTP_403_FORBIDDEN, detail="Not authorized to delete this category")
 
+    total = await db.scalar(select(func.count()).select_from(VariableModel).where(VariableModel.category_id == category_id))
+    chunk_size = settings.BULK_CHUNK_SIZE
     if action == "delete":
-        # Suppression en cascade (gérée automatiquement par SQLAlchemy grâce à la relation définie)
-        db.delete(category)
-        db.commit()
-        return {"message": "Category and associated variables deleted"}
+        # Équivalent ensembliste de la cascade ORM : DELETE par lots, sans charger les variables
+        job = await run_or_submit(request, "delete_category", current_user.id, total, lambda session: bulk.delete_category(session, category_id, chunk_size), background)
+        return job or {"message": "Category and associated variables deleted"}
     elif action == "reassign":
         if new_category_id is None:
             raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="New category ID is required for reassignment")
-        new_category = db.query(Category).filter(Category.id == new_category_id).first()
+        if new_category_id == category_id:
+            raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="New category must differ from the deleted category")
+        new_category = await db.scalar(select(CategoryModel).where(CategoryModel.id == new_category_id))
         if not new_category:
             raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="New category not found")
+        if not current_user.is_admin and new_category.owner_id != current_user.id:
+            raise HTTPException(status_code=status.HTTP_403_FORBIDDEN, detail="Not authorized to reassign to this category")
 
-        variables = db.query(Variable).filter(Variable.category_id == category_id).all()
-        for variable in variables:
-            variable.category_id = new_category_id
-        db.delete(category)  # Supprimer l'ancienne catégorie
-        db.commit()
-        return {"message": "Category deleted and variables reassigned to new category"}
+        # UPDATE ... WHERE category_id par lots, puis suppression de la catégorie vide
+        job = await run_or_submit(request, "reassign_category", current_user.id, total, lambda session: bulk.move_category(session, category_id, new_category_id, chunk_size), background)
+        return job or {"message": "Category deleted and variables reassigned to new category"}
     else:
         raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="Invalid action. Choose 'delete' or 'reassign'")
 
@@ -89,12 +135,22 @@ def delete_category(
 
 # Obtenir toutes les catégories d'un utilisateur (GET)
 @router.get("/users/{user_id}/categories/", response_model=List[Category])
-def read_user_categories(user_id: int, db: Session = Depends(get_db), current_user: UserModel = Depends(get_current_active_admin)):
-    categories = db.query(CategoryModel).filter(CategoryModel.owner_id == user_id).all()
+async def read_user_categories(user_id: int, request: Request, response: Response, limit: int = Query(100, ge=1, le=MAX_PAGE_SIZE), after: Optional[str] = Query(None, description="Curseur de la page suivante (en-tête X-Next-Cursor)"), fieldset: Fieldset = Depends(category_fieldset), db: AsyncSession = Depends(get_db), current_user: UserModel = Depends(get_current_active_admin)):
+    if fieldset.default and settings.FAST_SERIALIZATION:
+        return await fast_categories(db, request, response, select_category_rows().where(CategoryModel.owner_id == user_id), after, limit)
+    statement = select(CategoryModel).options(*category_options(fieldset)).where(CategoryModel.owner_id == user_id)
+    categories = await paginate(db, statement, CategoryModel, response, after=after, limit=limit)
+    if not fieldset.default:
+        return fieldset_categories(request, response, categories, fieldset)
+    etag = categories_etag(categories, response.headers.get(NEXT_CURSOR_HEADER))
+    if etag_matches(request, etag):
+        return not_modified(etag)
+    response.headers["ETag"] = etag
     return categories
 
 # Supprimer toutes les catégories d'un utilisateur (DELETE)
 @router.delete("/users/{user_id}/categories/", status_code=204)
-def delete_all_user_categories(user_id: int, db: Session = Depends(get_db), current_user: UserModel = Depends(get_current_active_admin)):
-    db.query(CategoryModel).filter(CategoryModel.owner_id == user_id).delete()
-    db.commit()
+async def delete_all_user_categories(user_id: int, request: Request, background: Optional[bool] = Query(None, description="Tâche de fond (202 + état sur /jobs/{id}) ; par défaut au-delà de BULK_BACKGROUND_THRESHOLD variables"), db: AsyncSession = Depends(get_db), current_user: UserModel = Depends(get_current_active_admin)):
+    total = await db.scalar(select(func.count()).select_from(VariableModel).join(CategoryModel, VariableModel.category_id == CategoryModel.id).where(CategoryModel.owner_id == user_id))
+    chunk_size = settings.BULK_CHUNK_SIZE
+    return await run_or_submit(request, "delete_user_categories", current_user.id, total, lambda session: bulk.delete_owner_categories(session, user_id, chunk_size), background)
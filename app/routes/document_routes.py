@@ -0,0 +1,103 @@
+# app/routes/document_routes.py
+import json
+import tempfile
+from typing import Dict, List
+
+from fastapi import APIRouter, Depends, File, HTTPException, UploadFile, status
+from fastapi.concurrency import run_in_threadpool
+from fastapi.responses import StreamingResponse
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.config import settings
+from app.database import get_db
+from app.dependencies import get_current_active_user
+from app.documents import CompiledDocxTemplate, render_batch
+from app.models import User
+from app.utils import VariableResolver
+
+router = APIRouter()
+
+
+def _read_rows(data: bytes) -> List[Dict]:
+    """
+    Lit les lignes de données : un tableau JSON ou un objet JSON par ligne (NDJSON).
+    """
+    text = data.decode("utf-8-sig").strip()
+    if text.startswith("["):
+        rows = json.loads(text)
+    else:
+        rows = [json.loads(line) for line in text.splitlines() if line.strip()]
+    if not all(isinstance(row, dict) for row in rows):
+        raise ValueError("each row must be a JSON object")
+    return rows
+
+
+# POST /render
+@router.post("/render", response_class=StreamingResponse)
+async def render_documents(
+    template: UploadFile = File(..., description="Modèle .docx (syntaxe Jinja de docxtpl)"),
+    rows: UploadFile = File(..., description="Lignes de données : tableau JSON ou NDJSON"),
+    db: AsyncSession = Depends(get_db),
+    current_user: User = Depends(get_current_active_user)
+):
+    """
+    Génère un document Word par ligne de données et renvoie une archive zip.
+
+    Les variables résolues de l'utilisateur utilisées par le modèle sont
+    injectées dans chaque contexte ; les valeurs de la ligne sont prioritaires.
+    La clé optionnelle "_filename" nomme le document produit.
+    """
+    # Import différé : Jinja ne pèse pas sur le démarrage à froid
+    from jinja2 import TemplateError
+
+    template_bytes = await template.read()
+    try:
+        data = _read_rows(await rows.read())
+    except ValueError as e:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=f"Invalid rows file: {e}")
+    if len(data) > settings.DOCX_MAX_ROWS:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=f"Too many rows (maximum {settings.DOCX_MAX_ROWS})")
+
+    try:
+        compiled = await run_in_threadpool(CompiledDocxTemplate, template_bytes)
+    except TemplateError as e:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=f"Invalid template syntax: {e}")
+    except Exception:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="Invalid .docx template")
+
+    # Seules les variables référencées par le modèle sont résolues
+    resolved = await db.run_sync(lambda session: VariableResolver(session).resolve_identifiers(current_user.id, compiled.variables))
+    base_context = {identifier: value for identifier, value in resolved.items() if value is not None}
+
+    output = tempfile.SpooledTemporaryFile(max_size=settings.DOCX_SPOOL_MAX_SIZE)
+    try:
+        await run_in_threadpool(
+            render_batch,
+            template_bytes,
+            base_context,
+            data,
+            output,
+            workers=settings.DOCX_WORKERS,
+            batch_size=settings.DOCX_BATCH_SIZE,
+            max_tasks_per_child=settings.DOCX_MAX_TASKS_PER_CHILD,
+        )
+    except TemplateError as e:
+        output.close()
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=f"Template rendering failed: {e}")
+    output.seek(0)
+
+    def content():
+        try:
+            while True:
+                chunk = output.read(64 * 1024)
+                if not chunk:
+                    break
+                yield chunk
+        finally:
+            output.close()
+
+    return StreamingResponse(
+        content(),
+        media_type="application/zip",
+        headers={"Content-Disposition": 'attachment; filename="documents.zip"'},
+    )
\ No newline at end of file
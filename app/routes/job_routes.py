@@ -0,0 +1,25 @@
+# app/routes/job_routes.py
+from fastapi import APIRouter, Depends, HTTPException, status
+
+from app.dependencies import get_current_active_user
+from app.jobs import jobs
+from app.models import User
+from app.schemas import JobStatus
+
+router = APIRouter()
+
+
+# GET /{job_id}
+@router.get("/{job_id}", response_model=JobStatus)
+async def read_job(job_id: str, current_user: User = Depends(get_current_active_user)):
+    """
+    État et progression d'une opération de masse lancée en tâche de fond.
+
+    Visible de l'utilisateur qui l'a lancée et des administrateurs.
+    """
+    job = await jobs.get(job_id)
+    if job is None:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Job not found")
+    if not current_user.is_admin and job.user_id != current_user.id:
+        raise HTTPException(status_code=status.HTTP_403_FORBIDDEN, detail="Not authorized to access this job")
+    return job
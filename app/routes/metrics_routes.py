@@ -0,0 +1,12 @@
+# app/routes/metrics_routes.py
+from fastapi import APIRouter, Response
+
+from app.metrics import CONTENT_TYPE, registry
+
+router = APIRouter()
+
+
+# GET /metrics (format texte Prometheus)
+@router.get("/metrics", include_in_schema=False)
+def read_metrics() -> Response:
+    return Response(registry.render(), media_type=CONTENT_TYPE)
@@ -1,51 +1,265 @@
 #variable_routes.py
-from fastapi import APIRouter, Depends, HTTPException, status
-from sqlalchemy.orm import Session
-from typing import List
+import asyncio
+import codecs
+import csv
+import logging
+from fastapi import APIRouter, Depends, File, HTTPException, Query, Request, Response, UploadFile, WebSocket, status
+from fastapi.concurrency import run_in_threadpool
+from fastapi.responses import StreamingResponse
+from sqlalchemy import func, select
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import selectinload
+from typing import Dict, FrozenSet, List, Optional
 from datetime import datetime
 
-from app.schemas import Variable, VariableCreate, VariableUpdate
+from app.schemas import ChangeFeed, Variable, VariableCreate, VariableUpdate, VariableResolveRequest, VariableResolveResult, VariableResolveResponse, VariableImportReport
 from app.models import Variable as VariableModel, User
+from app import bulk
+from app.auth import Principal, get_current_user
+from app.changes import change_hub, current_cursor, read_changes
 from app.dependencies import get_current_active_user, get_current_active_admin
-from app.database import get_db
-from app.utils import resolve_nested_variables
+from app.database import SessionLocal, get_db
+from app.cache import resolved_cache
+from app.config import settings
+from app.etag import compute_etag, etag_matches, not_modified, variable_stamps
+from app.fieldsets import Fieldset, expansion_stamps, fieldset_response, variable_dict, variable_fieldset, variable_options
+from app.jobs import run_or_submit
+from app.importer import FORMATS, VariableImporter, detect_format
+from app.pagination import EXPORT_BATCH_SIZE, MAX_PAGE_SIZE, NEXT_CURSOR_HEADER, dump_ndjson, paginate
+from app.render import DuplexStreamingResponse, render_stream
+from app.search import search_statement, search_terms
+from app.serialization import json_response, load_parent_rows, select_variable_rows, variable_records
+from app.utils import VariableResolver, chunked, resolve_cached, resolve_dependencies
+
+logger = logging.getLogger(__name__)
 
 router = APIRouter()
 
+
+def select_variables():
+    # Chaîne des parents chargée d'avance : aucun chargement paresseux lors de la sérialisation
+    return select(VariableModel).options(selectinload(VariableModel.parent_variable, recursion_depth=-1))
+
+
+async def get_variable(db: AsyncSession, *criteria, reload: bool = False) -> Optional[VariableModel]:
+    statement = select_variables().where(*criteria)
+    if reload:
+        statement = statement.execution_options(populate_existing=True)
+    return (await db.scalars(statement)).first()
+
+
+async def fieldset_variables(db: AsyncSession, request: Request, response: Response, kind: str, variables: List[VariableModel], fieldset: Fieldset, many: bool = True) -> Response:
+    """
+    Réponse expand=/fields= : colonnes et relations demandées, sans résolution
+    (la représentation par défaut renvoie elle aussi la valeur brute).
+    """
+    parents = "parent_variable" in fieldset.expand
+    etag = compute_etag(kind, response.headers.get(NEXT_CURSOR_HEADER), await variable_stamps(db, variables, {}, parents=parents), expansion_stamps(variables, fieldset), *fieldset.etag_parts)
+    if etag_matches(request, etag):
+        return not_modified(etag)
+    response.headers["ETag"] = etag
+    content = [variable_dict(variable, fieldset) for variable in variables]
+    return fieldset_response(content if many else content[0], response)
+
+
+async def fast_variables(db: AsyncSession, request: Request, response: Response, kind: str, statement, after: Optional[str], limit: int, skip: int = 0, resolve: bool = True) -> Response:
+    """
+    Chemin rapide (FAST_SERIALIZATION) : lignes de colonnes plutôt qu'objets
+    ORM, dictionnaires construits directement et encodés par orjson. Corps
+    et ETag identiques à ceux du response_model.
+    """
+    rows = await paginate(db, statement, VariableModel, response, after=after, limit=limit, skip=skip, rows=True)
+    dependencies: Dict[int, FrozenSet[str]] = {}
+    if resolve:
+        dependencies = await resolve_dependencies(db, rows)
+    parents = await load_parent_rows(db, rows)
+    etag = compute_etag(kind, response.headers.get(NEXT_CURSOR_HEADER), await variable_stamps(db, rows, dependencies, parents=True, parent_rows=parents))
+    if etag_matches(request, etag):
+        return not_modified(etag)
+    if resolve:
+        # La valeur résolue n'est pas dans le corps, mais ses erreurs comptent
+        await resolve_cached(db, rows)
+    response.headers["ETag"] = etag
+    return json_response(variable_records(rows, parents), response)
+
 # GET /variables/
 @router.get("/variables/", response_model=List[Variable])
 async def read_variables(
-    skip: int = 0,
-    limit: int = 100,
-    db: Session = Depends(get_db),
+    request: Request,
+    response: Response,
+    skip: int = Query(0, ge=0),
+    limit: int = Query(100, ge=1, le=MAX_PAGE_SIZE),
+    after: Optional[str] = Query(None, description="Curseur de la page suivante (en-tête X-Next-Cursor)"),
+    fieldset: Fieldset = Depends(variable_fieldset),
+    db: AsyncSession = Depends(get_db),
     current_user: User = Depends(get_current_active_user),  
 ):
-    if current_user.is_admin:
-        variables = db.query(VariableModel).offset(skip).limit(limit).all()
-    else:
-        variables = db.query(VariableModel).filter(VariableModel.owner_id == current_user.id).offset(skip).limit(limit).all()
+    criteria = [] if current_user.is_admin else [VariableModel.owner_id == current_user.id]
+    if fieldset.default and settings.FAST_SERIALIZATION:
+        return await fast_variables(db, request, response, "variables", select_variable_rows().where(*criteria), after, limit, skip)
+    statement = select(VariableModel).options(*variable_options(fieldset)).where(*criteria)
+    variables = await paginate(db, statement, VariableModel, response, after=after, limit=limit, skip=skip)
+    if not fieldset.default:
+        return await fieldset_variables(db, request, response, "variables", variables, fieldset)
 
-    # Résolution des variables imbriquées pour chaque variable
-    for variable in variables:
-        variable.display_value = resolve_nested_variables(variable.value, db)
+    # ETag d'après les dépendances, puis résolution seulement si la réponse est envoyée
+    dependencies = await resolve_dependencies(db, variables)
+    etag = compute_etag("variables", response.headers.get(NEXT_CURSOR_HEADER), await variable_stamps(db, variables, dependencies, parents=True))
+    if etag_matches(request, etag):
+        return not_modified(etag)
+    # Résolution des variables imbriquées pour chaque variable (travail partagé entre les lignes)
+    values = await resolve_cached(db, variables)
+    response.headers["ETag"] = etag
+    for variable, resolved_value in zip(variables, values):
+        variable.display_value = resolved_value
 
     return variables
 
+# GET /variables/search (déclarée avant /variables/{variable_id})
+@router.get("/variables/search", response_model=List[Variable])
+async def search_variables(
+    q: str = Query(..., min_length=1, max_length=200, description="Mots recherchés dans le nom, l'identifiant et la valeur ; le dernier est un préfixe"),
+    skip: int = Query(0, ge=0),
+    limit: int = Query(20, ge=1, le=100),
+    db: AsyncSession = Depends(get_db),
+    current_user: User = Depends(get_current_active_user),
+):
+    """
+    Recherche plein texte classée par pertinence (index FTS5 ou FULLTEXT, sans parcours de table).
+
+    Mêmes règles de propriété que read_variables : un administrateur cherche dans toutes les variables.
+    """
+    terms = search_terms(q)
+    if not terms:
+        return []
+    owner_id = None if current_user.is_admin else current_user.id
+    ids = list(await db.scalars(search_statement(terms, owner_id, limit, skip)))
+    if not ids:
+        return []
+    criteria = [] if current_user.is_admin else [VariableModel.owner_id == current_user.id]
+    by_id = {variable.id: variable for variable in await db.scalars(select_variables().where(VariableModel.id.in_(ids), *criteria))}
+    return [by_id[variable_id] for variable_id in ids if variable_id in by_id]
+
+def changes_owner(current_user: Principal, user_id: Optional[int]) -> Optional[int]:
+    # Mêmes règles que l'export : un administrateur suit tous les propriétaires par défaut
+    if user_id is not None and not current_user.is_admin and user_id != current_user.id:
+        raise HTTPException(status_code=403, detail="Not authorized to follow these changes")
+    return user_id if user_id is not None or current_user.is_admin else current_user.id
+
+# GET /variables/changes (déclarée avant /variables/{variable_id})
+@router.get("/variables/changes", response_model=ChangeFeed)
+async def read_variable_changes(
+    since: Optional[int] = Query(None, ge=0, description="Curseur renvoyé par l'appel précédent ; absent : curseur actuel, sans deltas"),
+    limit: int = Query(500, ge=1, le=settings.CHANGES_PAGE_SIZE, description="Lignes du journal lues par page"),
+    user_id: Optional[int] = Query(None, description="Propriétaire suivi (administrateurs : tous par défaut)"),
+    db: AsyncSession = Depends(get_db),
+    current_user: User = Depends(get_current_active_user),
+):
+    """
+    Modifications des variables et catégories depuis un curseur : état actuel
+    des entités modifiées, suppressions (deleted), et variables dont seule la
+    valeur résolue a changé (une de leurs dépendances a été modifiée).
+
+    Synchronisation : lire le curseur (sans since), télécharger les listes
+    complètes, puis appeler avec since= jusqu'à has_more false. Un curseur
+    purgé du journal renvoie 410 : tout relire.
+    """
+    owner_id = changes_owner(current_user, user_id)
+    if since is None:
+        return json_response({"cursor": await current_cursor(db), "changes": [], "has_more": False})
+    return json_response(await read_changes(db, owner_id, since, limit))
+
+# GET /variables/changes/stream
+@router.get("/variables/changes/stream", response_class=StreamingResponse)
+async def stream_variable_changes(
+    request: Request,
+    since: Optional[int] = Query(None, ge=0, description="Reprise après ce curseur (ou en-tête Last-Event-ID) ; absent : à partir de maintenant"),
+    user_id: Optional[int] = Query(None, description="Propriétaire suivi (administrateurs : tous par défaut)"),
+    current_user: User = Depends(get_current_active_user),
+):
+    """
+    Flux Server-Sent Events des deltas (même contenu que /variables/changes),
+    un événement « changes » par lot, identifié par son curseur.
+    """
+    owner_id = changes_owner(current_user, user_id)
+    if since is None and request.headers.get("last-event-id", "").isdigit():
+        since = int(request.headers["last-event-id"])
+
+    async def events():
+        async for change_event in change_hub.stream(owner_id, since):
+            if change_event is None:
+                yield b": keepalive\n\n"
+            else:
+                yield b"id: %d\nevent: changes\ndata: %s\n\n" % (change_event.cursor, change_event.payload)
+
+    # Pas de mise en tampon par un proxy (nginx) : chaque événement part immédiatement
+    return StreamingResponse(events(), media_type="text/event-stream", headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"})
+
+# WebSocket /variables/changes/ws
+@router.websocket("/variables/changes/ws")
+async def websocket_variable_changes(
+    websocket: WebSocket,
+    since: Optional[int] = Query(None, ge=0),
+    user_id: Optional[int] = Query(None),
+    token: Optional[str] = Query(None, description="Jeton d'accès (les navigateurs n'envoient pas d'en-tête Authorization)"),
+):
+    """
+    Flux WebSocket des deltas : un message texte JSON par lot, comme /variables/changes.
+    """
+    scheme, _, credentials = websocket.headers.get("authorization", "").partition(" ")
+    try:
+        current_user = get_current_active_user(await get_current_user(token or (credentials if scheme.lower() == "bearer" else "")))
+        owner_id = changes_owner(current_user, user_id)
+    except HTTPException:
+        await websocket.close(code=1008)
+        return
+    await websocket.accept()
+
+    async def send():
+        async for change_event in change_hub.stream(owner_id, since):
+            # Connexion maintenue par les ping du serveur WebSocket
+            if change_event is not None:
+                await websocket.send_text(change_event.payload.decode())
+
+    async def receive():
+        while (await websocket.receive())["type"] != "websocket.disconnect":
+            pass
+
+    sender, receiver = asyncio.ensure_future(send()), asyncio.ensure_future(receive())
+    done, pending = await asyncio.wait({sender, receiver}, return_when=asyncio.FIRST_COMPLETED)
+    for task in pending:
+        task.cancel()
+    await asyncio.gather(*pending, return_exceptions=True)
+    if sender in done:
+        # Fin du flux (arrêt de l'application)
+        await websocket.close()
+
 # GET /variables/{variable_id}
 @router.get("/variables/{variable_id}", response_model=Variable)
 async def read_variable(
     variable_id: int, 
-    db: Session = Depends(get_db), 
+    request: Request,
+    response: Response,
+    fieldset: Fieldset = Depends(variable_fieldset),
+    db: AsyncSession = Depends(get_db), 
     current_user: User = Depends(get_current_active_user)
 ):
-    variable = db.query(VariableModel).filter(VariableModel.id == variable_id).first()
+    variable = await db.scalar(select(VariableModel).options(*variable_options(fieldset)).where(VariableModel.id == variable_id))
     if variable is None:
         raise HTTPException(status_code=404, detail="Variable not found")
     if not current_user.is_admin and variable.owner_id != current_user.id: 
         raise HTTPException(status_code=403, detail="Not authorized to access this variable")
+    if not fieldset.default:
+        return await fieldset_variables(db, request, response, "variable", [variable], fieldset, many=False)
 
+    dependencies = await resolve_dependencies(db, [variable])
+    etag = compute_etag("variable", await variable_stamps(db, [variable], dependencies, parents=True))
+    if etag_matches(request, etag):
+        return not_modified(etag)
     # Résolution de la variable imbriquée (si nécessaire)
-    variable.display_value = resolve_nested_variables(variable.value, db)
+    values = await resolve_cached(db, [variable])
+    response.headers["ETag"] = etag
+    variable.display_value = values[0]
 
     return variable
 
@@ -54,63 +268,279 @@ async def read_variable(
 @router.get("/variables/{variable_id}/resolved", response_model=Variable)
 async def read_resolved_variable(
     variable_id: int,
-    db: Session = Depends(get_db),
+    request: Request,
+    response: Response,
+    db: AsyncSession = Depends(get_db),
     current_user: User = Depends(get_current_active_user)
 ):
-    variable = db.query(VariableModel).filter(VariableModel.id == variable_id).first()
+    variable = await db.scalar(select(VariableModel).where(VariableModel.id == variable_id))
     if variable is None:
         raise HTTPException(status_code=404, detail="Variable not found")
     if not current_user.is_admin and variable.owner_id != current_user.id:
         raise HTTPException(status_code=403, detail="Not authorized to access this variable")
 
+    # L'ETag couvre la variable et toutes celles qu'elle référence, directement ou non
+    etag = compute_etag("resolved", await variable_stamps(db, [variable], await resolve_dependencies(db, [variable])))
+    if etag_matches(request, etag):
+        return not_modified(etag)
+
     try:
-        resolved_value = resolve_nested_variables(variable.value, db)
+        values = await resolve_cached(db, [variable])
     except HTTPException as e:
-        raise e  # Relève l'exception de la fonction resolve_nested_variables
+        raise e  # Relève l'exception du résolveur
     except Exception as e:  # Attraper d'autres erreurs potentielles
         raise HTTPException(status_code=500, detail=f"Error resolving variable: {str(e)}") 
+    response.headers["ETag"] = etag
+    resolved_value = values[0]
 
-    return Variable(id=variable.id, name=variable.name, value=variable.value, display_value=resolved_value, category_id=variable.category_id, created_at=variable.created_at, updated_at=variable.updated_at, owner_id=variable.owner_id)
+    return Variable(id=variable.id, name=variable.name, identifier=variable.identifier, value=variable.value, display_value=resolved_value, category_id=variable.category_id, created_at=variable.created_at, updated_at=variable.updated_at, owner_id=variable.owner_id)
 
 
 # GET /variables/by-identifier/{identifier}/resolved
 @router.get("/variables/by-identifier/{identifier}/resolved", response_model=Variable)
 async def read_resolved_variable_by_identifier(
     identifier: str,
-    db: Session = Depends(get_db),
+    request: Request,
+    response: Response,
+    db: AsyncSession = Depends(get_db),
     current_user: User = Depends(get_current_active_user)
 ):
-    variable = db.query(VariableModel).filter(VariableModel.identifier == identifier).first()
+    variable = await db.scalar(select(VariableModel).where(VariableModel.identifier == identifier))
     if variable is None:
         raise HTTPException(status_code=404, detail="Variable not found")
     if not current_user.is_admin and variable.owner_id != current_user.id:
         raise HTTPException(status_code=403, detail="Not authorized to access this variable")
     
+    etag = compute_etag("resolved", await variable_stamps(db, [variable], await resolve_dependencies(db, [variable])))
+    if etag_matches(request, etag):
+        return not_modified(etag)
+
     try:
-        resolved_value = resolve_nested_variables(variable.value, db)
+        values = await resolve_cached(db, [variable])
     except HTTPException as e:
         raise e
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Error resolving variable: {str(e)}")
+    response.headers["ETag"] = etag
+    resolved_value = values[0]
 
     return Variable(id=variable.id, name=variable.name, identifier=variable.identifier, value=variable.value, display_value=resolved_value, category_id=variable.category_id, created_at=variable.created_at, updated_at=variable.updated_at, owner_id=variable.owner_id)
 
+EXPORT_COLUMNS = (
+    VariableModel.id,
+    VariableModel.name,
+    VariableModel.identifier,
+    VariableModel.value,
+    VariableModel.category_id,
+    VariableModel.parent_variable_id,
+    VariableModel.created_at,
+    VariableModel.updated_at,
+    VariableModel.owner_id,
+)
+
+
+def _export_variables(owner_id: Optional[int], resolved: bool):
+    # Sessions propres au flux ; la résolution utilise une seconde connexion,
+    # le curseur serveur occupant la première (MySQL)
+    db = SessionLocal()
+    resolver_db = SessionLocal() if resolved else None
+    try:
+        statement = select(*EXPORT_COLUMNS).order_by(VariableModel.owner_id, VariableModel.id)
+        if owner_id is not None:
+            statement = statement.where(VariableModel.owner_id == owner_id)
+        result = db.execute(statement.execution_options(yield_per=EXPORT_BATCH_SIZE))
+        for rows in result.partitions():
+            records = [row._asdict() for row in rows]
+            if resolved:
+                # Un résolveur par lot : la mémoire reste constante
+                resolver = VariableResolver(resolver_db)
+                resolver.prime(rows)
+                for row, record in zip(rows, records):
+                    try:
+                        record["resolved_value"] = resolver.resolve_variable(row)
+                    except HTTPException as e:
+                        record["resolved_value"] = None
+                        record["error"] = e.detail
+                resolver.report()
+            yield dump_ndjson(records)
+    finally:
+        db.close()
+        if resolver_db is not None:
+            resolver_db.close()
+
+
+# GET /export
+@router.get("/export", response_class=StreamingResponse)
+async def export_variables(
+    resolved: bool = Query(False, description="Inclure la valeur résolue de chaque variable"),
+    user_id: Optional[int] = Query(None, description="Propriétaire à exporter (administrateurs : tous par défaut)"),
+    current_user: User = Depends(get_current_active_user)
+):
+    """
+    Exporte les variables en NDJSON, lues par lots depuis un curseur serveur.
+    """
+    if user_id is not None and not current_user.is_admin and user_id != current_user.id:
+        raise HTTPException(status_code=403, detail="Not authorized to export these variables")
+    owner_id = user_id if user_id is not None or current_user.is_admin else current_user.id
+    return StreamingResponse(_export_variables(owner_id, resolved), media_type="application/x-ndjson")
+
+# POST /resolve
+@router.post("/resolve", response_model=VariableResolveResponse)
+async def resolve_variables(
+    request: VariableResolveRequest,
+    db: AsyncSession = Depends(get_db),
+    current_user: User = Depends(get_current_active_user)
+):
+    # Chargement de toutes les variables demandées en une passe
+    by_identifier: Dict[str, VariableModel] = {}
+    by_id: Dict[int, VariableModel] = {}
+    for batch in chunked(list(set(request.identifiers))):
+        for variable in await db.scalars(select(VariableModel).where(VariableModel.identifier.in_(batch))):
+            by_identifier[variable.identifier] = variable
+            by_id[variable.id] = variable
+    for batch in chunked([variable_id for variable_id in set(request.ids) if variable_id not in by_id]):
+        for variable in await db.scalars(select(VariableModel).where(VariableModel.id.in_(batch))):
+            by_id[variable.id] = variable
+
+    requested = [("identifier", identifier, by_identifier.get(identifier)) for identifier in request.identifiers]
+    requested += [("id", variable_id, by_id.get(variable_id)) for variable_id in request.ids]
+
+    authorized = {
+        variable.id: variable
+        for _, _, variable in requested
+        if variable is not None and (current_user.is_admin or variable.owner_id == current_user.id)
+    }
+    # Résolution partagée entre tous les éléments ; une erreur n'affecte que l'élément concerné
+    resolved = dict(zip(authorized, await resolve_cached(db, list(authorized.values()), return_exceptions=True)))
+
+    results = []
+    for field, key, variable in requested:
+        if variable is None:
+            results.append(VariableResolveResult(**{field: key}, status_code=404, detail="Variable not found"))
+        elif variable.id not in authorized:
+            results.append(VariableResolveResult(**{field: key}, status_code=403, detail="Not authorized to access this variable"))
+        elif isinstance(resolved[variable.id], HTTPException):
+            error = resolved[variable.id]
+            results.append(VariableResolveResult(**{field: key}, status_code=error.status_code, detail=error.detail))
+        else:
+            results.append(VariableResolveResult(
+                **{field: key},
+                status_code=200,
+                resolved_value=resolved[variable.id],
+                variable=Variable(id=variable.id, name=variable.name, identifier=variable.identifier, value=variable.value, display_value=resolved[variable.id], category_id=variable.category_id, created_at=variable.created_at, updated_at=variable.updated_at, owner_id=variable.owner_id),
+            ))
+    return VariableResolveResponse(results=results)
+
+# POST /render
+@router.post("/render", response_class=DuplexStreamingResponse)
+async def render_document(
+    request: Request,
+    current_user: User = Depends(get_current_active_user)
+):
+    """
+    Remplace les placeholders {{identifiant}} d'un document (texte, Markdown, HTML)
+    par les valeurs résolues des variables de l'utilisateur courant.
+
+    Le corps est lu et renvoyé en flux, sans être chargé entièrement en mémoire.
+    Les placeholders inconnus sont laissés tels quels. Le document est décodé
+    selon le charset de la requête et renvoyé en UTF-8.
+    """
+    content_type = request.headers.get("content-type", "text/plain; charset=utf-8")
+    media_type, *params = content_type.split(";")
+    encoding = "utf-8"
+    for param in params:
+        name, _, value = param.strip().partition("=")
+        if name.lower() == "charset" and value:
+            encoding = value.strip('"')
+    try:
+        codecs.getincrementaldecoder(encoding)
+    except LookupError:
+        raise HTTPException(status_code=400, detail=f"Unsupported charset: '{encoding}'")
+
+    owner_id = current_user.id
+    # Session propre au flux : la réponse survit à la dépendance get_db
+    db = SessionLocal()
+    resolver = VariableResolver(db)
+
+    async def lookup(identifiers):
+        return await run_in_threadpool(resolver.resolve_identifiers, owner_id, identifiers)
+
+    chunks = render_stream(request.stream(), lookup, encoding)
+    # Premier morceau produit avant l'envoi des en-têtes : une erreur à ce stade donne un vrai statut d'erreur
+    try:
+        first = await chunks.__anext__()
+    except StopAsyncIteration:
+        first = None
+    except BaseException:
+        db.close()
+        raise
+
+    async def body():
+        try:
+            if first is not None:
+                yield first
+            async for chunk in chunks:
+                yield chunk
+        except Exception:
+            # En-têtes déjà envoyés : la connexion est interrompue, le client ne reçoit pas un 200 tronqué
+            logger.exception("Rendu du document interrompu en cours de flux")
+            raise
+        finally:
+            db.close()
+
+    return DuplexStreamingResponse(body(), media_type=f"{media_type.strip() or 'text/plain'}; charset=utf-8")
+
+# POST /import
+@router.post("/import", response_model=VariableImportReport)
+async def import_variables(
+    file: UploadFile = File(..., description="Fichier JSON (tableau), NDJSON ou CSV"),
+    format: Optional[str] = Query(None, description="json, ndjson ou csv ; déduit du fichier par défaut"),
+    chunk_size: int = Query(5000, ge=1, le=50000, description="Nombre de lignes écrites par lot"),
+    atomic: bool = Query(True, description="Tout importer dans une seule transaction (sinon un commit par lot)"),
+    current_user: User = Depends(get_current_active_user)
+):
+    """
+    Crée ou met à jour en masse les variables de l'utilisateur courant, par identifiant.
+
+    Champs reconnus : identifier, name, value, category (nom) ou category_id,
+    parent (identifiant) ou parent_variable_id. Les lignes invalides sont
+    rejetées individuellement et décrites dans le rapport.
+    """
+    format = (format or detect_format(file.filename, file.content_type)).lower()
+    if format not in FORMATS:
+        raise HTTPException(status_code=400, detail=f"Unsupported format '{format}'. Choose one of: {', '.join(FORMATS)}")
+
+    # Import volumineux et surtout CPU : session synchrone dédiée, hors de la boucle asynchrone
+    db = SessionLocal()
+    importer = VariableImporter(db, current_user.id, chunk_size=chunk_size, atomic=atomic)
+    try:
+        await run_in_threadpool(importer.run, file.file, format)
+    except (ValueError, csv.Error) as e:
+        raise HTTPException(status_code=400, detail=f"Invalid upload: {e}")
+    finally:
+        await run_in_threadpool(db.close)
+        resolved_cache.invalidate(current_user.id, importer.changed_identifiers)
+        await resolved_cache.flush()
+    return importer.report()
+
 # POST /variables/
 @router.post("/variables/", response_model=Variable)
 async def create_variable(
     variable: VariableCreate, 
-    db: Session = Depends(get_db), 
+    db: AsyncSession = Depends(get_db), 
     current_user: User = Depends(get_current_active_user)
 ):
-    if db.query(VariableModel).filter(VariableModel.identifier == variable.identifier, VariableModel.owner_id == current_user.id).first():
+    if await db.scalar(select(VariableModel.id).where(VariableModel.identifier == variable.identifier, VariableModel.owner_id == current_user.id)):
         raise HTTPException(status_code=400, detail="Variable identifier already exists")
     db_variable = VariableModel(
         **variable.dict(),
         owner_id=current_user.id,
     )
     db.add(db_variable)
-    db.commit()
-    db.refresh(db_variable)
+    await db.commit()
+    db_variable = await get_variable(db, VariableModel.id == db_variable.id, reload=True)
+    resolved_cache.invalidate_variables([db_variable])
+    await resolved_cache.flush()
     return db_variable
 
 # PUT /variables/{variable_id}
@@ -118,10 +548,10 @@ async def create_variable(
 async def update_variable(
     variable_id: int,
     variable: VariableUpdate,
-    db: Session = Depends(get_db),
+    db: AsyncSession = Depends(get_db),
     current_user: User = Depends(get_current_active_user)  
 ):
-    db_variable = db.query(VariableModel).filter(VariableModel.id == variable_id).first()
+    db_variable = await get_variable(db, VariableModel.id == variable_id)
     if db_variable is None:
         raise HTTPException(status_code=404, detail="Variable not found")
     if not current_user.is_admin and db_variable.owner_id != current_user.id:  
@@ -130,25 +560,29 @@ async def update_variable(
     for attr, value in variable.dict(exclude_unset=True).items():
         setattr(db_variable, attr, value)
     db_variable.updated_at = datetime.utcnow()
-    db.commit()
-    db.refresh(db_variable)
+    await db.commit()
+    db_variable = await get_variable(db, VariableModel.id == variable_id, reload=True)
+    resolved_cache.invalidate_variables([db_variable])
+    await resolved_cache.flush()
     return db_variable
 
 # DELETE /variables/{variable_id}
 @router.delete("/variables/{variable_id}", status_code=204)
 async def delete_variable(
     variable_id: int, 
-    db: Session = Depends(get_db), 
+    db: AsyncSession = Depends(get_db), 
     current_user: User = Depends(get_current_active_user)  
 ):
-    db_variable = db.query(VariableModel).filter(VariableModel.id == variable_id).first()
+    db_variable = await db.scalar(select(VariableModel).where(VariableModel.id == variable_id))
     if db_variable is None:
         raise HTTPException(status_code=404, detail="Variable not found")
     if not current_user.is_admin and db_variable.owner_id != current_user.id: 
         raise HTTPException(status_code=403, detail="Not authorized to delete this variable")
     
-    db.delete(db_variable)
-    db.commit()
+    resolved_cache.invalidate_variables([db_variable])
+    await db.delete(db_variable)
+    await db.commit()
+    await resolved_cache.flush()
 
 # Routes supplémentaires pour l'administrateur
 
@@ -156,18 +590,37 @@ async def delete_variable(
 @router.get("/users/{user_id}/variables/", response_model=List[Variable])
 async def read_user_variables(
     user_id: int,
-    db: Session = Depends(get_db),
+    request: Request,
+    response: Response,
+    limit: int = Query(100, ge=1, le=MAX_PAGE_SIZE),
+    after: Optional[str] = Query(None, description="Curseur de la page suivante (en-tête X-Next-Cursor)"),
+    fieldset: Fieldset = Depends(variable_fieldset),
+    db: AsyncSession = Depends(get_db),
     current_user: User = Depends(get_current_active_admin),  # Uniquement pour les admins
 ):
-    variables = db.query(VariableModel).filter(VariableModel.owner_id == user_id).all()
+    if fieldset.default and settings.FAST_SERIALIZATION:
+        return await fast_variables(db, request, response, "user_variables", select_variable_rows().where(VariableModel.owner_id == user_id), after, limit, resolve=False)
+    statement = select(VariableModel).options(*variable_options(fieldset)).where(VariableModel.owner_id == user_id)
+    variables = await paginate(db, statement, VariableModel, response, after=after, limit=limit)
+    if not fieldset.default:
+        return await fieldset_variables(db, request, response, "user_variables", variables, fieldset)
+    etag = compute_etag("user_variables", response.headers.get(NEXT_CURSOR_HEADER), await variable_stamps(db, variables, {}, parents=True))
+    if etag_matches(request, etag):
+        return not_modified(etag)
+    response.headers["ETag"] = etag
     return variables
 
 # DELETE /users/{user_id}/variables/
 @router.delete("/users/{user_id}/variables/", status_code=204)
 async def delete_all_user_variables(
     user_id: int, 
-    db: Session = Depends(get_db), 
+    request: Request,
+    background: Optional[bool] = Query(None, description="Tâche de fond (202 + état sur /jobs/{id}) ; par défaut au-delà de BULK_BACKGROUND_THRESHOLD variables"),
+    db: AsyncSession = Depends(get_db), 
     current_user: User = Depends(get_current_active_admin)  # Uniquement pour les admins
 ):
-    db.query(VariableModel).filter(VariableModel.owner_id == user_id).delete()
-    db.commit()
+    # DELETE par lots validés séparément : le verrou d'écriture n'est tenu que le temps d'un lot
+    total = await db.scalar(select(func.count()).select_from(VariableModel).where(VariableModel.owner_id == user_id))
+    chunk_size = settings.BULK_CHUNK_SIZE
+    criteria = [VariableModel.owner_id == user_id]
+    return await run_or_submit(request, "delete_user_variables", current_user.id, total, lambda session: bulk.delete_variables(session, criteria, chunk_size), background)
@@ -1,9 +1,7 @@
 # schemas.py
 from datetime import datetime
 from pydantic import BaseModel, Field
-from typing import Optional, List
-
-print("Chargement du fichier schemas.py")
+from typing import Dict, Optional, List
 
 class Token(BaseModel):
     access_token: str = Field(..., description="Jeton d'accès pour l'authentification")
@@ -20,10 +18,26 @@ class User(BaseModel):
     id: int = Field(..., description="Identifiant unique de l'utilisateur")
     username: str = Field(..., description="Nom d'utilisateur")
     is_admin: bool = Field(..., description="Indique si l'utilisateur est administrateur")
+    is_active: bool = Field(True, description="Indique si le compte est actif")
 
     class Config:
         from_attributes = True
 
+class UserBulkCreate(BaseModel):
+    users: List[UserCreate] = Field(..., max_length=1000, description="Utilisateurs à créer")
+
+class UserBulkCreateError(BaseModel):
+    username: str = Field(..., description="Nom d'utilisateur rejeté")
+    detail: str = Field(..., description="Motif du rejet")
+
+class UserBulkCreateReport(BaseModel):
+    created: List[User] = Field(..., description="Utilisateurs créés")
+    errors: List[UserBulkCreateError] = Field(..., description="Utilisateurs rejetés")
+
+class UserStatusUpdate(BaseModel):
+    is_admin: Optional[bool] = Field(None, description="Droits administrateur")
+    is_active: Optional[bool] = Field(None, description="Compte actif")
+
 class CategoryBase(BaseModel):
     name: str = Field(..., description="Nom de la catégorie")
 
@@ -70,4 +84,67 @@ class Variable(VariableBase):
         @staticmethod
         def json_schema_extra(schema, model):
             # Supprimer le champ "value" du schéma, car il est maintenant redondant avec "display_value"
-            del schema["properties"]["value"]
\ No newline at end of file
+            del schema["properties"]["value"]
+
+class VariableResolveRequest(BaseModel):
+    identifiers: List[str] = Field(default_factory=list, max_length=1000, description="Identifiants des variables à résoudre")
+    ids: List[int] = Field(default_factory=list, max_length=1000, description="Identifiants uniques des variables à résoudre")
+
+class VariableResolveResult(BaseModel):
+    identifier: Optional[str] = Field(None, description="Identifiant demandé")
+    id: Optional[int] = Field(None, description="Identifiant unique demandé")
+    status_code: int = Field(..., description="Code HTTP équivalent pour cet élément")
+    detail: Optional[str] = Field(None, description="Message d'erreur si la résolution a échoué")
+    resolved_value: Optional[str] = Field(None, description="Valeur avec les variables imbriquées résolues")
+    variable: Optional[Variable] = Field(None, description="Variable résolue")
+
+class VariableResolveResponse(BaseModel):
+    results: List[VariableResolveResult] = Field(..., description="Résultats, dans l'ordre de la requête (identifiants puis ids)")
+
+class VariableImportError(BaseModel):
+    row: int = Field(..., description="Numéro de la ligne dans le fichier (à partir de 1)")
+    identifier: Optional[str] = Field(None, description="Identifiant de la variable concernée")
+    detail: str = Field(..., description="Motif du rejet")
+
+class VariableImportReport(BaseModel):
+    created: int = Field(..., description="Nombre de variables créées")
+    updated: int = Field(..., description="Nombre de variables mises à jour")
+    failed: int = Field(..., description="Nombre de lignes rejetées")
+    errors: List[VariableImportError] = Field(..., description="Détail des lignes rejetées (limité aux 1000 premières)")
+
+class JobStatus(BaseModel):
+    id: str = Field(..., description="Identifiant de la tâche")
+    kind: str = Field(..., description="Opération exécutée")
+    status: str = Field(..., description="pending, running, succeeded ou failed")
+    total: int = Field(..., description="Nombre de variables concernées (estimé au lancement)")
+    done: int = Field(..., description="Nombre de variables déjà traitées")
+    error: Optional[str] = Field(None, description="Message d'erreur si la tâche a échoué")
+    created_at: datetime = Field(..., description="Date de lancement")
+    finished_at: Optional[datetime] = Field(None, description="Date de fin")
+
+    class Config:
+        from_attributes = True
+
+class BundleManifest(BaseModel):
+    digest: str = Field(..., description="Empreinte SHA-256 du bundle JSON")
+    owner_id: int = Field(..., description="Identifiant de l'utilisateur propriétaire")
+    category_id: Optional[int] = Field(None, description="Catégorie publiée (absente : toutes les variables de l'utilisateur)")
+    variables: int = Field(..., description="Nombre de variables résolues")
+    errors: int = Field(..., description="Nombre de variables dont la résolution a échoué")
+    rebuilt: int = Field(..., description="Variables résolues lors de cette publication (0 : bundle inchangé)")
+    urls: Dict[str, str] = Field(..., description="Adresse du bundle immuable, par format")
+
+class ChangeEntry(BaseModel):
+    cursor: int = Field(..., description="Position de la modification dans le journal")
+    entity: str = Field(..., description="variable ou category")
+    id: int = Field(..., description="Identifiant unique de l'entité")
+    deleted: bool = Field(..., description="Entité supprimée (tombstone)")
+    variable: Optional[Variable] = Field(None, description="État actuel de la variable")
+    category: Optional[Category] = Field(None, description="État actuel de la catégorie")
+    resolved_value: Optional[str] = Field(None, description="Valeur résolue actuelle de la variable")
+    detail: Optional[str] = Field(None, description="Message d'erreur si la résolution a échoué")
+
+class ChangeFeed(BaseModel):
+    cursor: int = Field(..., description="Curseur à passer en since= pour la suite")
+    changes: List[ChangeEntry] = Field(..., description="Deltas, dans l'ordre du journal ; une entrée par entité")
+    has_more: bool = Field(..., description="D'autres modifications suivent : rappeler avec le nouveau curseur")
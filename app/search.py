@@ -0,0 +1,70 @@
+# app/search.py
+import re
+from typing import List, Optional
+
+from fastapi import HTTPException, status
+from sqlalchemy import Select, literal_column, select, text
+from sqlalchemy.engine import make_url
+
+from app.config import settings
+from app.models import Variable
+
+# Mots de la requête ; la ponctuation (accolades des références, tirets...) sépare les mots
+TERM_PATTERN = re.compile(r"\w+")
+MAX_TERMS = 16
+
+
+def search_terms(query: str) -> List[str]:
+    return TERM_PATTERN.findall(query)[:MAX_TERMS]
+
+
+def fts5_query(terms: List[str], owner_id: Optional[int]) -> str:
+    """
+    Expression MATCH FTS5 : tous les mots, le dernier en préfixe (autocomplétion).
+
+    Chaque mot est une chaîne entre guillemets (aucun opérateur FTS5 ne
+    passe) ; « user_na » devient la phrase « user na* ». Le propriétaire est
+    un jeton de la colonne owner_id : le filtre est résolu par l'index.
+    """
+    phrases = [f'"{term}"' for term in terms]
+    phrases[-1] += "*"
+    expression = "{name identifier value} : (" + " AND ".join(phrases) + ")"
+    if owner_id is not None:
+        expression = f'owner_id : "{int(owner_id)}" AND {expression}'
+    return expression
+
+
+def mysql_query(terms: List[str]) -> str:
+    """
+    Requête FULLTEXT en mode booléen : tous les mots requis, le dernier en préfixe.
+    """
+    return " ".join([f'+"{term}"' for term in terms[:-1]] + [f"+{terms[-1]}*"])
+
+
+def search_statement(terms: List[str], owner_id: Optional[int], limit: int, skip: int = 0) -> Select:
+    """
+    Identifiants des variables correspondantes, du plus pertinent au moins pertinent.
+
+    owner_id None : toutes les variables (administrateurs). Sans index plein
+    texte pour le dialecte (ni SQLite ni MySQL) : 501.
+    """
+    backend = make_url(settings.DATABASE_URL).get_backend_name()
+    if backend == "sqlite":
+        # rank : bm25 pondéré configuré par la migration 0004, trié par FTS5 lui-même
+        return (
+            select(literal_column("rowid").label("id"))
+            .select_from(text("variables_fts"))
+            .where(text("variables_fts MATCH :query").bindparams(query=fts5_query(terms, owner_id)))
+            .order_by(literal_column("rank"))
+            .limit(limit)
+            .offset(skip)
+        )
+    if backend == "mysql":
+        from sqlalchemy.dialects.mysql import match
+
+        relevance = match(Variable.name, Variable.identifier, Variable.value, against=mysql_query(terms)).in_boolean_mode()
+        statement = select(Variable.id).where(relevance)
+        if owner_id is not None:
+            statement = statement.where(Variable.owner_id == owner_id)
+        return statement.order_by(relevance.desc(), Variable.id).limit(limit).offset(skip)
+    raise HTTPException(status_code=status.HTTP_501_NOT_IMPLEMENTED, detail=f"Full-text search is not available for '{backend}'")
@@ -0,0 +1,113 @@
+# app/serialization.py
+from typing import Any, Dict, Iterable, List, Optional
+
+from fastapi import Request, Response
+from fastapi.responses import ORJSONResponse
+from sqlalchemy import select
+
+from app.etag import categories_etag, etag_matches, not_modified
+from app.models import Category, Variable
+from app.pagination import NEXT_CURSOR_HEADER, paginate
+from app.utils import chunked
+
+# Colonnes lues par le chemin rapide, dans l'ordre de sérialisation des schémas
+VARIABLE_COLUMNS = (
+    Variable.name,
+    Variable.identifier,
+    Variable.value,
+    Variable.category_id,
+    Variable.parent_variable_id,
+    Variable.id,
+    Variable.created_at,
+    Variable.updated_at,
+    Variable.owner_id,
+)
+CATEGORY_COLUMNS = (Category.name, Category.id, Category.owner_id)
+
+
+def select_variable_rows():
+    return select(*VARIABLE_COLUMNS)
+
+
+def select_category_rows():
+    return select(*CATEGORY_COLUMNS)
+
+
+async def load_parent_rows(db, rows: Iterable) -> Dict[int, Any]:
+    """
+    Lignes des parents (transitifs) de `rows`, par id : une requête IN par niveau de la chaîne.
+    """
+    loaded: Dict[int, Any] = {row.id: row for row in rows}
+    wanted = {row.parent_variable_id for row in loaded.values() if row.parent_variable_id is not None}
+    parents: Dict[int, Any] = {}
+    while wanted:
+        missing = sorted(wanted.difference(loaded))
+        for batch in chunked(missing):
+            for row in (await db.execute(select_variable_rows().where(Variable.id.in_(batch)))).all():
+                loaded[row.id] = row
+        parents.update((variable_id, loaded[variable_id]) for variable_id in wanted if variable_id in loaded)
+        wanted = {
+            parents[variable_id].parent_variable_id
+            for variable_id in wanted
+            if variable_id in parents and parents[variable_id].parent_variable_id is not None
+        }.difference(parents)
+    return parents
+
+
+def variable_records(rows: Iterable, parents: Dict[int, Any]) -> List[Dict[str, Any]]:
+    """
+    Dictionnaires identiques à la sérialisation de schemas.Variable.
+
+    La clé "value" porte la valeur brute : dans le schéma, display_value a
+    l'alias "value" et le champ value, sérialisé après, l'emporte.
+    Chaque parent n'est construit qu'une fois, puis partagé.
+    """
+    built: Dict[int, Dict[str, Any]] = {}
+
+    def record(row) -> Dict[str, Any]:
+        existing = built.get(row.id)
+        if existing is not None:
+            return existing
+        parent = parents.get(row.parent_variable_id) if row.parent_variable_id is not None else None
+        data = {
+            "name": row.name,
+            "identifier": row.identifier,
+            "value": row.value,
+            "category_id": row.category_id,
+            "parent_variable_id": row.parent_variable_id,
+            "id": row.id,
+            "parent_variable": record(parent) if parent is not None else None,
+            "created_at": row.created_at,
+            "updated_at": row.updated_at,
+            "owner_id": row.owner_id,
+        }
+        built[row.id] = data
+        return data
+
+    return [record(row) for row in rows]
+
+
+def category_records(rows: Iterable) -> List[Dict[str, Any]]:
+    return [{"name": row.name, "id": row.id, "owner_id": row.owner_id} for row in rows]
+
+
+def json_response(content: Any, response: Optional[Response] = None) -> ORJSONResponse:
+    """
+    Réponse encodée par orjson, sans validation pydantic ; reprend les en-têtes déjà posés (ETag, curseur).
+    """
+    result = ORJSONResponse(content)
+    if response is not None:
+        result.headers.raw.extend(response.headers.raw)
+    return result
+
+
+async def fast_categories(db, request: Request, response: Response, statement, after: Optional[str], limit: int, skip: int = 0) -> Response:
+    """
+    Chemin rapide (FAST_SERIALIZATION) d'une liste de catégories : même corps et même ETag que le response_model.
+    """
+    rows = await paginate(db, statement, Category, response, after=after, limit=limit, skip=skip, rows=True)
+    etag = categories_etag(rows, response.headers.get(NEXT_CURSOR_HEADER))
+    if etag_matches(request, etag):
+        return not_modified(etag)
+    response.headers["ETag"] = etag
+    return json_response(category_records(rows), response)
@@ -0,0 +1,281 @@
+# app/server.py
+import asyncio
+import logging
+import multiprocessing
+import os
+import random
+import shutil
+import signal
+import tempfile
+import threading
+import time
+from typing import Dict, List, Optional
+
+import uvicorn
+
+from app.config import settings
+
+logger = logging.getLogger(__name__)
+
+multiprocessing.allow_connection_pickling()
+spawn = multiprocessing.get_context("spawn")
+
+
+class Worker(uvicorn.Server):
+    """
+    Serveur uvicorn d'un worker.
+
+    Préchauffe l'application (app.warmup) puis signale au superviseur
+    qu'il accepte des connexions. À l'arrêt, les flux de modifications sont
+    fermés d'abord : une connexion SSE ne se termine jamais d'elle-même et
+    retiendrait le worker jusqu'à timeout_graceful_shutdown. Puis le worker
+    se vide avant l'arrêt d'uvicorn : plus d'acceptation, chaque réponse
+    porte `Connection: close`, et les connexions HTTP inactives restent
+    ouvertes jusqu'à leur délai keep-alive. uvicorn les fermerait aussitôt,
+    et une requête déjà envoyée par le client sur l'une d'elles serait perdue.
+    """
+
+    def __init__(self, config: uvicorn.Config, ready):
+        super().__init__(config)
+        self.ready = ready
+        self.draining = False
+
+    def _wrap(self, app):
+        async def draining_app(scope, receive, send):
+            if scope["type"] != "http" or not self.draining:
+                await app(scope, receive, send)
+                return
+
+            async def send_close(message):
+                if message["type"] == "http.response.start":
+                    message = dict(message, headers=list(message.get("headers", [])) + [(b"connection", b"close")])
+                await send(message)
+
+            await app(scope, receive, send_close)
+
+        return draining_app
+
+    async def startup(self, sockets=None) -> None:
+        # Dans la boucle du serveur (le pool asynchrone y reste attaché), avant l'écoute
+        if settings.SERVER_WARMUP:
+            from app.warmup import run_warmup
+
+            await run_warmup()
+        self.config.loaded_app = self._wrap(self.config.loaded_app)
+        await super().startup(sockets)
+        if not self.should_exit:
+            self.ready.set()
+
+    async def _drain(self) -> None:
+        self.draining = True
+        for server in self.servers:
+            server.close()
+        # Connexions HTTP seulement (les WebSocket sont fermées par uvicorn, code 1012)
+        connections = [connection for connection in self.server_state.connections if hasattr(connection, "cycle")]
+        for connection in connections:
+            if connection.cycle is not None and not connection.cycle.response_complete:
+                connection.cycle.keep_alive = False
+        deadline = time.monotonic() + self.config.timeout_keep_alive
+        while time.monotonic() < deadline and any(connection in self.server_state.connections for connection in connections):
+            await asyncio.sleep(0.1)
+
+    async def shutdown(self, sockets=None) -> None:
+        from app.changes import change_hub
+
+        await change_hub.close()
+        if not self.force_exit:
+            await self._drain()
+        await super().shutdown(sockets)
+
+
+def run_worker(config: uvicorn.Config, sockets: list, ready, max_requests: Optional[int]) -> None:
+    from app.logs import configure_logging
+
+    config.limit_max_requests = max_requests
+    # Loggers d'uvicorn sans handler propre (log_config=None) : ils passent par la file de app.logs
+    config.configure_logging()
+    configure_logging()
+    Worker(config, ready).run(sockets=sockets)
+
+
+class Supervisor:
+    """
+    Processus parent de `python -m app serve` : un socket, `workers` processus.
+
+    Le socket est ouvert une seule fois ici et transmis aux workers (spawn :
+    chaque worker importe l'application, un redémarrage charge donc le code
+    déployé). Un worker qui s'arrête (fin de max_requests, erreur) est
+    remplacé ; les connexions attendent dans la file du socket, qui reste
+    ouvert. SIGHUP : redémarrage progressif, chaque nouveau worker prêt
+    avant l'arrêt gracieux d'un ancien. SIGINT / SIGTERM : arrêt gracieux.
+    """
+
+    def __init__(self, config: uvicorn.Config, workers: int, max_requests: int = 0, max_requests_jitter: int = 0, ready_timeout: float = 60.0):
+        self.config = config
+        self.workers = workers
+        self.max_requests = max_requests
+        self.max_requests_jitter = max_requests_jitter
+        self.ready_timeout = ready_timeout
+        self.sockets: List = []
+        # Processus en service -> événement « prêt » ; les workers remplacés sortent de cet index
+        self.processes: Dict = {}
+        self.retiring: List = []
+        self._should_exit = False
+        self._should_restart = False
+        self._wakeup = threading.Event()
+
+    def _limit(self) -> Optional[int]:
+        # Part aléatoire : les workers ne sont pas recyclés tous en même temps
+        if not self.max_requests:
+            return None
+        return self.max_requests + random.randint(0, self.max_requests_jitter)
+
+    def spawn(self):
+        ready = spawn.Event()
+        process = spawn.Process(target=run_worker, args=(self.config, self.sockets, ready, self._limit()), name="shortpress-worker")
+        process.start()
+        self.processes[process] = ready
+        return process
+
+    def _wait_ready(self, process) -> bool:
+        deadline = time.monotonic() + self.ready_timeout
+        ready = self.processes[process]
+        while time.monotonic() < deadline and not self._should_exit:
+            if ready.wait(0.1):
+                return True
+            if not process.is_alive():
+                return False
+        return False
+
+    def _retire(self, process) -> None:
+        self.processes.pop(process, None)
+        self.retiring.append(process)
+        if process.is_alive():
+            process.terminate()
+
+    def restart(self) -> None:
+        """
+        Remplace les workers un par un ; s'arrête au premier nouveau worker qui ne démarre pas.
+        """
+        logger.info("Redémarrage progressif de %d workers", len(self.processes))
+        for old in list(self.processes):
+            new = self.spawn()
+            if not self._wait_ready(new):
+                if not self._should_exit:
+                    logger.error("Nouveau worker [%d] non prêt : redémarrage interrompu", new.pid)
+                self._retire(new)
+                return
+            self._retire(old)
+        logger.info("Redémarrage progressif terminé")
+
+    def _reap(self) -> None:
+        for process in [process for process in self.retiring if not process.is_alive()]:
+            process.join()
+            self.retiring.remove(process)
+        for process, ready in list(self.processes.items()):
+            if process.is_alive():
+                continue
+            process.join()
+            del self.processes[process]
+            if self._should_exit:
+                continue
+            if ready.is_set():
+                logger.info("Worker [%d] arrêté (code %s) : remplacé", process.pid, process.exitcode)
+            else:
+                # Échec au démarrage : pas de relance en boucle serrée
+                logger.error("Worker [%d] arrêté avant d'être prêt (code %s)", process.pid, process.exitcode)
+                time.sleep(1)
+            self.spawn()
+
+    def _handle_exit(self, sig, frame) -> None:
+        self._should_exit = True
+        self._wakeup.set()
+
+    def _handle_restart(self, sig, frame) -> None:
+        self._should_restart = True
+        self._wakeup.set()
+
+    def run(self) -> None:
+        self.sockets = [self.config.bind_socket()]
+        for sig in (signal.SIGINT, signal.SIGTERM):
+            signal.signal(sig, self._handle_exit)
+        if hasattr(signal, "SIGHUP"):
+            signal.signal(signal.SIGHUP, self._handle_restart)
+        logger.info("Superviseur [%d] : %d workers sur %s:%d", os.getpid(), self.workers, self.config.host, self.config.port)
+
+        for _ in range(self.workers):
+            self.spawn()
+        while not self._should_exit:
+            self._wakeup.wait(0.5)
+            self._wakeup.clear()
+            if self._should_restart and not self._should_exit:
+                self._should_restart = False
+                self.restart()
+            self._reap()
+
+        logger.info("Arrêt des workers")
+        for process in list(self.processes) + self.retiring:
+            if process.is_alive():
+                process.terminate()
+        for process in list(self.processes) + self.retiring:
+            process.join()
+        for sock in self.sockets:
+            sock.close()
+
+
+def serve(
+    host: Optional[str] = None,
+    port: Optional[int] = None,
+    workers: Optional[int] = None,
+    max_requests: Optional[int] = None,
+    max_requests_jitter: Optional[int] = None,
+    graceful_timeout: Optional[int] = None,
+) -> None:
+    """
+    Lance l'API en production : travail de démarrage unique dans ce
+    processus, puis un worker par cœur (uvloop et httptools s'ils sont
+    installés).
+
+    Avec plusieurs workers et sans BUNDLE_DIR, les bundles sont écrits dans
+    un répertoire temporaire commun (effacé à l'arrêt) : un bundle publié
+    par un worker est servi par tous.
+    """
+    if not settings.SECRET_KEY:
+        raise SystemExit("SECRET_KEY environment variable not set")
+
+    # Migrations et administrateur initial une seule fois, avant les workers (qui relisent l'environnement)
+    if settings.DB_INIT_ON_STARTUP:
+        from app.database import get_engine
+        from app.initial_data import init_db
+
+        engine = get_engine()
+        init_db(engine)
+        engine.dispose()
+        os.environ["DB_INIT_ON_STARTUP"] = "false"
+
+    config = uvicorn.Config(
+        "app.main:app",
+        host=host or settings.SERVER_HOST,
+        port=port or settings.SERVER_PORT,
+        loop="auto",
+        http="auto",
+        lifespan="on",
+        log_config=None,
+        timeout_graceful_shutdown=settings.SERVER_GRACEFUL_TIMEOUT if graceful_timeout is None else graceful_timeout,
+    )
+    workers = workers or settings.SERVER_WORKERS or os.cpu_count() or 1
+    bundle_dir = None
+    if workers > 1 and not settings.BUNDLE_DIR:
+        bundle_dir = tempfile.mkdtemp(prefix="shortpress-bundles-")
+        os.environ["BUNDLE_DIR"] = bundle_dir
+        logger.warning("BUNDLE_DIR non défini : bundles partagés par les workers dans %s, effacés à l'arrêt", bundle_dir)
+    try:
+        Supervisor(
+            config,
+            workers=workers,
+            max_requests=settings.SERVER_MAX_REQUESTS if max_requests is None else max_requests,
+            max_requests_jitter=settings.SERVER_MAX_REQUESTS_JITTER if max_requests_jitter is None else max_requests_jitter,
+        ).run()
+    finally:
+        if bundle_dir is not None:
+            shutil.rmtree(bundle_dir, ignore_errors=True)
@@ -1,28 +1,354 @@
 # app/utils.py
 
 import re
+from functools import lru_cache
+from typing import Dict, FrozenSet, Iterable, List, Optional, Set, Tuple, Union
+
 from fastapi import HTTPException, status
 from sqlalchemy.orm import Session
+from app.cache import resolved_cache
+from app.metrics import record_resolution
 from app.models import Variable
 
+REFERENCE_PATTERN = re.compile(r"\{\{(.*?)\}\}")
+IDENTIFIER_PATTERN = re.compile(r"^[a-zA-Z0-9_]+$")
+
+# Nombre maximal de paramètres par clause IN (limite historique de SQLite : 999)
+IN_CHUNK_SIZE = 500
+
+
+def chunked(items: List, size: int = IN_CHUNK_SIZE) -> Iterable[List]:
+    for start in range(0, len(items), size):
+        yield items[start:start + size]
 
-def resolve_nested_variables(variable_value: str, db: Session) -> str:
+
+@lru_cache(maxsize=4096)
+def parse_template(value: str) -> Tuple[str, ...]:
     """
-    Résout les variables imbriquées dans une chaîne de caractères.
+    Découpe une valeur en jetons : les indices pairs sont des littéraux,
+    les indices impairs les identifiants référencés.
     """
-    pattern = r"\{\{(.*?)\}\}"
-    matches = re.findall(pattern, variable_value)
-
-    for match in matches:
+    tokens = tuple(REFERENCE_PATTERN.split(value))
+    for reference in tokens[1::2]:
         # Validation de la syntaxe
-        if not re.match(r"^[a-zA-Z0-9_]+$", match):
-            raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=f"Invalid variable reference syntax: '{match}'")
+        if not IDENTIFIER_PATTERN.match(reference):
+            raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=f"Invalid variable reference syntax: '{reference}'")
+    return tokens
+
+
+def template_references(value: Optional[str]) -> Tuple[str, ...]:
+    """
+    Retourne les identifiants référencés par une valeur, dans l'ordre d'apparition.
+    """
+    return parse_template(value or "")[1::2]
+
+
+def _references_or_none(value: Optional[str]) -> Tuple[str, ...]:
+    # Syntaxe invalide : aucune dépendance, l'erreur est levée lors de la résolution
+    try:
+        return template_references(value)
+    except HTTPException:
+        return ()
+
+
+class VariableResolver:
+    """
+    Résout les références {{identifiant}} des variables d'un propriétaire.
+
+    Les variables référencées sont chargées niveau par niveau, avec une seule
+    requête IN par niveau, et chaque sous-résultat est mémorisé pour la durée
+    de vie du résolveur (une requête HTTP). Si un cache est fourni, les
+    valeurs résolues des variables y sont lues et matérialisées avec leurs
+    dépendances transitives.
+    """
+
+    def __init__(self, db: Session, cache=None):
+        self.db = db
+        self.cache = cache
+        # (owner_id, identifier) -> valeur brute, None si la variable n'existe pas
+        self._values: Dict[Tuple[int, str], Optional[str]] = {}
+        self._resolved: Dict[Tuple[int, str], str] = {}
+        self._dependencies: Dict[Tuple[int, str], FrozenSet[str]] = {}
+        # Dépendances transitives des variables passées à resolve_variable, par id
+        self.variable_dependencies: Dict[int, FrozenSet[str]] = {}
+        # Statistiques transmises aux métriques par report()
+        self.expanded = 0
+        self.max_depth = 0
+        self.cache_hits = 0
+        self.cache_misses = 0
+
+    def prime(self, variables: Iterable[Variable]) -> None:
+        """
+        Enregistre des variables déjà chargées pour éviter de les relire.
+        """
+        for variable in variables:
+            self._values.setdefault((variable.owner_id, variable.identifier), variable.value or "")
+
+    def preload(self, variables: Iterable[Variable]) -> None:
+        """
+        Charge en une passe (une requête IN par niveau et par propriétaire) les
+        références de variables qui seront résolues ensuite, plutôt que
+        variable par variable.
+        """
+        by_owner: Dict[int, Set[str]] = {}
+        for variable in variables:
+            references = by_owner.setdefault(variable.owner_id, set())
+            try:
+                references.update(template_references(variable.value))
+            except HTTPException:
+                # Syntaxe invalide : l'erreur est levée lors de la résolution de la variable
+                continue
+        for owner_id, references in by_owner.items():
+            self._load(owner_id, references)
+
+    def _load(self, owner_id: int, references: Iterable[str]) -> None:
+        frontier = {identifier for identifier in references if (owner_id, identifier) not in self._resolved}
+        seen = set()
+        while frontier:
+            seen |= frontier
+            missing = [identifier for identifier in frontier if (owner_id, identifier) not in self._values]
+            for batch in chunked(missing):
+                rows = self.db.query(Variable.identifier, Variable.value).filter(
+                    Variable.owner_id == owner_id, Variable.identifier.in_(batch)
+                ).all()
+                for identifier in batch:
+                    self._values[(owner_id, identifier)] = None
+                for identifier, value in rows:
+                    self._values[(owner_id, identifier)] = value or ""
+
+            next_frontier = set()
+            for identifier in frontier:
+                value = self._values[(owner_id, identifier)]
+                if value is None:
+                    continue
+                for reference in template_references(value):
+                    if reference not in seen and (owner_id, reference) not in self._resolved:
+                        next_frontier.add(reference)
+            frontier = next_frontier
+
+    def dependency_closure(self, variables: Iterable[Variable]) -> Dict[int, FrozenSet[str]]:
+        """
+        Dépendances transitives de variables, sans les résoudre : seules les
+        valeurs brutes sont lues (une requête IN par niveau et par propriétaire).
+
+        Mêmes identifiants que ceux collectés par la résolution, y compris ceux
+        qui n'existent pas : leur création change aussi l'empreinte.
+        """
+        variables = list(variables)
+        self.prime(variables)
+        self.preload(variables)
+        closures: Dict[int, FrozenSet[str]] = {}
+        for variable in variables:
+            seen: Set[str] = set()
+            stack = list(_references_or_none(variable.value))
+            while stack:
+                identifier = stack.pop()
+                if identifier in seen:
+                    continue
+                seen.add(identifier)
+                value = self._values.get((variable.owner_id, identifier))
+                if value:
+                    stack.extend(_references_or_none(value))
+            closures[variable.id] = frozenset(seen)
+        return closures
+
+    def _render(self, owner_id: int, tokens: Tuple[str, ...], path: List[str]) -> str:
+        parts = list(tokens)
+        for index in range(1, len(tokens), 2):
+            parts[index] = self._resolve_identifier(owner_id, tokens[index], path)
+        return "".join(parts)
 
-        referenced_variable = db.query(Variable).filter(Variable.name == match).first()
-        if referenced_variable:
-            resolved_value = resolve_nested_variables(referenced_variable.value, db)
-            variable_value = variable_value.replace(f"{{{{{match}}}}}", resolved_value)
+    def _resolve_identifier(self, owner_id: int, identifier: str, path: List[str]) -> str:
+        """
+        Résout un identifiant avec une pile explicite (profondeur d'abord,
+        post-ordre) : la longueur d'une chaîne de références n'est pas limitée
+        par la pile d'appels Python. `path` est rendu dans son état initial,
+        y compris en cas d'erreur.
+        """
+        resolved = self._resolved.get((owner_id, identifier))
+        if resolved is not None:
+            return resolved
+        base = len(path)
+        on_path = set(path)
+        # (identifiant, jetons de sa valeur, indice de la prochaine référence à examiner)
+        stack: List[Tuple[str, Tuple[str, ...], int]] = []
+
+        def enter(reference: str) -> None:
+            if reference in on_path:
+                cycle = " -> ".join(path[path.index(reference):] + [reference])
+                raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=f"Circular variable reference: {cycle}")
+            value = self._values.get((owner_id, reference))
+            if value is None:
+                raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail=f"Referenced variable '{reference}' not found")
+            path.append(reference)
+            on_path.add(reference)
+            self.expanded += 1
+            if len(path) > self.max_depth:
+                self.max_depth = len(path)
+            stack.append((reference, parse_template(value), 1))
+
+        try:
+            enter(identifier)
+            while stack:
+                current, tokens, index = stack[-1]
+                while index < len(tokens) and (owner_id, tokens[index]) in self._resolved:
+                    index += 2
+                if index < len(tokens):
+                    # Référence à résoudre d'abord ; elle sera résolue au retour sur cet élément
+                    stack[-1] = (current, tokens, index)
+                    enter(tokens[index])
+                    continue
+
+                stack.pop()
+                path.pop()
+                on_path.discard(current)
+                parts = list(tokens)
+                dependencies = set(tokens[1::2])
+                for position in range(1, len(tokens), 2):
+                    key = (owner_id, tokens[position])
+                    parts[position] = self._resolved[key]
+                    dependencies |= self._dependencies[key]
+                self._resolved[(owner_id, current)] = "".join(parts)
+                self._dependencies[(owner_id, current)] = frozenset(dependencies)
+            return self._resolved[(owner_id, identifier)]
+        finally:
+            del path[base:]
+
+    def dependencies(self, owner_id: int, identifier: str) -> FrozenSet[str]:
+        """
+        Identifiants dont dépend, transitivement, une variable déjà résolue.
+        """
+        return self._dependencies.get((owner_id, identifier), frozenset())
+
+    def resolve(self, value: Optional[str], owner_id: int) -> str:
+        """
+        Résout une valeur quelconque dans l'espace de noms d'un propriétaire.
+        """
+        tokens = parse_template(value or "")
+        if len(tokens) == 1:
+            return tokens[0]
+        self._load(owner_id, tokens[1::2])
+        try:
+            return self._render(owner_id, tokens, [])
+        finally:
+            self.report()
+
+    def resolve_identifiers(self, owner_id: int, identifiers: Iterable[str]) -> Dict[str, Optional[str]]:
+        """
+        Résout des identifiants ; None pour ceux qui sont introuvables ou non résolubles.
+        """
+        identifiers = list(identifiers)
+        self._load(owner_id, identifiers)
+        results: Dict[str, Optional[str]] = {}
+        for identifier in identifiers:
+            try:
+                results[identifier] = self._resolve_identifier(owner_id, identifier, [])
+            except HTTPException:
+                results[identifier] = None
+        self.report()
+        return results
+
+    def report(self) -> None:
+        """
+        Transmet aux métriques les statistiques accumulées depuis le dernier appel.
+        """
+        record_resolution(self.max_depth, self.expanded, self.cache_hits, self.cache_misses)
+        self.expanded = self.max_depth = self.cache_hits = self.cache_misses = 0
+
+    def resolve_variable(self, variable: Variable) -> str:
+        """
+        Résout la valeur d'une variable ; une auto-référence est signalée comme un cycle.
+        """
+        key = (variable.owner_id, variable.identifier)
+        if self.cache is not None and key not in self._resolved:
+            entry = self.cache.get_entry(variable.id)
+            if entry is not None:
+                self.cache_hits += 1
+                self.variable_dependencies[variable.id] = entry.dependencies
+                return entry.value
+            self.cache_misses += 1
+
+        self._values.setdefault(key, variable.value or "")
+        if key not in self._resolved:
+            self._load(variable.owner_id, template_references(self._values[key]))
+        resolved = self._resolve_identifier(variable.owner_id, variable.identifier, [])
+        self.variable_dependencies[variable.id] = self._dependencies[key]
+        if self.cache is not None:
+            self.cache.set(variable.id, variable.owner_id, variable.identifier, resolved, self._dependencies[key])
+        return resolved
+
+
+def _resolve_all(
+    db: Session,
+    variables: List[Variable],
+    return_exceptions: bool,
+    dependencies: Optional[Dict[int, FrozenSet[str]]],
+) -> List[Union[str, HTTPException]]:
+    resolver = VariableResolver(db, cache=resolved_cache)
+    resolver.prime(variables)
+    resolver.preload([variable for variable in variables if variable.id not in resolved_cache])
+    results = []
+    try:
+        for variable in variables:
+            try:
+                results.append(resolver.resolve_variable(variable))
+            except HTTPException as e:
+                if not return_exceptions:
+                    raise
+                results.append(e)
+    finally:
+        if dependencies is not None:
+            dependencies.update(resolver.variable_dependencies)
+        resolver.report()
+    return results
+
+
+async def resolve_cached(
+    db,
+    variables: List[Variable],
+    return_exceptions: bool = False,
+    dependencies: Optional[Dict[int, FrozenSet[str]]] = None,
+) -> List[Union[str, HTTPException]]:
+    """
+    Résout une liste de variables en s'appuyant sur le cache des valeurs résolues.
+
+    db est une session de get_db (AsyncSession ou session synchrone adaptée) :
+    le résolveur, synchrone, s'exécute via run_sync. Avec return_exceptions,
+    une erreur de résolution est renvoyée à la place de la valeur concernée
+    au lieu d'interrompre le lot. Si dependencies est fourni, il reçoit les
+    dépendances transitives de chaque variable résolue, par id.
+    """
+    await resolved_cache.load([variable.id for variable in variables])
+    try:
+        return await db.run_sync(_resolve_all, variables, return_exceptions, dependencies)
+    finally:
+        await resolved_cache.flush()
+
+
+async def resolve_dependencies(db, variables: List[Variable]) -> Dict[int, FrozenSet[str]]:
+    """
+    Dépendances transitives des variables, par id, sans rien résoudre.
+
+    Lues dans le cache des valeurs résolues quand il les a, sinon calculées
+    depuis les valeurs brutes : un ETag peut être calculé (et un 304
+    renvoyé) sans passer par le résolveur.
+    """
+    await resolved_cache.load([variable.id for variable in variables])
+    dependencies: Dict[int, FrozenSet[str]] = {}
+    missing = []
+    for variable in variables:
+        entry = resolved_cache.get_entry(variable.id)
+        if entry is None:
+            missing.append(variable)
         else:
-            raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail=f"Referenced variable '{match}' not found")
+            dependencies[variable.id] = entry.dependencies
+    if missing:
+        dependencies.update(await db.run_sync(lambda session: VariableResolver(session).dependency_closure(missing)))
+    return dependencies
+
 
-    return variable_value
+def resolve_nested_variables(variable_value: str, db: Session, owner_id: int) -> str:
+    """
+    Résout les variables imbriquées dans une chaîne de caractères.
+    """
+    return VariableResolver(db).resolve(variable_value, owner_id)
@@ -0,0 +1,111 @@
+# app/warmup.py
+import asyncio
+import logging
+import time
+from typing import Awaitable, Callable, Dict, List
+
+from sqlalchemy import select, text
+
+from app.config import settings
+
+logger = logging.getLogger(__name__)
+
+WarmupHook = Callable[[], Awaitable[None]]
+
+_hooks: List[WarmupHook] = []
+
+
+def warmup_hook(hook: WarmupHook) -> WarmupHook:
+    """
+    Enregistre une étape de préchauffage, exécutée au démarrage d'un worker.
+    """
+    _hooks.append(hook)
+    return hook
+
+
+async def run_warmup() -> Dict[str, float]:
+    """
+    Exécute les étapes de préchauffage, dans l'ordre d'enregistrement.
+
+    Appelé par chaque worker de `python -m app serve` avant qu'il
+    n'accepte de connexions (pas au démarrage de l'application : une
+    instance serverless ne paie pas ce coût). Une étape en échec est
+    journalisée sans empêcher le démarrage.
+    """
+    timings: Dict[str, float] = {}
+    for hook in _hooks:
+        started = time.perf_counter()
+        try:
+            await hook()
+        except Exception as e:
+            logger.warning("Préchauffage %s en échec : %s", hook.__name__, e)
+        timings[hook.__name__] = (time.perf_counter() - started) * 1000
+    logger.info("Préchauffage terminé : %s", ", ".join(f"{name} {elapsed:.0f} ms" for name, elapsed in timings.items()))
+    return timings
+
+
+@warmup_hook
+async def database_pool() -> None:
+    # Connexions du pool ouvertes (et pragmas SQLite appliqués) avant la première requête
+    from app.database import open_session
+
+    async def ping():
+        db = open_session()
+        try:
+            await db.execute(text("SELECT 1"))
+        finally:
+            await db.close()
+
+    await asyncio.gather(*(ping() for _ in range(max(1, settings.DB_POOL_SIZE))))
+
+
+@warmup_hook
+async def statements() -> None:
+    # Requêtes des chemins chauds compilées une fois (cache de requêtes compilées de SQLAlchemy)
+    from app.changes import current_cursor
+    from app.database import open_session
+    from app.models import Category, User, Variable
+    from app.serialization import select_category_rows, select_variable_rows
+
+    db = open_session()
+    try:
+        await db.execute(select(User.token_version).where(User.id == 0))
+        await db.execute(select_variable_rows().where(Variable.owner_id == 0).limit(1))
+        await db.execute(select_category_rows().where(Category.owner_id == 0).limit(1))
+        await current_cursor(db)
+    finally:
+        await db.close()
+
+
+@warmup_hook
+async def modules() -> None:
+    # Modules importés à la demande par les routes
+    import jinja2.meta  # noqa: F401
+
+    from app.bundles import _msgpack
+
+    _msgpack()
+
+
+@warmup_hook
+async def resolved_values() -> None:
+    # Valeurs résolues des dernières variables modifiées (journal des modifications, parcouru
+    # par clé primaire) : les plus demandées juste après un déploiement
+    if not settings.SERVER_WARMUP_VARIABLES:
+        return
+    from app.database import open_session
+    from app.models import Change, Variable
+    from app.utils import resolve_cached
+
+    db = open_session()
+    try:
+        variable_ids = (await db.scalars(
+            select(Change.entity_id)
+            .where(Change.entity == "variable", Change.deleted.is_(False))
+            .order_by(Change.id.desc())
+            .limit(settings.SERVER_WARMUP_VARIABLES)
+        )).all()
+        variables = (await db.scalars(select(Variable).where(Variable.id.in_(set(variable_ids))))).all()
+        await resolve_cached(db, variables, return_exceptions=True)
+    finally:
+        await db.close()
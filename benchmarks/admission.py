@@ -0,0 +1,163 @@
+# benchmarks/admission.py
+"""
+Contrôle d'admission : un utilisateur bruyant face à un utilisateur ordinaire.
+
+Une base temporaire reçoit deux utilisateurs (`--variables` variables
+chacun, références comme benchmarks.load). L'utilisateur bruyant lance
+`--noisy` boucles sans pause sur GET /variables/{id}/resolved (cache des
+valeurs résolues désactivé : chaque lecture résout ; après un refus, la
+boucle attend Retry-After), pendant que l'utilisateur ordinaire lit ses
+variables une à une, au plus `--victim-rate` par seconde. Mesures, sans
+puis avec AdmissionMiddleware (backend en mémoire) :
+- latences de l'utilisateur ordinaire (p50, p99) et débit ;
+- réponses servies et refusées (429 / 503) au bruyant, latence d'un refus ;
+- surcoût du middleware sur une lecture simple, sans concurrence (seaux
+  assez grands pour ne jamais refuser).
+
+    python -m benchmarks.admission --variables 1000 --noisy 32 --duration 5
+
+Le résultat est un objet JSON sur la sortie standard.
+"""
+import argparse
+import asyncio
+import json
+import os
+import statistics
+import sys
+import tempfile
+import time
+
+from benchmarks.cold_start import percentile
+
+
+async def scenario(client, victim: dict, noisy: dict, args: argparse.Namespace) -> dict:
+    stop = time.perf_counter() + args.duration
+    served, rejected, rejection_ms = 0, {}, []
+
+    async def noisy_loop(offset: int):
+        nonlocal served
+        ids = noisy["ids"]
+        index = offset
+        while time.perf_counter() < stop:
+            started = time.perf_counter()
+            response = await client.get(f"/api/v1/variables/variables/{ids[index % len(ids)]}/resolved", headers=noisy["headers"])
+            index += args.noisy
+            if response.status_code == 200:
+                served += 1
+            else:
+                rejected[response.status_code] = rejected.get(response.status_code, 0) + 1
+                rejection_ms.append((time.perf_counter() - started) * 1000)
+                # Client et serveur partagent la boucle : un client qui réessaie sans délai
+                # mesurerait surtout son propre coût (httpx), pas celui du refus
+                await asyncio.sleep(min(float(response.headers.get("Retry-After", 1)), stop - time.perf_counter()))
+
+    async def victim_loop():
+        latencies = []
+        ids = victim["ids"]
+        while time.perf_counter() < stop:
+            started = time.perf_counter()
+            response = await client.get(f"/api/v1/variables/variables/{ids[len(latencies) % len(ids)]}", headers=victim["headers"])
+            response.raise_for_status()
+            latencies.append((time.perf_counter() - started) * 1000)
+            await asyncio.sleep(max(0.0, 1 / args.victim_rate - (time.perf_counter() - started)))
+        return latencies
+
+    tasks = [asyncio.ensure_future(noisy_loop(offset)) for offset in range(args.noisy)]
+    latencies = await victim_loop()
+    await asyncio.gather(*tasks)
+    return {
+        "victim_requests": len(latencies),
+        "victim_p50_ms": round(percentile(latencies, 0.5), 2),
+        "victim_p99_ms": round(percentile(latencies, 0.99), 2),
+        "noisy_served": served,
+        "noisy_rejected": {str(code): count for code, count in sorted(rejected.items())},
+        "rejection_p50_ms": round(percentile(rejection_ms, 0.5), 2) if rejection_ms else None,
+    }
+
+
+async def overhead(client, victim: dict, requests: int) -> float:
+    latencies = []
+    for index in range(requests):
+        started = time.perf_counter()
+        response = await client.get(f"/api/v1/variables/variables/{victim['ids'][index % len(victim['ids'])]}", headers=victim["headers"])
+        response.raise_for_status()
+        latencies.append((time.perf_counter() - started) * 1000)
+    return statistics.median(latencies)
+
+
+async def bench(args: argparse.Namespace) -> dict:
+    import logging
+    import random
+
+    import httpx
+
+    from app.admission import AdmissionMiddleware, LocalBackend
+    from app.auth import create_access_token
+    from app.database import dispose_engines, get_engine
+    from app.initial_data import upgrade_schema
+    import app.main
+    from benchmarks.load import seed
+
+    logging.getLogger().setLevel(logging.WARNING)
+    logging.getLogger("httpx").setLevel(logging.WARNING)
+
+    engine = get_engine()
+    upgrade_schema(engine)
+    _, accounts, _ = seed(engine, 2, args.variables, 10, depth=3, fanout=2, rng=random.Random(0))
+    users = []
+    for account in accounts:
+        token = create_access_token({"sub": account.username, "user_id": account.id, "is_admin": False, "is_active": True, "version": 0})
+        users.append({"headers": {"Authorization": f"Bearer {token}"}, "ids": account.variable_ids})
+    victim, noisy = users
+    # Variables du dernier niveau : les plus longues à résoudre
+    noisy["ids"] = noisy["ids"][-max(1, len(noisy["ids"]) // 4):]
+
+    def admitted(rate: float, burst: float):
+        return AdmissionMiddleware(app.main.app, backend=LocalBackend(rate, burst), router=app.main.app.router)
+
+    report = {}
+    for name, application, unlimited in (
+        ("without_admission", app.main.app, app.main.app),
+        ("with_admission", admitted(args.rate, args.burst), admitted(1e9, 1e9)),
+    ):
+        async with httpx.AsyncClient(transport=httpx.ASGITransport(app=application), base_url="http://bench", timeout=None) as client:
+            # Jetons validés une première fois (cache des jetons) avant les mesures
+            await overhead(client, victim, 1)
+            await overhead(client, noisy, 1)
+            report[name] = await scenario(client, victim, noisy, args)
+        async with httpx.AsyncClient(transport=httpx.ASGITransport(app=unlimited), base_url="http://bench", timeout=None) as client:
+            report[name]["single_read_ms"] = round(await overhead(client, victim, args.requests), 3)
+        print(f"{name}: {report[name]}", file=sys.stderr)
+
+    await dispose_engines()
+    return report
+
+
+def main(argv=None) -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--variables", type=int, default=1000, help="Variables par utilisateur")
+    parser.add_argument("--noisy", type=int, default=32, help="Boucles simultanées de l'utilisateur bruyant")
+    parser.add_argument("--duration", type=float, default=5.0, help="Durée de chaque scénario (secondes)")
+    parser.add_argument("--victim-rate", type=float, default=20.0, help="Lectures par seconde de l'utilisateur ordinaire")
+    parser.add_argument("--rate", type=float, default=50.0, help="Jetons rendus par seconde (ADMISSION_USER_RATE)")
+    parser.add_argument("--burst", type=float, default=200.0, help="Réserve de jetons (ADMISSION_USER_BURST)")
+    parser.add_argument("--requests", type=int, default=500, help="Lectures simples pour le surcoût à vide")
+    args = parser.parse_args(argv)
+
+    with tempfile.TemporaryDirectory() as directory:
+        # Réglages lus à l'import de app.config : à fixer avant tout import de l'application
+        os.environ.update(
+            DATABASE_URL=f"sqlite:///{os.path.join(directory, 'admission.db')}",
+            SECRET_KEY=os.environ.get("SECRET_KEY", "benchmark"),
+            BCRYPT_ROUNDS="4",
+            DB_INIT_ON_STARTUP="false",
+            METRICS_ENABLED="false",
+            ADMISSION_ENABLED="false",
+            RESOLVED_CACHE_SIZE="0",
+        )
+        result = asyncio.run(bench(args))
+    print(json.dumps(dict(result, variables=args.variables, noisy=args.noisy, rate=args.rate, burst=args.burst), indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,176 @@
+# benchmarks/changes.py
+"""
+Synchronisation incrémentale : journal des modifications et diffusion.
+
+Une base temporaire reçoit `--variables` variables pour un utilisateur
+(références comme benchmarks.load). Mesures :
+- surcoût des triggers du journal sur un UPDATE de toutes les variables ;
+- relecture complète de la liste contre GET /variables/changes après
+  `--updates` modifications ;
+- diffusion d'une modification à `--subscribers` abonnés inactifs du même
+  worker (ChangeHub, sans la couche HTTP), et mémoire par abonné.
+
+    python -m benchmarks.changes --variables 10000 --subscribers 2000
+
+Le résultat est un objet JSON sur la sortie standard.
+"""
+import argparse
+import asyncio
+import json
+import os
+import statistics
+import sys
+import tempfile
+import time
+import tracemalloc
+
+
+def trigger_overhead(engine, owner_id: int) -> dict:
+    """
+    UPDATE de toutes les variables de l'utilisateur, sur deux copies de la
+    base : avec les triggers du journal, et sans.
+    """
+    import sqlite3
+
+    from sqlalchemy import create_engine
+
+    from app.models import Variable
+
+    timings = {}
+    for with_triggers in (True, False):
+        path = f"{engine.url.database}.{with_triggers}"
+        with sqlite3.connect(engine.url.database) as source, sqlite3.connect(path) as copy:
+            source.backup(copy)
+            if not with_triggers:
+                for name in ("changes_variables_insert", "changes_variables_update", "changes_variables_delete"):
+                    copy.execute(f"DROP TRIGGER {name}")
+        copy_engine = create_engine(f"sqlite:///{path}")
+        with copy_engine.begin() as connection:
+            started = time.perf_counter()
+            connection.execute(Variable.__table__.update().where(Variable.owner_id == owner_id).values(name=Variable.name + ""))
+            timings[with_triggers] = (time.perf_counter() - started) * 1000
+        copy_engine.dispose()
+    return {"with_triggers_ms": round(timings[True], 1), "without_triggers_ms": round(timings[False], 1)}
+
+
+async def bench(args: argparse.Namespace) -> dict:
+    import logging
+    import random
+
+    import httpx
+
+    from app.auth import create_access_token
+    from app.changes import change_hub
+    from app.database import dispose_engines, get_engine
+    from app.initial_data import upgrade_schema
+    import app.main
+    from benchmarks.load import seed
+
+    logging.getLogger().setLevel(logging.WARNING)
+    logging.getLogger("httpx").setLevel(logging.WARNING)
+
+    engine = get_engine()
+    upgrade_schema(engine)
+    _, accounts, _ = seed(engine, 1, args.variables, 10, depth=3, fanout=2, rng=random.Random(0))
+    user = accounts[0]
+    token = create_access_token({"sub": user.username, "user_id": user.id, "is_admin": False, "is_active": True, "version": 0})
+    headers = {"Authorization": f"Bearer {token}"}
+    report = {"triggers": trigger_overhead(engine, user.id)}
+    print(f"triggers: {report['triggers']}", file=sys.stderr)
+
+    transport = httpx.ASGITransport(app=app.main.app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://bench", timeout=None) as client:
+        variables = "/api/v1/variables/variables/"
+        changes = "/api/v1/variables/variables/changes"
+        cursor = (await client.get(changes, headers=headers)).json()["cursor"]
+        # Variables de premier niveau : chaque modification change aussi la valeur résolue de leurs dépendantes
+        rng = random.Random(1)
+        for index in rng.sample(range(min(args.variables, 1000)), args.updates):
+            response = await client.put(f"{variables}{index + 1}", json={"value": f"modifiée {index}"}, headers=headers)
+            response.raise_for_status()
+
+        full, delta = [], []
+        for _ in range(args.runs):
+            started = time.perf_counter()
+            response = await client.get(variables, params={"limit": args.variables}, headers=headers)
+            full.append((time.perf_counter() - started) * 1000)
+            full_bytes = len(response.content)
+            started = time.perf_counter()
+            response = await client.get(changes, params={"since": cursor, "limit": 1000}, headers=headers)
+            delta.append((time.perf_counter() - started) * 1000)
+            delta_body = response.json()
+        report["sync"] = {
+            "updates": args.updates,
+            "full_list_ms": round(statistics.median(full), 1),
+            "full_list_bytes": full_bytes,
+            "changes_ms": round(statistics.median(delta), 1),
+            "changes_bytes": len(response.content),
+            "changes_entries": len(delta_body["changes"]),
+        }
+        print(f"sync: {report['sync']}", file=sys.stderr)
+
+        # Abonnés inactifs : une tâche et une file chacun
+        received = 0
+        done = asyncio.Event()
+
+        async def subscriber():
+            nonlocal received
+            async for change_event in change_hub.stream(user.id, None):
+                if change_event is not None:
+                    received += 1
+                    if received == args.subscribers:
+                        done.set()
+
+        tracemalloc.start()
+        before = tracemalloc.take_snapshot()
+        tasks = [asyncio.ensure_future(subscriber()) for _ in range(args.subscribers)]
+        while len(change_hub) < args.subscribers:
+            await asyncio.sleep(0.01)
+        memory = sum(stat.size_diff for stat in tracemalloc.take_snapshot().compare_to(before, "filename"))
+        tracemalloc.stop()
+
+        fanout = []
+        for run in range(args.runs):
+            received = 0
+            done.clear()
+            started = time.perf_counter()
+            await client.put(f"{variables}1", json={"value": f"diffusée {run}"}, headers=headers)
+            await done.wait()
+            fanout.append((time.perf_counter() - started) * 1000)
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+        report["fanout"] = {
+            "subscribers": args.subscribers,
+            "write_to_all_delivered_ms": round(statistics.median(fanout), 1),
+            "bytes_per_idle_subscriber": memory // args.subscribers,
+        }
+        print(f"fanout: {report['fanout']}", file=sys.stderr)
+    await change_hub.close()
+    await dispose_engines()
+    return report
+
+
+def main(argv=None) -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--variables", type=int, default=10000, help="Variables de l'utilisateur")
+    parser.add_argument("--updates", type=int, default=50, help="Modifications avant la synchronisation")
+    parser.add_argument("--subscribers", type=int, default=2000, help="Abonnés inactifs du flux")
+    parser.add_argument("--runs", type=int, default=5, help="Mesures (médiane)")
+    args = parser.parse_args(argv)
+
+    with tempfile.TemporaryDirectory() as directory:
+        # Réglages lus à l'import de app.config : à fixer avant tout import de l'application
+        os.environ.update(
+            DATABASE_URL=f"sqlite:///{os.path.join(directory, 'changes.db')}",
+            SECRET_KEY=os.environ.get("SECRET_KEY", "benchmark"),
+            BCRYPT_ROUNDS="4",
+            DB_INIT_ON_STARTUP="false",
+            METRICS_ENABLED="false",
+        )
+        result = asyncio.run(bench(args))
+    print(json.dumps(dict(result, variables=args.variables), indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,96 @@
+# benchmarks/cold_start.py
+"""
+Mesure du démarrage à froid : de l'import de app.main à la première réponse.
+
+Chaque essai tourne dans un processus Python neuf (comme une instance
+serverless). Le processus enfant importe app.main, exécute les
+gestionnaires de démarrage, puis envoie en mémoire (ASGI) une requête GET /
+et une requête GET /test_db (première connexion à la base).
+
+    python -m benchmarks.cold_start --runs 10
+    python -m benchmarks.cold_start --init-on-startup   # ancien comportement : schéma créé au démarrage
+
+Le résultat est un objet JSON sur la sortie standard.
+"""
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+
+CHILD = r"""
+import asyncio, json, time
+import httpx  # client de mesure : hors chronométrage
+t0 = time.perf_counter()
+import app.main
+t1 = time.perf_counter()
+
+async def first_requests():
+    await app.main.app.router.startup()
+    t2 = time.perf_counter()
+    transport = httpx.ASGITransport(app=app.main.app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://bench") as client:
+        root = await client.get("/")
+        t3 = time.perf_counter()
+        db = await client.get("/test_db")
+        t4 = time.perf_counter()
+    await app.main.app.router.shutdown()
+    return t2, t3, t4, root.status_code, db.status_code
+
+t2, t3, t4, root_status, db_status = asyncio.run(first_requests())
+print(json.dumps({
+    "import_ms": (t1 - t0) * 1000,
+    "startup_ms": (t2 - t1) * 1000,
+    "first_response_ms": (t3 - t0) * 1000,
+    "first_db_response_ms": (t4 - t0) * 1000,
+    "statuses": [root_status, db_status],
+}))
+"""
+
+
+def percentile(values, fraction):
+    values = sorted(values)
+    return values[min(len(values) - 1, int(round(fraction * (len(values) - 1))))]
+
+
+def run(runs: int, init_on_startup: bool) -> dict:
+    root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+    samples = []
+    with tempfile.TemporaryDirectory() as directory:
+        env = dict(
+            os.environ,
+            PYTHONPATH=root,
+            SECRET_KEY=os.environ.get("SECRET_KEY", "benchmark"),
+            DATABASE_URL=f"sqlite:///{os.path.join(directory, 'cold_start.db')}",
+            DB_INIT_ON_STARTUP="true" if init_on_startup else "false",
+        )
+        for _ in range(runs):
+            output = subprocess.run(
+                [sys.executable, "-c", CHILD], env=env, cwd=directory, capture_output=True, text=True, check=True
+            ).stdout
+            samples.append(json.loads(output.strip().splitlines()[-1]))
+
+    report = {"runs": runs, "init_on_startup": init_on_startup, "python": sys.version.split()[0]}
+    for key in ("import_ms", "startup_ms", "first_response_ms", "first_db_response_ms"):
+        values = [sample[key] for sample in samples]
+        report[key] = {
+            "min": round(min(values), 1),
+            "p50": round(statistics.median(values), 1),
+            "p95": round(percentile(values, 0.95), 1),
+        }
+    report["statuses"] = samples[-1]["statuses"]
+    return report
+
+
+def main(argv=None) -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--runs", type=int, default=10, help="Nombre de processus lancés")
+    parser.add_argument("--init-on-startup", action="store_true", help="Créer le schéma au démarrage (DB_INIT_ON_STARTUP)")
+    args = parser.parse_args(argv)
+    print(json.dumps(run(args.runs, args.init_on_startup), indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,532 @@
+# benchmarks/load.py
+"""
+Banc de charge de l'API : débit, latences et requêtes SQL par route.
+
+Une base SQLite locale est remplie (utilisateurs × variables × catégories,
+références {{...}} sur `depth` niveaux avec `fanout` références par
+variable), puis chaque route des routeurs auth, variables, catégories et
+admin est appelée en mémoire (transport ASGI de httpx) par `concurrency`
+clients simultanés. Le tirage des cibles est déterministe (--seed).
+
+    python -m benchmarks.load
+    python -m benchmarks.load --users 20 --variables 500 --depth 4 --fanout 3 --concurrency 16
+    python -m benchmarks.load --routes variables --output results/$(git rev-parse --short HEAD).json
+
+Le résultat (paramètres, commit, mesures par route) est un objet JSON,
+écrit sur la sortie standard et, avec --output, dans un fichier : deux
+exécutions se comparent route par route.
+"""
+import argparse
+import asyncio
+import contextvars
+import datetime
+import json
+import logging
+import os
+import platform
+import random
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from dataclasses import dataclass, field
+from typing import Callable, Dict, List, Optional, Tuple
+
+from benchmarks.cold_start import percentile
+
+PASSWORD = "benchmark-password"
+
+# Compteurs SQL de la requête en cours : [nombre de requêtes, durée en secondes]
+_query_stats: contextvars.ContextVar = contextvars.ContextVar("query_stats", default=None)
+
+
+@dataclass
+class Account:
+    id: int
+    username: str
+    token: str = ""
+    variable_ids: List[int] = field(default_factory=list)
+    identifiers: List[str] = field(default_factory=list)
+    leaf_identifiers: List[str] = field(default_factory=list)
+    category_ids: List[int] = field(default_factory=list)
+
+
+@dataclass
+class State:
+    """
+    Données partagées par les routes : comptes, jetons, objets créés pendant le banc.
+    """
+    rng: random.Random
+    admin: Account
+    accounts: List[Account]
+    created_variables: List[Tuple[Account, int]] = field(default_factory=list)
+    created_categories: List[Tuple[Account, int]] = field(default_factory=list)
+    counter: int = 0
+
+    def account(self) -> Account:
+        return self.rng.choice(self.accounts)
+
+    def unique(self, prefix: str) -> str:
+        self.counter += 1
+        return f"{prefix}-{self.counter}"
+
+
+@dataclass
+class Route:
+    name: str
+    group: str
+    method: str
+    # Construit (chemin, arguments httpx, jeton) pour le i-ème appel ; None : plus rien à faire
+    build: Callable[[State, int], Optional[Tuple[str, dict, str]]]
+    # Nombre maximal d'appels (routes destructrices : un appel par cible)
+    limit: Optional[Callable[[State], int]] = None
+    # Appelé avec la réponse et le compte du jeton utilisé (mémorise les objets créés)
+    after: Optional[Callable[[State, object, Optional[Account]], None]] = None
+
+
+# --- Remplissage de la base -------------------------------------------------
+
+def layers(count: int, depth: int) -> List[int]:
+    """
+    Niveau de chaque variable d'un utilisateur : 0 (valeur simple) à depth (références sur depth niveaux).
+    """
+    return [index * (depth + 1) // count for index in range(count)]
+
+
+def seed(engine, users: int, variables: int, categories: int, depth: int, fanout: int, rng: random.Random):
+    """
+    Remplit la base par insertions groupées ; renvoie (administrateur, comptes, nombre de lignes).
+    """
+    from sqlalchemy import insert
+
+    from app.models import Category, User, Variable
+    from app.passwords import pwd_context
+
+    now = datetime.datetime.utcnow()
+    hashed_password = pwd_context.hash(PASSWORD)
+    admin = Account(id=1, username="bench-admin")
+    accounts = [Account(id=index + 2, username=f"bench-user-{index}") for index in range(users)]
+
+    user_rows = [{"id": admin.id, "username": admin.username, "hashed_password": hashed_password, "is_admin": True}]
+    user_rows += [{"id": a.id, "username": a.username, "hashed_password": hashed_password, "is_admin": False} for a in accounts]
+
+    category_rows, variable_rows = [], []
+    next_category_id, next_variable_id = 1, 1
+    levels = layers(variables, depth) if variables else []
+    for account in accounts:
+        for index in range(categories):
+            account.category_ids.append(next_category_id)
+            category_rows.append({"id": next_category_id, "name": f"{account.username}-c{index}", "owner_id": account.id})
+            next_category_id += 1
+
+        by_level: Dict[int, List[Tuple[int, str]]] = {}
+        for index, level in enumerate(levels):
+            identifier = f"u{account.id}_v{index}"
+            below = by_level.get(level - 1, [])
+            references = rng.sample(below, min(fanout, len(below))) if level else []
+            value = " ".join("{{%s}}" % ref for _, ref in references) if references else f"valeur {index}"
+            variable_rows.append({
+                "id": next_variable_id,
+                "name": f"Variable {index}",
+                "identifier": identifier,
+                "value": value,
+                "category_id": account.category_ids[index % categories] if categories else None,
+                # Le parent est la première référence : chaîne de parents de longueur `depth`
+                "parent_variable_id": references[0][0] if references else None,
+                "owner_id": account.id,
+                "created_at": now,
+                "updated_at": now,
+            })
+            by_level.setdefault(level, []).append((next_variable_id, identifier))
+            account.variable_ids.append(next_variable_id)
+            account.identifiers.append(identifier)
+            if not level:
+                account.leaf_identifiers.append(identifier)
+            next_variable_id += 1
+
+    with engine.begin() as connection:
+        connection.execute(insert(User.__table__), user_rows)
+        for table, rows in ((Category.__table__, category_rows), (Variable.__table__, variable_rows)):
+            for start in range(0, len(rows), 5000):
+                connection.execute(insert(table), rows[start:start + 5000])
+    return admin, accounts, len(user_rows) + len(category_rows) + len(variable_rows)
+
+
+# --- Routes mesurées ---------------------------------------------------------
+
+A = "/api/v1/auth"
+V = "/api/v1/variables"
+C = "/api/v1/categories"
+M = "/api/v1/admin/categories"
+
+
+def _user(state: State) -> Account:
+    return state.account()
+
+
+def _own_variable(state: State) -> Tuple[Account, int]:
+    account = state.account()
+    return account, state.rng.choice(account.variable_ids)
+
+
+def _remember(kind: str):
+    def after(state: State, response, account: Optional[Account]) -> None:
+        if response.status_code == 200:
+            getattr(state, kind).append((account, response.json()["id"]))
+    return after
+
+
+def _take(state: State, kind: str) -> Optional[Tuple[Account, int]]:
+    created = getattr(state, kind)
+    return created.pop(0) if created else None
+
+
+def routes(page_size: int, batch: int) -> List[Route]:
+    """
+    Routes mesurées, dans l'ordre d'exécution : lectures, écritures, puis opérations d'administration destructrices.
+    """
+    def login(state, i):
+        account = _user(state)
+        return A + "/token", {"data": {"username": account.username, "password": PASSWORD}}, None
+
+    def create_user(state, i):
+        return A + "/users/", {"json": {"username": state.unique("bench-signup"), "password": PASSWORD}}, None
+
+    def me(state, i):
+        return A + "/users/me/", {}, _user(state).token
+
+    def list_variables(state, i):
+        return V + "/variables/", {"params": {"limit": page_size}}, _user(state).token
+
+    def read_variable(state, i):
+        account, variable_id = _own_variable(state)
+        return V + f"/variables/{variable_id}", {}, account.token
+
+    def read_resolved(state, i):
+        account, variable_id = _own_variable(state)
+        return V + f"/variables/{variable_id}/resolved", {}, account.token
+
+    def read_by_identifier(state, i):
+        account = _user(state)
+        return V + f"/variables/by-identifier/{state.rng.choice(account.identifiers)}/resolved", {}, account.token
+
+    def resolve(state, i):
+        account = _user(state)
+        identifiers = state.rng.sample(account.identifiers, min(batch, len(account.identifiers)))
+        return V + "/resolve", {"json": {"identifiers": identifiers}}, account.token
+
+    def render(state, i):
+        account = _user(state)
+        identifiers = state.rng.sample(account.identifiers, min(batch, len(account.identifiers)))
+        body = "\n".join("Ligne %d : {{%s}}" % (n, identifier) for n, identifier in enumerate(identifiers))
+        return V + "/render", {"content": body, "headers": {"content-type": "text/plain; charset=utf-8"}}, account.token
+
+    def export(state, i):
+        return V + "/export", {"params": {"resolved": "true"}}, _user(state).token
+
+    def import_variables(state, i):
+        account = _user(state)
+        identifiers = state.rng.sample(account.leaf_identifiers, min(batch, len(account.leaf_identifiers)))
+        lines = [json.dumps({"identifier": identifier, "name": identifier, "value": f"importé {i}"}) for identifier in identifiers]
+        return V + "/import", {"files": {"file": ("variables.ndjson", "\n".join(lines).encode())}}, account.token
+
+    def create_variable(state, i):
+        account = _user(state)
+        reference = state.rng.choice(account.identifiers)
+        return V + "/variables/", {"json": {
+            "name": "Créée", "identifier": state.unique(f"u{account.id}_new"), "value": "{{%s}} !" % reference,
+        }}, account.token
+
+    def update_variable(state, i):
+        created = state.created_variables[i % len(state.created_variables)] if state.created_variables else None
+        if created is None:
+            return None
+        account, variable_id = created
+        return V + f"/variables/{variable_id}", {"json": {"value": f"modifiée {i}"}}, account.token
+
+    def delete_variable(state, i):
+        created = _take(state, "created_variables")
+        if created is None:
+            return None
+        account, variable_id = created
+        return V + f"/variables/{variable_id}", {}, account.token
+
+    def list_categories(state, i):
+        return C + "/", {"params": {"limit": page_size}}, _user(state).token
+
+    def read_category(state, i):
+        account = _user(state)
+        if not account.category_ids:
+            return None
+        return C + f"/{state.rng.choice(account.category_ids)}", {}, account.token
+
+    def export_categories(state, i):
+        return C + "/export", {}, _user(state).token
+
+    def create_category(state, i):
+        account = _user(state)
+        return C + "/", {"json": {"name": state.unique(f"{account.username}-new")}}, account.token
+
+    def update_category(state, i):
+        created = state.created_categories[i % len(state.created_categories)] if state.created_categories else None
+        if created is None:
+            return None
+        account, category_id = created
+        return C + f"/{category_id}", {"json": {"name": state.unique(f"{account.username}-renamed")}}, account.token
+
+    def delete_category(state, i):
+        created = _take(state, "created_categories")
+        if created is None:
+            return None
+        account, category_id = created
+        return C + f"/categories/{category_id}", {"params": {"action": "delete"}}, account.token
+
+    def admin_user_variables(state, i):
+        return V + f"/users/{_user(state).id}/variables/", {"params": {"limit": page_size}}, state.admin.token
+
+    def admin_user_categories(state, i):
+        return M + f"/users/{_user(state).id}/categories/", {"params": {"limit": page_size}}, state.admin.token
+
+    def admin_bulk_users(state, i):
+        users = [{"username": state.unique("bench-bulk"), "password": PASSWORD} for _ in range(batch)]
+        return M + "/users/bulk", {"json": {"users": users}}, state.admin.token
+
+    def admin_status(state, i):
+        # Révoque les jetons de l'utilisateur : exécuté après toutes les routes des utilisateurs
+        return M + f"/users/{state.accounts[i].id}/status", {"json": {"is_active": True}}, state.admin.token
+
+    def admin_delete_variables(state, i):
+        return V + f"/users/{state.accounts[i].id}/variables/", {}, state.admin.token
+
+    def admin_delete_categories(state, i):
+        return M + f"/users/{state.accounts[i].id}/categories/", {}, state.admin.token
+
+    one_per_user = lambda state: len(state.accounts)  # noqa: E731
+    return [
+        Route("POST /auth/token", "auth", "POST", login),
+        Route("POST /auth/users/", "auth", "POST", create_user),
+        Route("GET /auth/users/me/", "auth", "GET", me),
+        Route("GET /variables/variables/", "variables", "GET", list_variables),
+        Route("GET /variables/variables/{id}", "variables", "GET", read_variable),
+        Route("GET /variables/variables/{id}/resolved", "variables", "GET", read_resolved),
+        Route("GET /variables/variables/by-identifier/{identifier}/resolved", "variables", "GET", read_by_identifier),
+        Route("POST /variables/resolve", "variables", "POST", resolve),
+        Route("POST /variables/render", "variables", "POST", render),
+        Route("GET /variables/export", "variables", "GET", export),
+        Route("POST /variables/import", "variables", "POST", import_variables),
+        Route("POST /variables/variables/", "variables", "POST", create_variable, after=_remember("created_variables")),
+        Route("PUT /variables/variables/{id}", "variables", "PUT", update_variable),
+        Route("DELETE /variables/variables/{id}", "variables", "DELETE", delete_variable),
+        Route("GET /categories/", "categories", "GET", list_categories),
+        Route("GET /categories/{id}", "categories", "GET", read_category),
+        Route("GET /categories/export", "categories", "GET", export_categories),
+        Route("POST /categories/", "categories", "POST", create_category, after=_remember("created_categories")),
+        Route("PUT /categories/{id}", "categories", "PUT", update_category),
+        Route("DELETE /categories/categories/{id}", "categories", "DELETE", delete_category),
+        Route("GET /variables/users/{id}/variables/", "admin", "GET", admin_user_variables),
+        Route("GET /admin/categories/users/{id}/categories/", "admin", "GET", admin_user_categories),
+        Route("POST /admin/categories/users/bulk", "admin", "POST", admin_bulk_users),
+        Route("PUT /admin/categories/users/{id}/status", "admin", "PUT", admin_status, limit=one_per_user),
+        Route("DELETE /variables/users/{id}/variables/", "admin", "DELETE", admin_delete_variables, limit=one_per_user),
+        Route("DELETE /admin/categories/users/{id}/categories/", "admin", "DELETE", admin_delete_categories, limit=one_per_user),
+    ]
+
+
+# --- Mesure -------------------------------------------------------------------
+
+def count_queries() -> None:
+    """
+    Compte les requêtes SQL et leur durée pour la requête HTTP en cours (tous moteurs).
+    """
+    from sqlalchemy import event
+    from sqlalchemy.engine import Engine
+
+    @event.listens_for(Engine, "before_cursor_execute")
+    def before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+        conn.info.setdefault("bench_query_start", []).append(time.perf_counter())
+
+    @event.listens_for(Engine, "after_cursor_execute")
+    def after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+        started = conn.info["bench_query_start"].pop()
+        stats = _query_stats.get()
+        if stats is not None:
+            stats[0] += 1
+            stats[1] += time.perf_counter() - started
+
+
+async def measure(client, state: State, route: Route, requests: int, concurrency: int) -> dict:
+    if route.limit is not None:
+        requests = min(requests, route.limit(state))
+    latencies: List[float] = []
+    queries: List[int] = []
+    query_seconds: List[float] = []
+    statuses: Dict[str, int] = {}
+    calls = iter(range(requests))
+
+    async def worker() -> None:
+        for i in calls:
+            built = route.build(state, i)
+            if built is None:
+                return
+            url, kwargs, token = built
+            headers = dict(kwargs.pop("headers", {}))
+            if token:
+                headers["Authorization"] = f"Bearer {token}"
+            stats = [0, 0.0]
+            _query_stats.set(stats)
+            started = time.perf_counter()
+            response = await client.request(route.method, url, headers=headers, **kwargs)
+            await response.aread()
+            latencies.append(time.perf_counter() - started)
+            _query_stats.set(None)
+            queries.append(stats[0])
+            query_seconds.append(stats[1])
+            statuses[str(response.status_code)] = statuses.get(str(response.status_code), 0) + 1
+            if route.after is not None:
+                route.after(state, response, _owner(state, token))
+
+    started = time.perf_counter()
+    await asyncio.gather(*(worker() for _ in range(concurrency)))
+    elapsed = time.perf_counter() - started
+    if not latencies:
+        return {"group": route.group, "requests": 0, "statuses": {}}
+
+    milliseconds = [latency * 1000 for latency in latencies]
+    return {
+        "group": route.group,
+        "requests": len(latencies),
+        "errors": sum(count for code, count in statuses.items() if not code.startswith("2")),
+        "statuses": statuses,
+        "throughput_rps": round(len(latencies) / elapsed, 1),
+        "latency_ms": {
+            "mean": round(statistics.fmean(milliseconds), 2),
+            "p50": round(percentile(milliseconds, 0.50), 2),
+            "p95": round(percentile(milliseconds, 0.95), 2),
+            "p99": round(percentile(milliseconds, 0.99), 2),
+            "max": round(max(milliseconds), 2),
+        },
+        "queries_per_request": round(statistics.fmean(queries), 2),
+        "db_ms_per_request": round(statistics.fmean(query_seconds) * 1000, 2),
+    }
+
+
+def _owner(state: State, token: str) -> Optional[Account]:
+    for account in state.accounts:
+        if account.token == token:
+            return account
+    return None
+
+
+def git_revision() -> Dict[str, object]:
+    root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+    try:
+        commit = subprocess.run(["git", "rev-parse", "HEAD"], cwd=root, capture_output=True, text=True, check=True).stdout.strip()
+        dirty = bool(subprocess.run(["git", "status", "--porcelain", "--untracked-files=no"], cwd=root, capture_output=True, text=True).stdout.strip())
+    except (OSError, subprocess.CalledProcessError):
+        return {"commit": None, "dirty": None}
+    return {"commit": commit, "dirty": dirty}
+
+
+async def bench(args: argparse.Namespace) -> dict:
+    import httpx
+    import sqlalchemy
+
+    from app.auth import create_access_token
+    from app.database import dispose_engines, get_engine
+    from app.initial_data import upgrade_schema
+    import app.main
+
+    # Journal applicatif et client : une ligne par requête fausserait la mesure
+    logging.getLogger().setLevel(logging.WARNING)
+    logging.getLogger("httpx").setLevel(logging.WARNING)
+
+    engine = get_engine()
+    upgrade_schema(engine)
+    rng = random.Random(args.seed)
+    started = time.perf_counter()
+    admin, accounts, rows = seed(engine, args.users, args.variables, args.categories, args.depth, args.fanout, rng)
+    seed_seconds = time.perf_counter() - started
+    for account, is_admin in [(admin, True)] + [(account, False) for account in accounts]:
+        account.token = create_access_token({
+            "sub": account.username, "user_id": account.id, "is_admin": is_admin, "is_active": True, "version": 0,
+        })
+
+    state = State(rng=rng, admin=admin, accounts=accounts)
+    selected = [route for route in routes(args.page_size, args.batch) if _selected(route, args.routes)]
+    count_queries()
+    results = {}
+    await app.main.app.router.startup()
+    try:
+        transport = httpx.ASGITransport(app=app.main.app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://bench", timeout=None) as client:
+            for route in selected:
+                if args.warmup and route.limit is None:
+                    await measure(client, state, route, args.warmup, args.concurrency)
+                results[route.name] = await measure(client, state, route, args.requests, args.concurrency)
+                print(f"{route.name}: {results[route.name].get('throughput_rps')} req/s", file=sys.stderr)
+    finally:
+        await app.main.app.router.shutdown()
+        await dispose_engines()
+
+    return {
+        "meta": dict(
+            git_revision(),
+            date=datetime.datetime.now(datetime.timezone.utc).isoformat(timespec="seconds"),
+            python=platform.python_version(),
+            sqlalchemy=sqlalchemy.__version__,
+            cpus=os.cpu_count(),
+            db_async=os.environ["DB_ASYNC"] == "true",
+        ),
+        "parameters": {key: value for key, value in vars(args).items() if key not in ("output", "database")},
+        "seed": {"rows": rows, "seconds": round(seed_seconds, 2)},
+        "routes": results,
+    }
+
+
+def _selected(route: Route, filters: Optional[List[str]]) -> bool:
+    return not filters or any(name == route.group or name in route.name for name in filters)
+
+
+def main(argv=None) -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--users", type=int, default=10, help="Nombre d'utilisateurs")
+    parser.add_argument("--variables", type=int, default=200, help="Variables par utilisateur")
+    parser.add_argument("--categories", type=int, default=5, help="Catégories par utilisateur")
+    parser.add_argument("--depth", type=int, default=3, help="Profondeur des références {{...}}")
+    parser.add_argument("--fanout", type=int, default=2, help="Références par variable")
+    parser.add_argument("--concurrency", type=int, default=8, help="Clients simultanés")
+    parser.add_argument("--requests", type=int, default=200, help="Appels mesurés par route")
+    parser.add_argument("--warmup", type=int, default=20, help="Appels non mesurés avant chaque route")
+    parser.add_argument("--page-size", type=int, default=100, help="Taille de page des listes")
+    parser.add_argument("--batch", type=int, default=10, help="Éléments par appel groupé (resolve, render, import, bulk)")
+    parser.add_argument("--routes", nargs="*", help="Groupes (auth, variables, categories, admin) ou fragments de nom de route")
+    parser.add_argument("--seed", type=int, default=0, help="Graine du tirage des cibles et des références")
+    parser.add_argument("--sync-db", action="store_true", help="Sessions synchrones (DB_ASYNC=false)")
+    parser.add_argument("--bcrypt-rounds", type=int, default=4, help="Coût bcrypt (domine la route de connexion)")
+    parser.add_argument("--database", help="Fichier SQLite à utiliser (temporaire par défaut, doit être vide)")
+    parser.add_argument("--output", help="Fichier JSON de résultats")
+    args = parser.parse_args(argv)
+
+    with tempfile.TemporaryDirectory() as directory:
+        database = args.database or os.path.join(directory, "load.db")
+        # Réglages lus à l'import de app.config : à fixer avant tout import de l'application
+        os.environ.update(
+            DATABASE_URL=f"sqlite:///{database}",
+            DB_ASYNC="false" if args.sync_db else "true",
+            SECRET_KEY=os.environ.get("SECRET_KEY", "benchmark"),
+            BCRYPT_ROUNDS=str(args.bcrypt_rounds),
+            DB_INIT_ON_STARTUP="false",
+        )
+        report = asyncio.run(bench(args))
+
+    output = json.dumps(report, indent=2, ensure_ascii=False)
+    if args.output:
+        os.makedirs(os.path.dirname(os.path.abspath(args.output)), exist_ok=True)
+        with open(args.output, "w", encoding="utf-8") as f:
+            f.write(output + "\n")
+    print(output)
+
+
+if __name__ == "__main__":
+    main()
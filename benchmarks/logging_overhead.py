@@ -0,0 +1,156 @@
+# benchmarks/logging_overhead.py
+"""
+Coût de la journalisation par requête, selon la configuration de app.logs.
+
+Les requêtes GET / sont envoyées en mémoire (ASGI) à l'application ; chaque
+requête produit `--lines` messages INFO (une ligne d'accès uvicorn.access,
+puis des messages applicatifs avec arguments et extra), comme en production
+derrière `python -m app serve`. Les messages sont écrits dans une sortie
+lente (`--sink-delay-ms` par écriture : terminal, tube vers un collecteur
+saturé). Scénarios :
+- none : journalisation désactivée (référence) ;
+- sync_text : ancien comportement (basicConfig), écriture dans la requête ;
+- sync_json : lignes JSON, écriture dans la requête ;
+- queue_json : lignes JSON écrites par le thread du QueueListener ;
+- queue_json_sampled : idem, 10 % des lignes d'accès conservées.
+
+Pour chacun : latence p50 / p99, surcoût par rapport à none, lignes
+écrites et messages abandonnés (file pleine).
+
+    python -m benchmarks.logging_overhead --requests 2000 --sink-delay-ms 0.2
+
+Le résultat est un objet JSON sur la sortie standard.
+"""
+import argparse
+import asyncio
+import json
+import os
+import sys
+import tempfile
+import time
+
+from benchmarks.cold_start import percentile
+
+
+class SlowSink:
+    """
+    Sortie texte dont chaque écriture prend `delay` secondes.
+    """
+
+    def __init__(self, delay: float):
+        self.delay = delay
+        self.lines = 0
+
+    def write(self, data: str) -> int:
+        if self.delay:
+            time.sleep(self.delay)
+        self.lines += data.count("\n")
+        return len(data)
+
+    def flush(self) -> None:
+        pass
+
+
+def access_logging(application, lines: int):
+    import logging
+
+    access = logging.getLogger("uvicorn.access")
+    logger = logging.getLogger("app.bench")
+
+    async def logged_app(scope, receive, send):
+        status = {}
+
+        async def send_wrapper(message):
+            if message["type"] == "http.response.start":
+                status["code"] = message["status"]
+            await send(message)
+
+        started = time.perf_counter()
+        await application(scope, receive, send_wrapper)
+        for index in range(lines - 1):
+            logger.info("Étape %d de %s %s", index, scope["method"], scope["path"], extra={"elapsed_ms": (time.perf_counter() - started) * 1000})
+        access.info('%s - "%s %s HTTP/%s" %d', scope["client"][0], scope["method"], scope["path"], scope["http_version"], status.get("code", 0))
+
+    return logged_app
+
+
+async def bench(args: argparse.Namespace) -> dict:
+    import logging
+
+    import httpx
+
+    from app import logs
+    from app.database import dispose_engines
+    import app.main
+
+    logging.getLogger("httpx").setLevel(logging.WARNING)
+    application = access_logging(app.main.app, args.lines)
+
+    scenarios = {
+        "none": None,
+        "sync_text": dict(fmt="text", queue_size=0),
+        "sync_json": dict(fmt="json", queue_size=0),
+        "queue_json": dict(fmt="json", queue_size=args.queue_size),
+        "queue_json_sampled": dict(fmt="json", queue_size=args.queue_size, sampling={"uvicorn.access": 0.1}),
+    }
+    report = {}
+    async with httpx.AsyncClient(transport=httpx.ASGITransport(app=application), base_url="http://bench", timeout=None) as client:
+        for name, options in scenarios.items():
+            sink = SlowSink(args.sink_delay_ms / 1000)
+            if options is None:
+                logs.shutdown_logging()
+                logging.getLogger().setLevel(logging.WARNING)
+            else:
+                logs.configure_logging(level="INFO", levels={}, stream=sink, force=True, **dict({"sampling": {}}, **options))
+            # Connexion et chemins chauds avant les mesures
+            for _ in range(20):
+                await client.get("/")
+
+            latencies = []
+            for _ in range(args.requests):
+                started = time.perf_counter()
+                response = await client.get("/")
+                response.raise_for_status()
+                latencies.append((time.perf_counter() - started) * 1000)
+            dropped = logs.dropped_records()
+            flush_started = time.perf_counter()
+            logs.shutdown_logging()
+            report[name] = {
+                "p50_ms": round(percentile(latencies, 0.5), 3),
+                "p99_ms": round(percentile(latencies, 0.99), 3),
+                "lines_written": sink.lines,
+                "dropped": dropped,
+                "flush_ms": round((time.perf_counter() - flush_started) * 1000, 1),
+            }
+            print(f"{name}: {report[name]}", file=sys.stderr)
+
+    for name, result in report.items():
+        result["p50_overhead_ms"] = round(result["p50_ms"] - report["none"]["p50_ms"], 3)
+        result["p99_overhead_ms"] = round(result["p99_ms"] - report["none"]["p99_ms"], 3)
+    await dispose_engines()
+    return report
+
+
+def main(argv=None) -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--requests", type=int, default=2000, help="Requêtes mesurées par scénario")
+    parser.add_argument("--lines", type=int, default=3, help="Messages INFO par requête")
+    parser.add_argument("--sink-delay-ms", type=float, default=0.2, help="Durée d'une écriture dans la sortie")
+    parser.add_argument("--queue-size", type=int, default=10000, help="Taille de la file (LOG_QUEUE_SIZE)")
+    args = parser.parse_args(argv)
+
+    with tempfile.TemporaryDirectory() as directory:
+        # Réglages lus à l'import de app.config : à fixer avant tout import de l'application
+        os.environ.update(
+            DATABASE_URL=f"sqlite:///{os.path.join(directory, 'logging.db')}",
+            SECRET_KEY=os.environ.get("SECRET_KEY", "benchmark"),
+            DB_INIT_ON_STARTUP="false",
+            METRICS_ENABLED="false",
+            ADMISSION_ENABLED="false",
+        )
+        result = asyncio.run(bench(args))
+    print(json.dumps(dict(result, requests=args.requests, lines=args.lines, sink_delay_ms=args.sink_delay_ms), indent=2))
+
+
+if __name__ == "__main__":
+    main()
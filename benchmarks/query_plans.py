@@ -0,0 +1,210 @@
+# benchmarks/query_plans.py
+"""
+Vérification des plans d'exécution SQLite des requêtes de chaque route.
+
+Une base temporaire est créée par les migrations Alembic, puis chaque route
+est appelée en mémoire (ASGI) avec un vrai jeton. Toutes les requêtes SQL
+émises sont enregistrées, puis rejouées sous EXPLAIN QUERY PLAN : un
+« SCAN <table> » sans index (parcours complet de table) est une erreur.
+
+    python -m benchmarks.query_plans
+    python -m benchmarks.query_plans --verbose   # plans de toutes les requêtes
+    python -m benchmarks.query_plans --revision 0002   # schéma d'une révision antérieure
+
+Le rapport est un objet JSON sur la sortie standard ; le code de sortie
+vaut 1 si un parcours complet a été trouvé.
+"""
+import argparse
+import asyncio
+import json
+import os
+import re
+import sqlite3
+import sys
+import tempfile
+
+SCAN = re.compile(r"^SCAN (?P<table>\S+)(?P<rest>.*)$")
+# Table virtuelle FTS5 interrogée par MATCH (idxStr commençant par M) : recherche dans l'index
+FTS_MATCH = re.compile(r"VIRTUAL TABLE INDEX \d+:M")
+EXPLAINED = ("SELECT", "UPDATE", "DELETE", "WITH")
+
+ADMIN = ("admin", "admin-password")
+USER = ("alice", "alice-password")
+
+
+def full_scans(plan):
+    """
+    Lignes d'un plan qui parcourent une table entière (ni index, ni sous-requête).
+    """
+    scans = []
+    for detail in plan:
+        match = SCAN.match(detail)
+        if match is None or match["table"].startswith("(") or match["table"] == "CONSTANT":
+            continue
+        if "USING" not in match["rest"] and not FTS_MATCH.search(match["rest"]):
+            scans.append(detail)
+    return scans
+
+
+def scenario(admin_id, user_id):
+    """
+    Appels (méthode, chemin, arguments httpx, jeton) couvrant toutes les routes.
+    """
+    A = "/api/v1/auth"
+    V = "/api/v1/variables"
+    C = "/api/v1/categories"
+    M = "/api/v1/admin/categories"
+    return [
+        ("GET", A + "/users/me/", {}, "user"),
+        ("POST", C + "/", {"json": {"name": "contrat"}}, "user"),
+        ("POST", C + "/", {"json": {"name": "courrier"}}, "user"),
+        ("GET", C + "/", {"params": {"limit": 1}}, "user"),
+        ("GET", C + "/1", {}, "user"),
+        ("PUT", C + "/1", {"json": {"name": "contrats"}}, "user"),
+        ("GET", C + "/export", {}, "user"),
+        ("GET", C + "/export", {}, "admin"),
+        ("POST", V + "/variables/", {"json": {"name": "Société", "identifier": "societe", "value": "ACME", "category_id": 1}}, "user"),
+        ("POST", V + "/variables/", {"json": {"name": "Ville", "identifier": "ville", "value": "{{societe}} Paris", "parent_variable_id": 1}}, "user"),
+        ("POST", V + "/variables/", {"json": {"name": "Adresse", "identifier": "adresse", "value": "{{ville}}", "parent_variable_id": 2, "category_id": 2}}, "user"),
+        ("POST", V + "/import", {"files": {"file": ("v.ndjson", b'{"identifier": "pays", "name": "Pays", "value": "France", "parent": "ville"}\n')}}, "user"),
+        ("GET", V + "/variables/", {"params": {"limit": 2}}, "user"),
+        ("GET", V + "/variables/", {"params": {"expand": "parent_variable,category", "fields": "identifier,value"}}, "user"),
+        ("GET", V + "/variables/search", {"params": {"q": "pari"}}, "user"),
+        ("GET", V + "/variables/search", {"params": {"q": "acme"}}, "admin"),
+        ("GET", V + "/variables/3", {}, "user"),
+        ("GET", V + "/variables/3/resolved", {}, "user"),
+        ("GET", V + "/variables/by-identifier/adresse/resolved", {}, "user"),
+        ("PUT", V + "/variables/1", {"json": {"value": "ACME SA"}}, "user"),
+        ("POST", V + "/resolve", {"json": {"identifiers": ["adresse", "inconnu"], "ids": [2]}}, "user"),
+        ("POST", V + "/render", {"content": "Bonjour {{adresse}} / {{pays}}", "headers": {"content-type": "text/plain"}}, "user"),
+        ("GET", V + "/export", {"params": {"resolved": "true"}}, "user"),
+        ("GET", V + "/export", {}, "admin"),
+        ("POST", "/api/v1/bundles/users/" + str(user_id), {}, "user"),
+        ("POST", "/api/v1/bundles/categories/1", {}, "user"),
+        ("POST", "/api/v1/bundles/categories/1", {}, "user"),
+        ("DELETE", V + "/variables/4", {}, "user"),
+        ("GET", V + f"/users/{user_id}/variables/", {}, "admin"),
+        ("GET", M + f"/users/{user_id}/categories/", {}, "admin"),
+        ("GET", M + f"/users/{user_id}/categories/", {"params": {"expand": "variables"}}, "admin"),
+        ("DELETE", C + "/categories/2", {"params": {"action": "reassign", "new_category_id": 1}}, "user"),
+        ("DELETE", C + "/categories/1", {"params": {"action": "delete"}}, "user"),
+        ("GET", C + f"/users/{user_id}/categories/", {}, "admin"),
+        ("POST", M + "/users/bulk", {"json": {"users": [{"username": "bob", "password": "bob-password"}]}}, "admin"),
+        ("PUT", M + f"/users/{user_id}/status", {"json": {"is_admin": False}}, "admin"),
+        ("DELETE", V + f"/users/{user_id}/variables/", {}, "admin"),
+        ("DELETE", M + f"/users/{user_id}/categories/", {}, "admin"),
+        ("DELETE", C + f"/users/{user_id}/categories/", {}, "admin"),
+    ]
+
+
+async def record_queries(revision):
+    """
+    Appelle chaque route et renvoie [(route, statut, sql, paramètres)].
+    """
+    import httpx
+    from sqlalchemy import event
+    from sqlalchemy.engine import Engine
+
+    from app.database import dispose_engines, get_engine
+    from app.initial_data import init_db
+    import app.main
+
+    init_db(get_engine(), revision)
+
+    current = {"route": "authentification"}
+    queries = []
+
+    def before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+        if executemany and parameters:
+            parameters = parameters[0]
+        queries.append([current["route"], None, statement, parameters])
+
+    event.listen(Engine, "before_cursor_execute", before_cursor_execute)
+    try:
+        await app.main.app.router.startup()
+        transport = httpx.ASGITransport(app=app.main.app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://plans") as client:
+            response = await client.post("/api/v1/auth/users/", json={"username": USER[0], "password": USER[1]})
+            user_id = response.json()["id"]
+            tokens = {}
+            for name, (username, password) in (("admin", ADMIN), ("user", USER)):
+                response = await client.post("/api/v1/auth/token", data={"username": username, "password": password})
+                tokens[name] = response.json()["access_token"]
+            admin_id = (await client.get("/api/v1/auth/users/me/", headers={"Authorization": f"Bearer {tokens['admin']}"})).json()["id"]
+
+            for method, url, kwargs, who in scenario(admin_id, user_id):
+                current["route"] = f"{method} {url}"
+                first = len(queries)
+                headers = dict(kwargs.pop("headers", {}), Authorization=f"Bearer {tokens[who]}")
+                response = await client.request(method, url, headers=headers, **kwargs)
+                for query in queries[first:]:
+                    query[1] = response.status_code
+                if response.status_code >= 400:
+                    print(f"{method} {url}: {response.status_code} {response.text}", file=sys.stderr)
+        await app.main.app.router.shutdown()
+    finally:
+        event.remove(Engine, "before_cursor_execute", before_cursor_execute)
+        await dispose_engines()
+    return queries
+
+
+def explain(database_path, queries):
+    connection = sqlite3.connect(database_path)
+    try:
+        results = []
+        for route, status_code, statement, parameters in queries:
+            if not statement.lstrip().upper().startswith(EXPLAINED) or statement.strip() == "SELECT 1":
+                continue
+            plan = [row[3] for row in connection.execute("EXPLAIN QUERY PLAN " + statement, parameters or ())]
+            results.append({
+                "route": route,
+                "status": status_code,
+                "sql": " ".join(statement.split()),
+                "plan": plan,
+                "full_scans": full_scans(plan),
+            })
+        return results
+    finally:
+        connection.close()
+
+
+def run(revision: str = "head", verbose: bool = False) -> dict:
+    with tempfile.TemporaryDirectory() as directory:
+        database_path = os.path.join(directory, "query_plans.db")
+        # Réglages lus à l'import de app.config : à fixer avant tout import de l'application
+        os.environ.update(
+            DATABASE_URL=f"sqlite:///{database_path}",
+            SECRET_KEY=os.environ.get("SECRET_KEY", "query-plans"),
+            FIRST_SUPERUSER=ADMIN[0],
+            FIRST_SUPERUSER_PASSWORD=ADMIN[1],
+            BCRYPT_ROUNDS="4",
+            DB_INIT_ON_STARTUP="false",
+        )
+        queries = asyncio.run(record_queries(revision))
+        results = explain(database_path, queries)
+
+    failures = [result for result in results if result["full_scans"]]
+    report = {
+        "revision": revision,
+        "routes": len({result["route"] for result in results}),
+        "statements": len(results),
+        "distinct_statements": len({result["sql"] for result in results}),
+        "full_scans": failures,
+    }
+    if verbose:
+        report["plans"] = results
+    return report
+
+
+def main(argv=None) -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--verbose", action="store_true", help="Inclure le plan de chaque requête")
+    parser.add_argument("--revision", default="head", help="Révision Alembic du schéma vérifié")
+    args = parser.parse_args(argv)
+    report = run(args.revision, args.verbose)
+    print(json.dumps(report, indent=2, ensure_ascii=False))
+    sys.exit(1 if report["full_scans"] else 0)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,113 @@
+# benchmarks/search.py
+"""
+Recherche plein texte (GET /variables/variables/search) sur une grande base.
+
+Une base temporaire reçoit `--users` × `--variables` variables (comme
+benchmarks.load : "Variable <n>", identifiants u<user>_v<n>, valeurs
+« valeur <n> » ou références) ; l'index FTS5 est alimenté par les triggers
+de la migration 0004 pendant l'insertion. Chaque requête est chronométrée
+au niveau SQL (recherche dans l'index seule) et à travers l'application.
+
+    python -m benchmarks.search --users 100 --variables 10000
+
+Le résultat est un objet JSON sur la sortie standard.
+"""
+import argparse
+import asyncio
+import json
+import os
+import statistics
+import sys
+import tempfile
+import time
+
+# (libellé, requête q) ; {user} est remplacé par l'id de l'utilisateur interrogé
+QUERIES = (
+    ("identifier prefix", "u{user}_v12"),
+    ("identifier exact", "u{user}_v4321"),
+    ("short prefix", "va"),
+    ("word in every row", "variable"),
+    ("two words", "valeur 77"),
+    ("no match", "introuvable"),
+)
+
+
+async def bench(args: argparse.Namespace) -> dict:
+    import logging
+    import random
+
+    import httpx
+
+    from app.auth import create_access_token
+    from app.database import dispose_engines, get_engine
+    from app.initial_data import upgrade_schema
+    from app.search import search_statement, search_terms
+    import app.main
+    from benchmarks.load import seed
+
+    logging.getLogger().setLevel(logging.WARNING)
+    logging.getLogger("httpx").setLevel(logging.WARNING)
+
+    engine = get_engine()
+    upgrade_schema(engine)
+    started = time.perf_counter()
+    admin, accounts, rows = seed(engine, args.users, args.variables, 0, depth=3, fanout=2, rng=random.Random(0))
+    seed_seconds = time.perf_counter() - started
+    user = accounts[len(accounts) // 2]
+    token = create_access_token({"sub": user.username, "user_id": user.id, "is_admin": False, "is_active": True, "version": 0})
+
+    report = {}
+    transport = httpx.ASGITransport(app=app.main.app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://bench", timeout=None) as client:
+        for label, template in QUERIES:
+            q = template.format(user=user.id)
+            statement = search_statement(search_terms(q), user.id, args.limit)
+            sql_timings, http_timings = [], []
+            with engine.connect() as connection:
+                compiled = statement.compile(engine)
+                parameters = tuple(compiled.params[name] for name in compiled.positiontup)
+                plan = [row[3] for row in connection.exec_driver_sql("EXPLAIN QUERY PLAN " + str(compiled), parameters)]
+                for _ in range(args.runs):
+                    started = time.perf_counter()
+                    connection.execute(statement).all()
+                    sql_timings.append((time.perf_counter() - started) * 1000)
+            for _ in range(args.runs):
+                started = time.perf_counter()
+                response = await client.get("/api/v1/variables/variables/search", params={"q": q, "limit": args.limit}, headers={"Authorization": f"Bearer {token}"})
+                http_timings.append((time.perf_counter() - started) * 1000)
+                response.raise_for_status()
+            report[label] = {
+                "q": q,
+                "results": len(response.json()),
+                "plan": plan,
+                "sql_ms": round(statistics.median(sql_timings), 2),
+                "http_ms": round(statistics.median(http_timings), 2),
+            }
+            print(f"{label}: {report[label]['sql_ms']} ms SQL, {report[label]['http_ms']} ms HTTP", file=sys.stderr)
+    await dispose_engines()
+    return {"rows": rows, "seed_seconds": round(seed_seconds, 1), "queries": report}
+
+
+def main(argv=None) -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--users", type=int, default=100, help="Utilisateurs")
+    parser.add_argument("--variables", type=int, default=10000, help="Variables par utilisateur")
+    parser.add_argument("--limit", type=int, default=20, help="Résultats par recherche")
+    parser.add_argument("--runs", type=int, default=20, help="Mesures par requête (médiane)")
+    args = parser.parse_args(argv)
+
+    with tempfile.TemporaryDirectory() as directory:
+        # Réglages lus à l'import de app.config : à fixer avant tout import de l'application
+        os.environ.update(
+            DATABASE_URL=f"sqlite:///{os.path.join(directory, 'search.db')}",
+            SECRET_KEY=os.environ.get("SECRET_KEY", "benchmark"),
+            BCRYPT_ROUNDS="4",
+            DB_INIT_ON_STARTUP="false",
+            METRICS_ENABLED="false",
+        )
+        result = asyncio.run(bench(args))
+    print(json.dumps(dict(result, users=args.users, variables_per_user=args.variables), indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,109 @@
+# benchmarks/serialization.py
+"""
+Sérialisation des grandes listes : response_model (pydantic + json) contre
+le chemin rapide FAST_SERIALIZATION (lignes SQL + orjson).
+
+Une base temporaire reçoit `--rows` variables (références et chaînes de
+parents comme benchmarks.load) et autant de catégories pour un utilisateur ;
+chaque liste est demandée en une page, dans les deux modes, et les corps
+et ETag sont comparés octet par octet.
+
+    python -m benchmarks.serialization --rows 10000 --runs 5
+
+Le résultat est un objet JSON sur la sortie standard.
+"""
+import argparse
+import asyncio
+import json
+import os
+import statistics
+import sys
+import tempfile
+import time
+
+ROUTES = (
+    ("GET /variables/variables/", "/api/v1/variables/variables/", "user"),
+    ("GET /variables/users/{id}/variables/", "/api/v1/variables/users/{user_id}/variables/", "admin"),
+    ("GET /categories/", "/api/v1/categories/", "user"),
+    ("GET /admin/categories/users/{id}/categories/", "/api/v1/admin/categories/users/{user_id}/categories/", "admin"),
+)
+
+
+async def bench(rows: int, runs: int) -> dict:
+    import logging
+    import random
+
+    import httpx
+
+    from app.auth import create_access_token
+    from app.config import settings
+    from app.database import dispose_engines, get_engine
+    from app.initial_data import upgrade_schema
+    import app.main
+    from benchmarks.load import seed
+
+    logging.getLogger().setLevel(logging.WARNING)
+    logging.getLogger("httpx").setLevel(logging.WARNING)
+
+    engine = get_engine()
+    upgrade_schema(engine)
+    admin, accounts, _ = seed(engine, 1, rows, rows, depth=3, fanout=2, rng=random.Random(0))
+    user = accounts[0]
+    tokens = {
+        "admin": create_access_token({"sub": admin.username, "user_id": admin.id, "is_admin": True, "is_active": True, "version": 0}),
+        "user": create_access_token({"sub": user.username, "user_id": user.id, "is_admin": False, "is_active": True, "version": 0}),
+    }
+
+    report = {}
+    transport = httpx.ASGITransport(app=app.main.app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://bench", timeout=None) as client:
+        for name, path, who in ROUTES:
+            url = path.format(user_id=user.id)
+            headers = {"Authorization": f"Bearer {tokens[who]}"}
+            results = {}
+            for fast in (False, True):
+                settings.FAST_SERIALIZATION = fast
+                timings = []
+                for _ in range(runs + 1):
+                    started = time.perf_counter()
+                    response = await client.get(url, params={"limit": rows}, headers=headers)
+                    timings.append((time.perf_counter() - started) * 1000)
+                    response.raise_for_status()
+                # Premier appel (cache des valeurs résolues froid) exclu
+                results[fast] = (timings[1:], response.content, response.headers.get("etag"))
+            before, after = results[False], results[True]
+            report[name] = {
+                "items": len(json.loads(after[1])),
+                "bytes": len(after[1]),
+                "identical_body": before[1] == after[1],
+                "identical_etag": before[2] == after[2],
+                "response_model_ms": round(statistics.median(before[0]), 1),
+                "fast_ms": round(statistics.median(after[0]), 1),
+                "speedup": round(statistics.median(before[0]) / statistics.median(after[0]), 2),
+            }
+            print(f"{name}: {report[name]['response_model_ms']} -> {report[name]['fast_ms']} ms", file=sys.stderr)
+    await dispose_engines()
+    return report
+
+
+def main(argv=None) -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--rows", type=int, default=10000, help="Variables et catégories de l'utilisateur")
+    parser.add_argument("--runs", type=int, default=5, help="Appels mesurés par route et par mode")
+    args = parser.parse_args(argv)
+
+    with tempfile.TemporaryDirectory() as directory:
+        # Réglages lus à l'import de app.config : à fixer avant tout import de l'application
+        os.environ.update(
+            DATABASE_URL=f"sqlite:///{os.path.join(directory, 'serialization.db')}",
+            SECRET_KEY=os.environ.get("SECRET_KEY", "benchmark"),
+            BCRYPT_ROUNDS="4",
+            DB_INIT_ON_STARTUP="false",
+            METRICS_ENABLED="false",
+        )
+        report = asyncio.run(bench(args.rows, args.runs))
+    print(json.dumps({"rows": args.rows, "runs": args.runs, "routes": report}, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,71 @@
+# tests/conftest.py
+"""
+Application complète sur une base SQLite temporaire (migrations Alembic au
+démarrage), appelée en mémoire par TestClient. Chaque test crée ses propres
+utilisateurs : la base est partagée par toute la session.
+"""
+import itertools
+import os
+import tempfile
+
+import pytest
+
+_directory = tempfile.TemporaryDirectory(prefix="shortpress-tests-")
+# Réglages lus à l'import de app.config : à fixer avant tout import de l'application
+os.environ.update(
+    DATABASE_URL=f"sqlite:///{os.path.join(_directory.name, 'tests.db')}",
+    SECRET_KEY="tests",
+    FIRST_SUPERUSER="admin",
+    FIRST_SUPERUSER_PASSWORD="admin-password",
+    BCRYPT_ROUNDS="4",
+    DB_INIT_ON_STARTUP="true",
+    METRICS_ENABLED="false",
+    ADMISSION_ENABLED="false",
+    LOG_QUEUE_SIZE="0",
+)
+
+API = "/api/v1"
+_usernames = itertools.count(1)
+
+
+@pytest.fixture(scope="session")
+def client():
+    from fastapi.testclient import TestClient
+
+    import app.main
+
+    with TestClient(app.main.app) as client:
+        yield client
+    _directory.cleanup()
+
+
+def login(client, username: str, password: str) -> dict:
+    response = client.post(f"{API}/auth/token", data={"username": username, "password": password})
+    response.raise_for_status()
+    return {"Authorization": f"Bearer {response.json()['access_token']}"}
+
+
+@pytest.fixture
+def user(client) -> dict:
+    """
+    Nouvel utilisateur : {"id", "username", "headers"}.
+    """
+    username = f"user{next(_usernames)}"
+    response = client.post(f"{API}/auth/users/", json={"username": username, "password": "password"})
+    response.raise_for_status()
+    return {"id": response.json()["id"], "username": username, "headers": login(client, username, "password")}
+
+
+@pytest.fixture
+def admin(client) -> dict:
+    return {"username": "admin", "headers": login(client, "admin", "admin-password")}
+
+
+def create_variable(client, user: dict, identifier: str, value: str, **fields) -> dict:
+    response = client.post(
+        f"{API}/variables/variables/",
+        json=dict({"name": identifier.title(), "identifier": identifier, "value": value}, **fields),
+        headers=user["headers"],
+    )
+    assert response.status_code == 200, response.text
+    return response.json()
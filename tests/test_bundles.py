@@ -0,0 +1,42 @@
+# tests/test_bundles.py
+from sqlalchemy import update
+
+from conftest import API, create_variable
+from app.database import SessionLocal
+from app.models import Variable
+
+
+def publish(client, user) -> dict:
+    response = client.post(f"{API}/bundles/users/{user['id']}", headers=user["headers"])
+    assert response.status_code == 200, response.text
+    return response.json()
+
+
+def bundle(client, user, manifest: dict) -> dict:
+    response = client.get(f"{API}/bundles/users/{user['id']}/{manifest['digest']}.json", headers=user["headers"])
+    assert response.status_code == 200, response.text
+    return response.json()
+
+
+def test_unchanged_bundle_keeps_digest(client, user):
+    create_variable(client, user, f"nom{user['id']}", "Dupont")
+    first = publish(client, user)
+    second = publish(client, user)
+    assert second["digest"] == first["digest"]
+    assert second["rebuilt"] == 0
+
+
+def test_edit_within_the_same_timestamp_republishes(client, user):
+    base = create_variable(client, user, f"prenom{user['id']}", "Jean")
+    create_variable(client, user, f"salutation{user['id']}", f"Bonjour {{{{prenom{user['id']}}}}}")
+    first = publish(client, user)
+
+    # DATETIME à la seconde : la modification garde le même updated_at
+    with SessionLocal() as session:
+        session.execute(update(Variable).where(Variable.id == base["id"]).values(value="Marie", updated_at=Variable.updated_at))
+        session.commit()
+
+    second = publish(client, user)
+    assert second["digest"] != first["digest"]
+    assert second["rebuilt"] == 2
+    assert "Bonjour Marie" in str(bundle(client, user, second))
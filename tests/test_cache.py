@@ -0,0 +1,104 @@
+# tests/test_cache.py
+import asyncio
+
+from sqlalchemy import update
+
+from conftest import API, create_variable
+from app.cache import InMemoryBackend, ResolvedValueCache
+from app.changes import cache_sync
+from app.database import SessionLocal
+from app.models import Variable
+
+
+def resolved(client, user, variable_id: int) -> str:
+    response = client.post(f"{API}/variables/resolve", json={"ids": [variable_id]}, headers=user["headers"])
+    assert response.status_code == 200, response.text
+    result = response.json()["results"][0]
+    assert result["status_code"] == 200, result
+    return result["resolved_value"]
+
+
+def test_invalidation_is_transitive():
+    cache = ResolvedValueCache(maxsize=10, ttl=60)
+    cache.set(1, 7, "a", "x", [])
+    cache.set(2, 7, "b", "x b", ["a"])
+    cache.set(3, 7, "c", "x b c", ["a", "b"])
+    cache.set(4, 8, "b", "autre", [])
+
+    assert cache.invalidate(7, ["a"]) == [1, 2, 3]
+    assert cache.get(4) == "autre"
+    assert len(cache) == 1
+
+
+def test_lru_drops_oldest_entries_and_their_index():
+    cache = ResolvedValueCache(maxsize=2, ttl=60)
+    for variable_id in (1, 2, 3):
+        cache.set(variable_id, 7, f"v{variable_id}", "x", ["a"])
+    assert 1 not in cache and 2 in cache and 3 in cache
+    assert cache.invalidate(7, ["a"]) == [2, 3]
+
+
+def test_shared_tier_is_filled_and_purged():
+    async def scenario():
+        backend = InMemoryBackend()
+        writer = ResolvedValueCache(ttl=60, backend=backend)
+        reader = ResolvedValueCache(ttl=60, backend=backend)
+
+        writer.set(1, 7, "b", "x b", ["a"])
+        await writer.flush()
+        await reader.load([1])
+        assert reader.get(1) == "x b"
+        # Les dépendances voyagent avec la valeur : le lecteur sait invalider l'entrée
+        assert reader.invalidate(7, ["a"]) == [1]
+
+        writer.invalidate(7, ["a"])
+        await writer.flush()
+        fresh = ResolvedValueCache(ttl=60, backend=backend)
+        await fresh.load([1])
+        assert fresh.get(1) is None
+
+    asyncio.run(scenario())
+
+
+def test_update_invalidates_dependents(client, user):
+    base = create_variable(client, user, f"base{user['id']}", "x")
+    derived = create_variable(client, user, f"derivee{user['id']}", f"{{{{base{user['id']}}}}} y")
+    assert resolved(client, user, derived["id"]) == "x y"
+
+    response = client.put(f"{API}/variables/variables/{base['id']}", json={"value": "z"}, headers=user["headers"])
+    assert response.status_code == 200, response.text
+    assert resolved(client, user, derived["id"]) == "z y"
+
+
+def test_import_invalidates_dependents(client, user):
+    base = create_variable(client, user, f"socle{user['id']}", "x")
+    derived = create_variable(client, user, f"etage{user['id']}", f"{{{{socle{user['id']}}}}} y")
+    assert resolved(client, user, derived["id"]) == "x y"
+
+    content = f'{{"identifier": "{base["identifier"]}", "name": "Socle", "value": "w"}}\n'
+    response = client.post(f"{API}/variables/import", files={"file": ("v.ndjson", content.encode())}, headers=user["headers"])
+    assert response.json()["updated"] == 1
+    assert resolved(client, user, derived["id"]) == "w y"
+
+
+def test_delete_breaks_dependents(client, user):
+    base = create_variable(client, user, f"efface{user['id']}", "x")
+    derived = create_variable(client, user, f"orphelin{user['id']}", f"{{{{efface{user['id']}}}}}")
+    assert resolved(client, user, derived["id"]) == "x"
+
+    assert client.delete(f"{API}/variables/variables/{base['id']}", headers=user["headers"]).status_code == 204
+    response = client.post(f"{API}/variables/resolve", json={"ids": [derived["id"]]}, headers=user["headers"])
+    assert response.json()["results"][0]["status_code"] == 404
+
+
+def test_writes_from_other_processes_are_picked_up_from_the_log(client, user):
+    base = create_variable(client, user, f"distante{user['id']}", "x")
+    derived = create_variable(client, user, f"locale{user['id']}", f"{{{{distante{user['id']}}}}} y")
+    assert resolved(client, user, derived["id"]) == "x y"
+
+    # Écriture d'un autre worker : le cache de celui-ci n'en est pas informé
+    with SessionLocal() as session:
+        session.execute(update(Variable).where(Variable.id == base["id"]).values(value="z"))
+        session.commit()
+    assert client.portal.call(cache_sync.poll) >= 1
+    assert resolved(client, user, derived["id"]) == "z y"
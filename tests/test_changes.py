@@ -0,0 +1,76 @@
+# tests/test_changes.py
+from sqlalchemy import update
+
+from conftest import API, create_variable
+from app.changes import ReferenceIndex, reference_index
+from app.database import SessionLocal
+from app.models import Variable
+
+
+def cursor(client, user) -> int:
+    return client.get(f"{API}/variables/variables/changes", headers=user["headers"]).json()["cursor"]
+
+
+def changes(client, user, since: int) -> dict:
+    # Identifiants uniques pour toute la base : suffixés par l'id de l'utilisateur
+    response = client.get(f"{API}/variables/variables/changes", params={"since": since}, headers=user["headers"])
+    assert response.status_code == 200, response.text
+    suffix = f"_{user['id']}"
+    return {item["variable"]["identifier"][:-len(suffix)]: item for item in response.json()["changes"] if item["entity"] == "variable"}
+
+
+def create(client, user, identifier: str, value: str) -> dict:
+    return create_variable(client, user, f"{identifier}_{user['id']}", value.replace("}}", f"_{user['id']}}}}}"))
+
+
+def edit(client, user, variable: dict, value: str) -> None:
+    response = client.put(f"{API}/variables/variables/{variable['id']}", json={"value": value}, headers=user["headers"])
+    assert response.status_code == 200, response.text
+
+
+def test_deltas_include_transitive_dependents(client, user):
+    base = create(client, user, "ville", "Paris")
+    middle = create(client, user, "adresse", "1 rue X, {{ville}}")
+    create(client, user, "lettre", "Envoi : {{adresse}}")
+    create(client, user, "autre", "Sans rapport")
+
+    since = cursor(client, user)
+    edit(client, user, base, "Lyon")
+    deltas = changes(client, user, since)
+    assert set(deltas) == {"ville", "adresse", "lettre"}
+    assert deltas["lettre"]["resolved_value"] == "Envoi : 1 rue X, Lyon"
+
+    # La référence retirée n'est plus suivie
+    edit(client, user, middle, "1 rue X")
+    since = cursor(client, user)
+    edit(client, user, base, "Nice")
+    assert set(changes(client, user, since)) == {"ville"}
+
+
+def test_index_follows_writes_outside_the_orm(client, user, monkeypatch):
+    base = create(client, user, "pays", "France")
+    other = create(client, user, "devise", "Euro")
+    since = cursor(client, user)
+    edit(client, user, base, "Belgique")
+    assert set(changes(client, user, since)) == {"pays"}
+
+    loads = []
+    load = ReferenceIndex._load
+
+    async def counted(self, db, owner_id):
+        loads.append(owner_id)
+        return await load(self, db, owner_id)
+
+    monkeypatch.setattr(ReferenceIndex, "_load", counted)
+    # Écriture ensembliste : seul le journal (trigger) la signale
+    with SessionLocal() as session:
+        session.execute(update(Variable).where(Variable.id == other["id"]).values(value=f"Euro ({{{{pays_{user['id']}}}}})"))
+        session.commit()
+    since = cursor(client, user)
+    edit(client, user, base, "Luxembourg")
+    deltas = changes(client, user, since)
+    assert set(deltas) == {"pays", "devise"}
+    assert deltas["devise"]["resolved_value"] == "Euro (Luxembourg)"
+    # Rattrapé depuis le journal, sans relire les valeurs du propriétaire
+    assert loads == []
+    assert user["id"] in reference_index._owners
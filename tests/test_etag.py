@@ -0,0 +1,62 @@
+# tests/test_etag.py
+import pytest
+
+from conftest import API, create_variable
+from app.cache import resolved_cache
+from app.routes import variable_routes
+
+
+def urls(variable: dict) -> list:
+    return [
+        f"{API}/variables/variables/{variable['id']}",
+        f"{API}/variables/variables/{variable['id']}/resolved",
+        f"{API}/variables/variables/by-identifier/{variable['identifier']}/resolved",
+        f"{API}/variables/variables/",
+    ]
+
+
+@pytest.fixture
+def chain(client, user):
+    base = create_variable(client, user, f"racine{user['id']}", "x")
+    middle = create_variable(client, user, f"milieu{user['id']}", f"{{{{racine{user['id']}}}}} y")
+    top = create_variable(client, user, f"sommet{user['id']}", f"{{{{milieu{user['id']}}}}} z")
+    return base, middle, top
+
+
+@pytest.mark.parametrize("cold", [False, True], ids=["warm", "cold"])
+def test_not_modified_without_resolution(client, user, chain, monkeypatch, cold):
+    _, _, top = chain
+    etags = {}
+    for url in urls(top):
+        response = client.get(url, headers=user["headers"])
+        assert response.status_code == 200, response.text
+        etags[url] = response.headers["ETag"]
+    if cold:
+        # Autre worker, entrée expirée : les dépendances sont recalculées depuis les valeurs brutes
+        resolved_cache.clear()
+
+    async def no_resolution(*args, **kwargs):
+        raise AssertionError("a 304 must not resolve values")
+
+    monkeypatch.setattr(variable_routes, "resolve_cached", no_resolution)
+    for url, etag in etags.items():
+        response = client.get(url, headers=dict(user["headers"], **{"If-None-Match": etag}))
+        assert response.status_code == 304, url
+
+
+def test_transitive_dependency_change_changes_etag(client, user, chain):
+    base, _, top = chain
+    for url in urls(top):
+        etag = client.get(url, headers=user["headers"]).headers["ETag"]
+        client.put(f"{API}/variables/variables/{base['id']}", json={"value": f"x{url}"}, headers=user["headers"])
+        response = client.get(url, headers=dict(user["headers"], **{"If-None-Match": etag}))
+        assert response.status_code == 200, url
+        assert response.headers["ETag"] != etag
+
+
+def test_same_etag_with_cold_and_warm_cache(client, user, chain):
+    _, _, top = chain
+    url = f"{API}/variables/variables/{top['id']}/resolved"
+    warm = client.get(url, headers=user["headers"]).headers["ETag"]
+    resolved_cache.clear()
+    assert client.get(url, headers=user["headers"]).headers["ETag"] == warm
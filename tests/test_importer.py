@@ -0,0 +1,108 @@
+# tests/test_importer.py
+import json
+
+import pytest
+
+from conftest import API, create_variable
+
+
+def import_file(client, user, content: str, filename: str = "variables.ndjson", **params):
+    response = client.post(
+        f"{API}/variables/import",
+        params=params,
+        files={"file": (filename, content.encode())},
+        headers=user["headers"],
+    )
+    assert response.status_code == 200, response.text
+    return response.json()
+
+
+def ndjson(*records) -> str:
+    return "".join(json.dumps(record) + "\n" for record in records)
+
+
+def variables(client, user) -> dict:
+    response = client.get(f"{API}/variables/variables/", params={"limit": 1000}, headers=user["headers"])
+    assert response.status_code == 200, response.text
+    return {variable["identifier"]: variable for variable in response.json()}
+
+
+def test_creates_and_updates_by_identifier(client, user):
+    create_variable(client, user, "ville", "Lyon")
+    report = import_file(client, user, ndjson(
+        {"identifier": "ville", "name": "Ville", "value": "Paris"},
+        {"identifier": "adresse", "name": "Adresse", "value": "1 rue {{ville}}", "parent": "ville"},
+    ))
+    assert (report["created"], report["updated"], report["failed"]) == (1, 1, 0)
+    imported = variables(client, user)
+    assert imported["ville"]["value"] == "Paris"
+    assert imported["adresse"]["parent_variable_id"] == imported["ville"]["id"]
+
+
+@pytest.mark.parametrize("chunk_size", [1, 5000])
+def test_parent_cycle_is_rejected(client, user, chunk_size):
+    report = import_file(client, user, ndjson(
+        {"identifier": f"a{chunk_size}", "name": "A", "value": "a", "parent": f"b{chunk_size}"},
+        {"identifier": f"b{chunk_size}", "name": "B", "value": "b", "parent": f"a{chunk_size}"},
+    ), chunk_size=chunk_size)
+    assert report["failed"] == 1
+    assert "cycle" in report["errors"][0]["detail"]
+    # La liste (parents chargés récursivement) se termine
+    assert len(variables(client, user)) == 2
+
+
+def test_parent_cycle_through_existing_variables_is_rejected(client, user):
+    parent = create_variable(client, user, "racine", "r")
+    create_variable(client, user, "enfant", "e", parent_variable_id=parent["id"])
+    report = import_file(client, user, ndjson({"identifier": "racine", "name": "Racine", "value": "r", "parent": "enfant"}))
+    assert report["failed"] == 1
+    assert variables(client, user)["racine"]["parent_variable_id"] is None
+
+
+def test_self_parent_is_rejected(client, user):
+    report = import_file(client, user, ndjson({"identifier": "seul", "name": "Seul", "value": "s", "parent": "seul"}))
+    assert report["failed"] == 1
+
+
+@pytest.mark.parametrize("order", ["forward", "backward"])
+def test_reference_to_rejected_row_is_rejected(client, user, order):
+    rows = [
+        {"identifier": f"base_{order}", "name": "Base"},
+        {"identifier": f"derivee_{order}", "name": "Dérivée", "value": f"x {{{{base_{order}}}}}"},
+        {"identifier": f"finale_{order}", "name": "Finale", "value": f"{{{{derivee_{order}}}}}"},
+    ]
+    if order == "backward":
+        rows.reverse()
+    report = import_file(client, user, ndjson(*rows), chunk_size=1)
+    assert (report["created"], report["failed"]) == (0, 3)
+    assert variables(client, user) == {}
+
+
+def test_reference_to_existing_variable_survives_rejected_update(client, user):
+    create_variable(client, user, "existante", "e")
+    report = import_file(client, user, ndjson(
+        {"identifier": "existante", "name": "Existante"},
+        {"identifier": "utilise", "name": "Utilise", "value": "{{existante}}"},
+    ))
+    assert (report["created"], report["failed"]) == (1, 1)
+
+
+def test_csv_empty_value_is_an_empty_string(client, user):
+    report = import_file(client, user, "identifier,name,value,category\nvide,Vide,,\n", filename="variables.csv")
+    assert report["failed"] == 0
+    assert variables(client, user)["vide"]["value"] == ""
+
+
+def test_numeric_ids_must_belong_to_the_importing_user(client, user, admin):
+    foreign = create_variable(client, admin, f"admin_{user['id']}", "secret")
+    category = client.post(f"{API}/categories/", json={"name": f"admin {user['id']}"}, headers=admin["headers"]).json()
+    report = import_file(client, user, ndjson(
+        {"identifier": "vol_parent", "name": "P", "value": "v", "parent_variable_id": foreign["id"]},
+        {"identifier": "vol_categorie", "name": "C", "value": "v", "category_id": category["id"]},
+    ))
+    assert (report["created"], report["failed"]) == (0, 2)
+
+    own = create_variable(client, user, "mienne", "m")
+    report = import_file(client, user, ndjson({"identifier": "fille", "name": "F", "value": "v", "parent_variable_id": own["id"]}))
+    assert report["failed"] == 0
+    assert variables(client, user)["fille"]["parent_variable_id"] == own["id"]
@@ -0,0 +1,47 @@
+# tests/test_jobs.py
+import time
+
+from conftest import API, create_variable, login
+from app.jobs import jobs
+
+
+def delete_in_background(client, user) -> dict:
+    category = client.post(f"{API}/categories/", json={"name": f"archives{user['id']}"}, headers=user["headers"])
+    assert category.status_code == 200, category.text
+    for index in range(3):
+        create_variable(client, user, f"archive{index}_{user['id']}", "x", category_id=category.json()["id"])
+    response = client.delete(
+        f"{API}/categories/categories/{category.json()['id']}", params={"action": "delete", "background": True}, headers=user["headers"]
+    )
+    assert response.status_code == 202, response.text
+    return response.json()
+
+
+def wait_for(client, user, job_id: str) -> dict:
+    for _ in range(100):
+        response = client.get(f"{API}/jobs/{job_id}", headers=user["headers"])
+        assert response.status_code == 200, response.text
+        if response.json()["status"] in ("succeeded", "failed"):
+            return response.json()
+        time.sleep(0.05)
+    raise AssertionError("job did not finish")
+
+
+def test_job_state_is_readable_from_any_worker(client, user):
+    job = delete_in_background(client, user)
+    assert job["status"] == "pending" and job["total"] == 3
+    finished = wait_for(client, user, job["id"])
+    assert finished["status"] == "succeeded" and finished["done"] == 3
+    # Tâche terminée : plus rien en mémoire, l'état vient de la table (comme pour un autre worker)
+    assert len(jobs) == 0
+    assert client.get(f"{API}/jobs/{job['id']}", headers=user["headers"]).json() == finished
+
+
+def test_job_of_another_user(client, user, admin):
+    job = delete_in_background(client, user)
+    wait_for(client, user, job["id"])
+    username = f"autre{user['id']}"
+    assert client.post(f"{API}/auth/users/", json={"username": username, "password": "password"}).status_code == 200
+    assert client.get(f"{API}/jobs/{job['id']}", headers=login(client, username, "password")).status_code == 403
+    assert client.get(f"{API}/jobs/{job['id']}", headers=admin["headers"]).status_code == 200
+    assert client.get(f"{API}/jobs/0123456789abcdef0123456789abcdef", headers=user["headers"]).status_code == 404
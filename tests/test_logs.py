@@ -0,0 +1,50 @@
+# tests/test_logs.py
+import io
+import logging
+
+import orjson
+import pytest
+
+from app import logs
+
+
+@pytest.fixture
+def queued_json():
+    stream = io.StringIO()
+    logs.configure_logging(level="INFO", levels={}, fmt="json", sampling={}, queue_size=100, stream=stream, force=True)
+    yield stream
+    logs.configure_logging(queue_size=0, force=True)
+
+
+def lines(stream: io.StringIO) -> list:
+    logs.shutdown_logging()
+    return [orjson.loads(line) for line in stream.getvalue().splitlines()]
+
+
+def test_arguments_are_formatted_by_the_caller(queued_json):
+    items = ["a"]
+    logging.getLogger("app.test").info("éléments : %s", items)
+    # Modifié avant que le thread d'écriture ne lise l'enregistrement
+    items.append("b")
+    message = [line for line in lines(queued_json) if line["logger"] == "app.test"]
+    assert message[0]["message"] == "éléments : ['a']"
+
+
+def test_traceback_is_formatted_by_the_caller(queued_json):
+    try:
+        raise ValueError("valeur")
+    except ValueError:
+        logging.getLogger("app.test").exception("échec %d", 1)
+    message = [line for line in lines(queued_json) if line["logger"] == "app.test"][0]
+    assert message["message"] == "échec 1"
+    assert "ValueError: valeur" in message["exc_info"]
+
+
+def test_prepare_copies_the_record():
+    handler = logs.QueueHandler(None)
+    record = logging.LogRecord("app.test", logging.ERROR, __file__, 1, "%s", ("x",), (ValueError, ValueError("v"), None))
+    prepared = handler.prepare(record)
+    assert (prepared.msg, prepared.args, prepared.exc_info) == ("x", None, None)
+    assert "ValueError: v" in prepared.exc_text
+    assert (record.msg, record.args) == ("%s", ("x",))
+    assert record.exc_info is not None
@@ -0,0 +1,31 @@
+# tests/test_pagination.py
+import pytest
+
+from conftest import API, create_variable
+from app.pagination import NEXT_CURSOR_HEADER
+
+
+@pytest.mark.parametrize("path", ["/variables/variables/", "/categories/"])
+@pytest.mark.parametrize("limit", [0, -1, 1001])
+def test_limit_out_of_range_is_rejected(client, user, path, limit):
+    response = client.get(API + path, params={"limit": limit}, headers=user["headers"])
+    assert response.status_code == 422
+
+
+def test_negative_skip_is_rejected(client, user):
+    response = client.get(f"{API}/variables/variables/", params={"skip": -1}, headers=user["headers"])
+    assert response.status_code == 422
+
+
+def test_cursor_walks_every_page_once(client, user):
+    created = [create_variable(client, user, f"page{index}", str(index))["id"] for index in range(5)]
+    seen, params = [], {"limit": 2}
+    while True:
+        response = client.get(f"{API}/variables/variables/", params=params, headers=user["headers"])
+        assert response.status_code == 200
+        seen.extend(variable["id"] for variable in response.json())
+        cursor = response.headers.get(NEXT_CURSOR_HEADER)
+        if cursor is None:
+            break
+        params = {"limit": 2, "after": cursor}
+    assert seen == created
@@ -0,0 +1,36 @@
+# tests/test_query_plans.py
+"""
+Aucune requête des routes ne parcourt une table entière (benchmarks.query_plans),
+et aucune route n'échoue (un chargement paresseux interdit par raiseload lève une erreur 500).
+
+La vérification tourne dans un processus neuf : elle crée sa propre base
+et fixe ses propres réglages avant d'importer l'application.
+"""
+import json
+import os
+import subprocess
+import sys
+
+import pytest
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+@pytest.mark.parametrize("revision", ["head"])
+def test_no_full_table_scan(revision):
+    environment = {key: value for key, value in os.environ.items() if key not in ("DATABASE_URL", "DB_INIT_ON_STARTUP")}
+    process = subprocess.run(
+        [sys.executable, "-m", "benchmarks.query_plans", "--revision", revision, "--verbose"],
+        cwd=ROOT,
+        env=environment,
+        capture_output=True,
+        text=True,
+        timeout=300,
+    )
+    assert process.stdout, process.stderr
+    report = json.loads(process.stdout)
+    assert report["full_scans"] == [], json.dumps(report["full_scans"], indent=2, ensure_ascii=False)
+    assert process.returncode == 0
+    assert report["routes"] > 20
+    errors = sorted({(plan["route"], plan["status"]) for plan in report["plans"] if (plan["status"] or 0) >= 500})
+    assert errors == []
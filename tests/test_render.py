@@ -0,0 +1,71 @@
+# tests/test_render.py
+import logging
+
+import pytest
+from fastapi import HTTPException
+
+from conftest import API, create_variable
+from app.utils import VariableResolver
+
+RENDER = f"{API}/variables/render"
+
+
+def test_non_utf8_document_is_rendered_as_utf8(client, user):
+    create_variable(client, user, f"devise{user['id']}", "€uro")
+    document = f"Prix en {{{{devise{user['id']}}}}} : 12 é".encode("iso-8859-1")
+    response = client.post(RENDER, content=document, headers=dict(user["headers"], **{"Content-Type": "text/plain; charset=iso-8859-1"}))
+    assert response.status_code == 200, response.text
+    assert response.headers["content-type"] == "text/plain; charset=utf-8"
+    assert response.content.decode("utf-8") == "Prix en €uro : 12 é"
+
+
+def test_failure_before_the_first_byte_keeps_its_status(client, user, monkeypatch):
+    def unavailable(self, owner_id, identifiers):
+        raise HTTPException(status_code=503, detail="Database unavailable")
+
+    monkeypatch.setattr(VariableResolver, "resolve_identifiers", unavailable)
+    response = client.post(RENDER, content=b"Bonjour {{nom}}", headers=dict(user["headers"], **{"Content-Type": "text/plain"}))
+    assert response.status_code == 503
+
+
+def test_failure_mid_stream_is_logged_and_aborts_the_response(client, user, monkeypatch, caplog):
+    create_variable(client, user, f"premier{user['id']}", "un")
+    resolve_identifiers = VariableResolver.resolve_identifiers
+    calls = []
+
+    def failing_second_time(self, owner_id, identifiers):
+        calls.append(identifiers)
+        if len(calls) > 1:
+            raise RuntimeError("database gone")
+        return resolve_identifiers(self, owner_id, identifiers)
+
+    monkeypatch.setattr(VariableResolver, "resolve_identifiers", failing_second_time)
+    # Corps en deux morceaux (TestClient n'en envoie qu'un) : appel ASGI direct dans la boucle du client
+    incoming = [
+        {"type": "http.request", "body": f"{{{{premier{user['id']}}}}} ".encode(), "more_body": True},
+        {"type": "http.request", "body": b"{{second}}", "more_body": False},
+    ]
+    sent = []
+
+    async def receive():
+        return incoming.pop(0) if incoming else {"type": "http.disconnect"}
+
+    async def send(message):
+        sent.append(message)
+
+    scope = {
+        "type": "http", "asgi": {"version": "3.0"}, "http_version": "1.1", "method": "POST", "scheme": "http",
+        "path": RENDER, "raw_path": RENDER.encode(), "root_path": "", "query_string": b"",
+        "headers": [(b"authorization", user["headers"]["Authorization"].encode()), (b"content-type", b"text/plain")],
+        "client": ("test", 1), "server": ("test", 80),
+    }
+    from app.main import app
+
+    with caplog.at_level(logging.ERROR, logger="app.routes.variable_routes"):
+        with pytest.raises(RuntimeError):
+            client.portal.call(app, scope, receive, send)
+    assert sent[0]["status"] == 200
+    assert b"".join(message.get("body", b"") for message in sent[1:]) == b"un "
+    # Pas de fin de corps : le client voit une réponse interrompue, pas un 200 complet
+    assert all(message.get("more_body", False) for message in sent[1:])
+    assert "Rendu du document interrompu" in caplog.text
@@ -0,0 +1,40 @@
+# tests/test_resolver.py
+import sys
+
+from conftest import API
+from test_importer import import_file, ndjson
+
+
+def chain(user: dict, depth: int) -> list:
+    # v0 -> v1 -> ... -> v{depth-1} : identifiants suffixés par l'utilisateur (uniques dans la base)
+    names = [f"chaine{index}_{user['id']}" for index in range(depth)]
+    records = [{"name": name, "identifier": name, "value": f"{{{{{names[index + 1]}}}}}"} for index, name in enumerate(names[:-1])]
+    records.append({"name": names[-1], "identifier": names[-1], "value": "fin"})
+    return names, ndjson(*records)
+
+
+def test_deep_chain_is_resolved_without_recursion(client, user):
+    # Deux appels Python par niveau auparavant : cette profondeur dépassait la pile
+    depth = sys.getrecursionlimit()
+    names, content = chain(user, depth)
+    assert import_file(client, user, content)["created"] == depth
+
+    response = client.get(f"{API}/variables/variables/by-identifier/{names[0]}/resolved", headers=user["headers"])
+    assert response.status_code == 200, response.text
+    resolved = client.post(f"{API}/variables/resolve", json={"identifiers": [names[0]]}, headers=user["headers"])
+    assert resolved.status_code == 200, resolved.text
+    assert resolved.json()["results"][0]["resolved_value"] == "fin"
+
+
+def test_cycle_and_missing_reference_leave_the_resolver_usable(client, user):
+    a, b, c = (f"{name}_{user['id']}" for name in ("boucle_a", "boucle_b", "orpheline"))
+    import_file(client, user, ndjson(
+        {"name": a, "identifier": a, "value": f"{{{{{b}}}}}"},
+        {"name": b, "identifier": b, "value": f"{{{{{a}}}}}"},
+        {"name": c, "identifier": c, "value": "{{absente}}"},
+    ))
+    response = client.get(f"{API}/variables/variables/by-identifier/{a}/resolved", headers=user["headers"])
+    assert response.status_code == 400
+    assert response.json()["detail"] == f"Circular variable reference: {a} -> {b} -> {a}"
+    response = client.get(f"{API}/variables/variables/by-identifier/{c}/resolved", headers=user["headers"])
+    assert response.status_code == 404
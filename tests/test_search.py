@@ -0,0 +1,21 @@
+# tests/test_search.py
+from conftest import API, create_variable
+from app.config import settings
+
+
+def search(client, user, q: str):
+    return client.get(f"{API}/variables/variables/search", params={"q": q}, headers=user["headers"])
+
+
+def test_search_by_prefix(client, user):
+    create_variable(client, user, f"telephone{user['id']}", "01 23 45 67 89")
+    response = search(client, user, f"telephone{user['id']}"[:-1])
+    assert response.status_code == 200, response.text
+    assert [variable["identifier"] for variable in response.json()] == [f"telephone{user['id']}"]
+
+
+def test_unsupported_dialect(client, user, monkeypatch):
+    monkeypatch.setattr(settings, "DATABASE_URL", "postgresql://localhost/shortpress")
+    response = search(client, user, "telephone")
+    assert response.status_code == 501
+    assert response.json()["detail"] == "Full-text search is not available for 'postgresql'"
@@ -0,0 +1,42 @@
+# tests/test_server.py
+import os
+
+import pytest
+
+from app import server
+from app.config import settings
+
+
+class FakeSupervisor:
+    runs = []
+
+    def __init__(self, config, workers: int, **kwargs):
+        self.workers = workers
+
+    def run(self) -> None:
+        directory = os.environ.get("BUNDLE_DIR")
+        FakeSupervisor.runs.append((self.workers, directory, directory is not None and os.path.isdir(directory)))
+
+
+@pytest.fixture
+def supervisor(monkeypatch):
+    FakeSupervisor.runs = []
+    monkeypatch.setattr(server, "Supervisor", FakeSupervisor)
+    monkeypatch.setattr(settings, "DB_INIT_ON_STARTUP", False)
+    monkeypatch.setattr(settings, "BUNDLE_DIR", None)
+    # Variable d'environnement restaurée (supprimée) après le test
+    monkeypatch.setenv("BUNDLE_DIR", "")
+    monkeypatch.delenv("BUNDLE_DIR")
+    return FakeSupervisor
+
+
+def test_workers_share_a_bundle_directory(supervisor):
+    server.serve(workers=2)
+    [(workers, directory, existed)] = supervisor.runs
+    assert workers == 2 and existed
+    assert not os.path.exists(directory)
+
+
+def test_single_worker_keeps_bundles_in_memory(supervisor):
+    server.serve(workers=1)
+    assert supervisor.runs == [(1, None, False)]